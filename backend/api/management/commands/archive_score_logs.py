@@ -0,0 +1,52 @@
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.services import ScoreLogService
+
+
+class Command(BaseCommand):
+    help = (
+        'Move old SoroScoreLog entries to gzipped monthly NDJSON archive files, '
+        'and compact entries written in the old format'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Archive entries calculated before this date (YYYY-MM-DD); '
+                                             'defaults to SCORE_LOG_RETENTION_DAYS ago')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Entries moved per transaction')
+        parser.add_argument('--compact', action='store_true',
+                            help='Also rewrite remaining entries that store the whole underwriting result')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = timezone.make_aware(datetime.strptime(options['before'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--before must be a date (YYYY-MM-DD)')
+        else:
+            before = timezone.now() - timedelta(days=settings.SCORE_LOG_RETENTION_DAYS)
+        service = ScoreLogService()
+
+        started = time.perf_counter()
+        files = entries = 0
+        for archive in service.archive(before, options['chunk_size']):
+            files += 1
+            entries += archive.row_count
+            self.stdout.write(f'  {archive.path}: {archive.row_count} entries')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {entries} entries calculated before {before:%Y-%m-%d} to {files} file(s) '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+
+        indexed = service.index_archives()
+        if indexed:
+            self.stdout.write(f'Indexed the claims and users of {indexed} earlier archive file(s)')
+
+        if options['compact']:
+            started = time.perf_counter()
+            compacted = service.compact(options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Compacted {compacted} entries in {time.perf_counter() - started:.1f}s'
+            ))
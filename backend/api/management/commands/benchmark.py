@@ -0,0 +1,384 @@
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+import numpy as np
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Benchmark CPU-heavy scoring and analysis components on synthetic data'
+
+    TARGETS = ['audio_features', 'soro_score', 'narrative_index', 'audio_fingerprint']
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=self.TARGETS, help='Component to benchmark')
+        parser.add_argument('--size', type=int, default=None,
+                            help='Workload size (seconds of audio, claims, ...); defaults per target')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs; the best is reported')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--database', type=int, default=0, metavar='CLAIMS',
+                            help='For the index targets, also time lookups through the database index with '
+                                 'this many claims indexed in a throwaway test database')
+
+    def handle(self, *args, **options):
+        self.rng = np.random.default_rng(options['seed'])
+        self.database = max(0, options['database'])
+        getattr(self, f"_benchmark_{options['target']}")(options['size'], max(1, options['repeat']))
+
+    def _time(self, func, repeat):
+        """Best wall and CPU time over repeat runs"""
+        best_wall, best_cpu = float('inf'), float('inf')
+        for _ in range(repeat):
+            wall, cpu = time.perf_counter(), time.process_time()
+            func()
+            best_wall = min(best_wall, time.perf_counter() - wall)
+            best_cpu = min(best_cpu, time.process_time() - cpu)
+        return best_wall, best_cpu
+
+    @contextmanager
+    def _scratch_database(self):
+        """A fresh test database for the database-path timings, destroyed afterwards"""
+        from django.db import connection
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    @staticmethod
+    def _scratch_claims(count):
+        """Ids of count claims on one user and policy, for index rows to point at"""
+        from api.models import User, InsuranceProduct, Policy, Claim
+
+        user = User.objects.create_user(phone_number='+2348000000000', email='benchmark@example.com',
+                                        password='benchmark')
+        product = InsuranceProduct.objects.create(
+            name='Benchmark', product_type='motor', description='', base_premium=10000,
+            min_premium=5000, max_premium=50000, coverage_details={}, exclusions=[], required_documents=[]
+        )
+        policy = Policy.objects.create(
+            user=user, product=product, start_date=date.today(), end_date=date.today() + timedelta(days=365),
+            initial_soro_score=50, current_soro_score=50, premium_amount=10000,
+            coverage_amount=1000000, deductible_amount=5000
+        )
+        claims = Claim.objects.bulk_create(
+            [
+                Claim(user=user, policy=policy, claim_type='accident', description='',
+                      incident_date=date.today(), incident_location='Lagos', estimated_loss=1, claimed_amount=1)
+                for _ in range(count)
+            ],
+            batch_size=2000
+        )
+        return [claim.id for claim in claims]
+
+    def _benchmark_audio_features(self, size, repeat):
+        from api.services.audio_feature_service import AudioFeatureService
+        from api.services.voice_processing_service import DecodedAudio
+
+        seconds = size or 300
+        sample_rate = 16000
+        t = np.arange(seconds * sample_rate) / sample_rate
+
+        # Speech-like signal: gliding harmonic voice, syllable-rate bursts, pauses and noise
+        pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+        phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        envelope = (np.sin(2 * np.pi * 4 * t) > -0.2) * (np.sin(2 * np.pi * 0.2 * t) > -0.6)
+        signal = voice * envelope * 6000 + self.rng.normal(0, 150, len(t))
+        audio = DecodedAudio(np.clip(signal, -32768, 32767).astype(np.int16), sample_rate)
+
+        service = AudioFeatureService()
+        features = service.extract(audio)
+        wall, cpu = self._time(lambda: service.extract(audio), repeat)
+
+        self.stdout.write(f'Audio features over {seconds}s of 16 kHz audio')
+        self.stdout.write(f'  wall {wall * 1000:.1f} ms, cpu {cpu * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'  throughput: {seconds / max(cpu, 1e-9):,.0f} seconds of audio per CPU-second'
+        ))
+        self.stdout.write(f"  pitch_mean={features['pitch_mean']} Hz, snr={features['snr_db']} dB, "
+                          f"pauses/min={features['pause_frequency']}")
+
+    def _benchmark_soro_score(self, size, repeat):
+        from datetime import date, timedelta
+        from api.models import Claim
+        from api.services.soro_score_service import SoroScoreService
+
+        count = size or 10000
+        rng = self.rng
+        keyword_pool = ['accident', 'okada', 'stolen', 'urgent', 'fire', 'hospital', 'lagos', 'emergency']
+        today = date.today()
+
+        # Unsaved claims with their history and coverage supplied, so only scoring is timed
+        claims = []
+        for i in range(count):
+            estimated = float(rng.uniform(10000, 500000))
+            claims.append(Claim(
+                user_id=i % 1000,
+                policy_id=i % 2000,
+                claim_type=rng.choice(Claim.ClaimType.values),
+                incident_date=today - timedelta(days=int(rng.integers(0, 60))),
+                estimated_loss=estimated,
+                claimed_amount=estimated * float(rng.uniform(0.7, 1.5)),
+                transcript='recorded account' if rng.random() < 0.8 else None,
+                transcript_confidence=float(rng.uniform(0.3, 1.0)),
+                sentiment_score=float(rng.uniform(-1, 1)),
+                keywords=list(rng.choice(keyword_pool, size=int(rng.integers(0, 4)), replace=False)),
+                photos=['photo.jpg'] * int(rng.integers(0, 4)),
+                audio_file='claim_audio/claim.wav',
+            ))
+        history = {
+            user_id: (int(rng.integers(0, 6)), int(rng.integers(0, 2)), float(rng.random() * 0.5))
+            for user_id in range(1000)
+        }
+        coverage = {policy_id: float(rng.uniform(100000, 1000000)) for policy_id in range(2000)}
+
+        service = SoroScoreService()
+        wall, cpu = self._time(lambda: service.score_claims(claims, history, coverage, {}, {}, {}, {}), repeat)
+        features = service.build_feature_matrix(claims, history, coverage, {}, {}, {}, {})
+        matrix_wall, _ = self._time(lambda: service.score_matrix(features), repeat)
+
+        single = claims[:min(count, 500)]
+        single_wall, _ = self._time(
+            lambda: [service.score_claims([claim], history, coverage, {}, {}, {}, {}) for claim in single], 1
+        )
+
+        self.stdout.write(f'Soro-Score over {count} claims')
+        self.stdout.write(f'  batch: wall {wall * 1000:.1f} ms, cpu {cpu * 1000:.1f} ms '
+                          f'(scoring matrix only: {matrix_wall * 1000:.2f} ms)')
+        self.stdout.write(self.style.SUCCESS(f'  throughput: {count / max(wall, 1e-9):,.0f} claims/s batched, '
+                                             f'{len(single) / max(single_wall, 1e-9):,.0f} claims/s one at a time'))
+
+    def _benchmark_narrative_index(self, size, repeat):
+        from django.conf import settings
+        from api.services.narrative_similarity_service import MinHasher, LSHTable
+
+        count = size or 1_000_000
+        rng = self.rng
+        hasher = MinHasher()
+        threshold = settings.NARRATIVE_SIMILARITY_THRESHOLD
+
+        # Full text path (tokenize, shingle, hash, sign) on a sample of generated narratives
+        vocabulary = np.array([f'word{i}' for i in range(5000)])
+        texts = [' '.join(rng.choice(vocabulary, int(rng.integers(30, 60)))) for _ in range(2000)]
+        text_wall, _ = self._time(lambda: [hasher.signature(text) for text in texts], 1)
+
+        # Shingle hash sets for the corpus; the last 1% retell an earlier claim with ~10% of it reworded
+        lengths = rng.integers(30, 60, count)
+        flat = rng.integers(0, 2 ** 32, int(lengths.sum()), dtype=np.uint32)
+        hash_sets = np.split(flat, np.cumsum(lengths)[:-1])
+        planted = {}
+        for i in range(count - max(1, count // 100), count):
+            source = int(rng.integers(0, count // 2))
+            copy = hash_sets[source].copy()
+            edits = rng.random(len(copy)) < 0.1
+            copy[edits] = rng.integers(0, 2 ** 32, int(edits.sum()), dtype=np.uint32)
+            hash_sets[i] = copy
+            planted[i] = source
+
+        started = time.perf_counter()
+        signatures = hasher.signatures(hash_sets)
+        sign_wall = time.perf_counter() - started
+        started = time.perf_counter()
+        keys = hasher.band_keys(signatures)
+        table = LSHTable(keys)
+        index_wall = time.perf_counter() - started
+
+        queries = list(planted)[:1000]
+
+        def lookup():
+            found = 0
+            for i in queries:
+                candidates = table.candidates(keys[i])
+                candidates = candidates[candidates != i]
+                similar = candidates[hasher.similarity(signatures[i], signatures[candidates]) >= threshold]
+                found += planted[i] in similar
+            return found
+
+        found = lookup()
+        lookup_wall, _ = self._time(lookup, repeat)
+        scan_queries = queries[:10]
+        scan_wall, _ = self._time(
+            lambda: [hasher.similarity(signatures[i], signatures) >= threshold for i in scan_queries], 1
+        )
+
+        per_lookup = lookup_wall / len(queries)
+        per_scan = scan_wall / len(scan_queries)
+        self.stdout.write(f'Narrative MinHash/LSH over {count:,} claims ({hasher.num_perm} permutations)')
+        self.stdout.write(f'  text to signature: {text_wall / len(texts) * 1e6:.0f} us per narrative')
+        self.stdout.write(f'  build: signatures {sign_wall:.1f} s ({count / sign_wall:,.0f} claims/s), '
+                          f'band keys + index {index_wall:.1f} s')
+        self.stdout.write(self.style.SUCCESS(
+            f'  lookup: {per_lookup * 1000:.3f} ms per claim vs {per_scan * 1000:.1f} ms linear scan '
+            f'({per_scan / max(per_lookup, 1e-12):,.0f}x); recall {found}/{len(queries)} planted duplicates'
+        ))
+
+        if self.database:
+            self._benchmark_narrative_database(signatures, keys, planted, repeat)
+
+    def _benchmark_narrative_database(self, signatures, keys, planted, repeat):
+        """The same lookups through ClaimNarrativeSignature and ClaimNarrativeBucket rows"""
+        from api.models import ClaimNarrativeSignature, ClaimNarrativeBucket
+        from api.services.narrative_similarity_service import NarrativeSimilarityService
+
+        # The planted duplicates and their sources, filled up with other claims
+        queries = list(planted)[:min(200, self.database // 2)]
+        wanted = set(queries) | {planted[i] for i in queries}
+        others = (i for i in range(len(signatures)) if i not in wanted)
+        corpus = sorted(wanted) + [next(others) for _ in range(max(0, self.database - len(wanted)))]
+
+        with self._scratch_database():
+            started = time.perf_counter()
+            claim_ids = dict(zip(corpus, self._scratch_claims(len(corpus))))
+            ClaimNarrativeSignature.objects.bulk_create(
+                [ClaimNarrativeSignature(claim_id=claim_ids[i], signature=signatures[i].tobytes(), shingle_count=50)
+                 for i in corpus],
+                batch_size=2000
+            )
+            ClaimNarrativeBucket.objects.bulk_create(
+                [ClaimNarrativeBucket(claim_id=claim_ids[i], bucket=int(key)) for i in corpus for key in keys[i]],
+                batch_size=5000
+            )
+            load_wall = time.perf_counter() - started
+
+            service = NarrativeSimilarityService()
+            query_ids = [claim_ids[i] for i in queries]
+            matches = service.matches(query_ids)
+            found = sum(claim_ids[planted[i]] in {other for other, _ in matches.get(claim_ids[i], ())} for i in queries)
+            single_wall, _ = self._time(lambda: [service.matches([claim_id]) for claim_id in query_ids], repeat)
+            batch_wall, _ = self._time(lambda: service.matches(query_ids), repeat)
+
+        self.stdout.write(f'  database: {len(corpus):,} claims indexed in {load_wall:.1f} s')
+        self.stdout.write(self.style.SUCCESS(
+            f'  database lookup: {single_wall / len(queries) * 1000:.2f} ms per claim, '
+            f'{batch_wall / len(queries) * 1000:.2f} ms per claim batched; '
+            f'recall {found}/{len(queries)} planted duplicates'
+        ))
+
+    def _benchmark_audio_fingerprint(self, size, repeat):
+        from api.services.audio_fingerprint_service import (
+            AudioFingerprinter, LandmarkTable, FREQUENCY_BITS, DELTA_BITS, MAX_DELTA_FRAMES
+        )
+
+        count = size or 200_000
+        rng = self.rng
+        fingerprinter = AudioFingerprinter()
+        sample_rate = 16000
+
+        def recording(seconds):
+            # Voiced syllables: gliding harmonic tones under a Hann envelope
+            t = np.arange(int(seconds * sample_rate)) / sample_rate
+            signal = np.zeros_like(t)
+            start = 0.0
+            while start < seconds:
+                length = rng.uniform(0.1, 0.4)
+                syllable = (t >= start) & (t < start + length)
+                local = t[syllable] - start
+                f0, glide = rng.uniform(100, 250), rng.uniform(-0.3, 0.3)
+                for harmonic in range(1, 12):
+                    signal[syllable] += (np.hanning(syllable.sum()) * rng.uniform(0.1, 1) / harmonic
+                                         * np.sin(2 * np.pi * f0 * harmonic * local * (1 + glide * local)))
+                start += length + rng.uniform(0.02, 0.3)
+            return signal / np.abs(signal).max() * 12000 + rng.normal(0, 100, len(t))
+
+        # Real fingerprints for the recordings that get replayed; the rest of
+        # the corpus is random landmarks at the same density (~40 per second)
+        originals = [recording(10) for _ in range(200)]
+        fingerprint_wall, _ = self._time(lambda: fingerprinter.fingerprint(originals[0]), repeat)
+        fingerprints = [fingerprinter.fingerprint(samples) for samples in originals]
+        per_claim = int(np.mean([len(landmarks) for landmarks, _ in fingerprints]))
+
+        filler = count - len(originals)
+        claim_ids = np.concatenate(
+            [np.repeat(np.arange(len(originals)), [len(landmarks) for landmarks, _ in fingerprints]),
+             np.repeat(np.arange(len(originals), count), per_claim)]
+        ).astype(np.int32)
+        landmarks = np.concatenate(
+            [landmarks for landmarks, _ in fingerprints]
+            + [(rng.integers(0, 2 ** (2 * FREQUENCY_BITS), filler * per_claim, dtype=np.uint32) << DELTA_BITS)
+               | rng.integers(1, MAX_DELTA_FRAMES + 1, filler * per_claim, dtype=np.uint32)]
+        )
+        frames = np.concatenate(
+            [frames for _, frames in fingerprints]
+            + [rng.integers(0, 625, filler * per_claim, dtype=np.int32)]
+        )
+        started = time.perf_counter()
+        table = LandmarkTable(claim_ids, landmarks, frames)
+        index_wall = time.perf_counter() - started
+        del claim_ids, landmarks, frames
+
+        # Replays: trimmed by a fraction of a second, quieter, over background noise
+        queries = []
+        for samples in originals:
+            trim = int(rng.integers(0, sample_rate))
+            replay = samples[trim:] * rng.uniform(0.3, 1.0) + rng.normal(0, 150, len(samples) - trim)
+            queries.append(fingerprinter.fingerprint(replay))
+        unrelated = [fingerprinter.fingerprint(recording(10)) for _ in range(50)]
+
+        found = sum(
+            bool(matches) and matches[0]['claim_id'] == i
+            for i, matches in enumerate(table.find_matches(*query) for query in queries)
+        )
+        false_matches = sum(bool(table.find_matches(*query)) for query in unrelated)
+        lookup_wall, _ = self._time(lambda: [table.find_matches(*query) for query in queries], repeat)
+        # Without the index every stored landmark is tested against the query
+        scan_wall, _ = self._time(lambda: [np.isin(table.landmarks, query[0]) for query in queries[:5]], 1)
+
+        self.stdout.write(f'Audio fingerprint index over {count:,} recordings ({per_claim} landmarks each, '
+                          f'{table.landmarks.size:,} in total)')
+        self.stdout.write(f'  fingerprint: {fingerprint_wall * 1000:.1f} ms per 10 s recording; '
+                          f'index build {index_wall:.1f} s')
+        self.stdout.write(self.style.SUCCESS(
+            f'  lookup: {lookup_wall / len(queries) * 1000:.2f} ms per recording; '
+            f'{found}/{len(queries)} replays matched, {false_matches}/{len(unrelated)} unrelated recordings matched'
+        ))
+        self.stdout.write(f'  full scan: {scan_wall / 5 * 1000:.0f} ms per recording')
+
+        if self.database:
+            self._benchmark_fingerprint_database(fingerprints, per_claim, queries, unrelated, repeat)
+
+    def _benchmark_fingerprint_database(self, fingerprints, per_claim, queries, unrelated, repeat):
+        """The same lookups through AudioFingerprintHash rows"""
+        from api.models import AudioFingerprintHash
+        from api.services.audio_fingerprint_service import AudioFingerprintService
+
+        rng = self.rng
+        count = max(self.database, len(fingerprints))
+        with self._scratch_database():
+            started = time.perf_counter()
+            claim_ids = self._scratch_claims(count)
+            for claim_id, (landmarks, frames) in zip(claim_ids, fingerprints):
+                AudioFingerprintHash.objects.bulk_create(
+                    [AudioFingerprintHash(claim_id=claim_id, landmark=int(landmark), offset=int(frame))
+                     for landmark, frame in zip(landmarks, frames)],
+                    batch_size=5000
+                )
+            # Other recordings draw their landmarks from the real ones, so common
+            # landmarks are as common as in speech and lookups hit as many rows
+            pool = np.concatenate([landmarks for landmarks, _ in fingerprints])
+            for claim_id in claim_ids[len(fingerprints):]:
+                landmarks = rng.choice(pool, per_claim)
+                AudioFingerprintHash.objects.bulk_create(
+                    [AudioFingerprintHash(claim_id=claim_id, landmark=int(landmark), offset=int(frame))
+                     for landmark, frame in zip(landmarks, rng.integers(0, 625, per_claim))],
+                    batch_size=5000
+                )
+            load_wall = time.perf_counter() - started
+
+            service = AudioFingerprintService()
+            found = sum(
+                bool(matches) and matches[0]['claim_id'] == claim_ids[i]
+                for i, matches in enumerate(service.find_matches(*query) for query in queries)
+            )
+            false_matches = sum(bool(service.find_matches(*query)) for query in unrelated)
+            sample = queries[:20]
+            lookup_wall, _ = self._time(lambda: [service.find_matches(*query) for query in sample], repeat)
+
+        self.stdout.write(f'  database: {count:,} recordings ({count * per_claim:,} landmark rows) '
+                          f'indexed in {load_wall:.1f} s')
+        self.stdout.write(self.style.SUCCESS(
+            f'  database lookup: {lookup_wall / len(sample) * 1000:.1f} ms per recording; '
+            f'{found}/{len(queries)} replays matched, {false_matches}/{len(unrelated)} unrelated recordings matched'
+        ))
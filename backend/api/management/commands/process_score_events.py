@@ -0,0 +1,50 @@
+import signal
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.services import ScoreEventService
+
+
+class Command(BaseCommand):
+    help = 'Recompute user and policy Soro-Scores for coalesced score events once they are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.SCORE_RECOMPUTE_BATCH_SIZE,
+            help='Users rescored per transaction'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.SCORE_RECOMPUTE_POLL_INTERVAL,
+            help='Seconds to sleep when nothing is due'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Process everything due now and exit instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        poll_interval = options['poll_interval']
+        stop_event = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+        service = ScoreEventService()
+        started = time.perf_counter()
+        rescored = 0
+        try:
+            while not stop_event.is_set():
+                processed = service.process_due(batch_size)
+                rescored += processed
+                if processed == batch_size:
+                    continue  # more may be due; no need to wait
+                if options['once']:
+                    break
+                stop_event.wait(poll_interval)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rescored {rescored} user(s) in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,49 @@
+import signal
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.services import ScoringModelService
+
+
+class Command(BaseCommand):
+    help = 'Score claims with shadow scoring model versions alongside the live model'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.SHADOW_SCORING_BATCH_SIZE,
+            help='Live score logs re-scored per shadow version and batch'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.SHADOW_SCORING_POLL_INTERVAL,
+            help='Seconds to sleep when nothing is pending'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Score everything pending now and exit instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        stop_event = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+        service = ScoringModelService()
+        started = time.perf_counter()
+        written = 0
+        try:
+            while not stop_event.is_set():
+                batch = service.run_shadow(batch_size)
+                written += batch
+                if batch:
+                    continue
+                if options['once']:
+                    break
+                stop_event.wait(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} shadow score(s) in {time.perf_counter() - started:.1f}s'
+        ))
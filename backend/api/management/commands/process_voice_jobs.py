@@ -0,0 +1,97 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from api.services import ClaimProcessingService, PhotoHashService
+from api.services.transcription_engines import warm_up_sphinx_pool, shutdown_sphinx_pool, engine_stats
+
+
+class Command(BaseCommand):
+    help = 'Run the voice claim worker pool that processes queued VoiceProcessingJob rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.VOICE_WORKER_POOL_SIZE,
+            help='Number of concurrent workers'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.VOICE_WORKER_POLL_INTERVAL,
+            help='Seconds to sleep when the queue is empty'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain the queue and exit instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.poll_interval = options['poll_interval']
+        self.once = options['once']
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop_event.set())
+
+        # Load the offline recognizer in every pool process before taking jobs
+        if 'sphinx' in settings.TRANSCRIPTION_ENGINES:
+            warm_workers = warm_up_sphinx_pool()
+            ready = sum(1 for worker in warm_workers if worker['ready'])
+            self.stdout.write(f'Transcription pool: {ready}/{len(warm_workers)} process(es) with Sphinx loaded')
+            if not ready and warm_workers:
+                self.stderr.write(f"Sphinx unavailable, offline fallback disabled: {warm_workers[0]['error']}")
+
+        self.stdout.write(f'Starting {workers} voice worker(s)')
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='voice-worker') as pool:
+            futures = [pool.submit(self._worker_loop) for _ in range(workers)]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                self.stop_event.set()
+
+        shutdown_sphinx_pool()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {self.processed} job(s), {self.failed} failed in {elapsed:.1f}s'
+        ))
+        for name, stats in engine_stats().items():
+            self.stdout.write(
+                f"  {name}: {stats['state']}, {stats['successes']}/{stats['calls']} recognised, "
+                f"{stats['errors']} error(s), {stats['timeouts']} timeout(s), {stats['skipped']} skipped, "
+                f"avg {stats['avg_latency_ms']} ms, max {stats['max_latency_ms']} ms"
+            )
+
+    def _worker_loop(self):
+        service = ClaimProcessingService()
+        photo_service = PhotoHashService()
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                job = service.acquire_next_job()
+
+                if job is None:
+                    # Hash queued claim photos while there is no voice job waiting
+                    if photo_service.index_pending(limit=settings.PHOTO_HASH_BATCH_SIZE):
+                        continue
+                    if self.once:
+                        return
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                job = service.run_job(job)
+                with self.lock:
+                    self.processed += 1
+                    if job.status == job.JobStatus.FAILED:
+                        self.failed += 1
+                        self.stderr.write(f'Job {job.job_id} failed: {job.error}')
+        finally:
+            connection.close()
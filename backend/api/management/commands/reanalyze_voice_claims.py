@@ -0,0 +1,288 @@
+import json
+import os
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.models import Claim, VoiceAnalysis, SoroScoreLog
+from api.services import ClaimProcessingService, SoroScoreService, NarrativeSimilarityService, AudioFingerprintService
+from api.services.voice_processing_service import current_analyzer_version
+from api import reanalysis_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-run voice analysis over existing claims with audio, in id order, '
+        'resumable from a checkpoint file'
+    )
+
+    TEXT_VOICE_FIELDS = ['word_count', 'speaking_rate', 'sentiment_label', 'sentiment_scores', 'emotion_scores']
+    TEXT_CLAIM_FIELDS = ['keywords', 'sentiment_score']
+    FULL_CLAIM_FIELDS = ['transcript', 'transcript_confidence', 'keywords', 'sentiment_score', 'audio_duration']
+    SCORE_CLAIM_FIELDS = [
+        'soro_score', 'risk_level', 'auto_approval_recommended', 'inconsistency_score', 'urgency_score'
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=['text', 'full'], default='text',
+            help="'text' re-analyses stored transcripts (lexicon changes); "
+                 "'full' decodes and transcribes the audio again"
+        )
+        parser.add_argument(
+            '--rescore', action='store_true',
+            help='Recalculate Soro-Scores (and log them) after analysis; claim status is not changed'
+        )
+        parser.add_argument('--chunk-size', type=int, default=500, help='Claims read and written per batch')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 2,
+            help='Analysis processes; 0 analyses inline in this process'
+        )
+        parser.add_argument(
+            '--checkpoint', default=os.path.join(settings.BASE_DIR, 'logs', 'reanalyze_voice_claims.json'),
+            help='Progress file; an existing checkpoint for the same mode is resumed'
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many claims')
+
+    def handle(self, *args, **options):
+        self.mode = options['mode']
+        self.rescore = options['rescore']
+        self.chunk_size = max(1, options['chunk_size'])
+        self.checkpoint_path = options['checkpoint']
+        self.soro_service = SoroScoreService() if self.rescore else None
+        self.fingerprint_service = AudioFingerprintService()
+
+        self.state = self._load_checkpoint(options['restart'])
+        if self.state['last_id']:
+            self.stdout.write(
+                f"Resuming after claim id {self.state['last_id']} "
+                f"({self.state['processed']} already processed)"
+            )
+
+        limit = options['limit']
+        workers = max(0, options['workers'])
+        started = time.perf_counter()
+        processed_at_start = self.state['processed']
+
+        pool = None
+        if workers:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=reanalysis_worker.init_worker
+            )
+
+        try:
+            fetched_id = self.state['last_id']
+            remaining = limit
+            pending = None
+            while True:
+                # Read and submit the next chunk before writing the previous one,
+                # so the pool stays busy while results are saved
+                claims = []
+                if remaining is None or remaining > 0:
+                    size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                    claims = self._next_chunk(fetched_id, size)
+                submitted = None
+                if claims:
+                    fetched_id = claims[-1].id
+                    if remaining is not None:
+                        remaining -= len(claims)
+                    submitted = (claims, self._submit(pool, claims))
+
+                if pending:
+                    self._write_chunk(*pending)
+                    self._report(started, processed_at_start)
+                if submitted is None:
+                    break
+                pending = submitted
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.perf_counter() - started
+        done = self.state['processed'] - processed_at_start
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-analysed {done} claim(s), {self.state['failed']} failed in total, in {elapsed:.1f}s "
+            f"({done / elapsed if elapsed > 0 else 0:.1f} claims/s); last claim id {self.state['last_id']}"
+        ))
+
+    def _next_chunk(self, after_id, size):
+        """Keyset pagination: the next claims with audio after after_id"""
+        claims = Claim.objects.exclude(audio_file='').exclude(audio_file__isnull=True).filter(id__gt=after_id)
+        if self.mode == 'text':
+            claims = claims.exclude(transcript__isnull=True).exclude(transcript='')
+        return list(claims.order_by('id')[:size])
+
+    def _submit(self, pool, claims):
+        """Futures for a chunk's analysis jobs; without a pool they are computed inline"""
+        if self.mode == 'text':
+            jobs = [(reanalysis_worker.analyze_text, claim.id, claim.transcript, claim.audio_duration) for claim in claims]
+        else:
+            jobs = [(reanalysis_worker.analyze_audio, claim.id, claim.audio_file.path) for claim in claims]
+
+        if pool is not None:
+            return [pool.submit(func, *args) for func, *args in jobs]
+
+        futures = []
+        for func, *args in jobs:
+            future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            futures.append(future)
+        return futures
+
+    def _write_chunk(self, claims, futures):
+        results = {}
+        for future in futures:
+            try:
+                claim_id, result = future.result()
+            except BrokenProcessPool:
+                # Nothing from this chunk is written, so a rerun resumes before it
+                raise CommandError(
+                    f"An analysis process died; rerun to resume after claim id {self.state['last_id']}"
+                )
+            except Exception as e:
+                self.stderr.write(f'Analysis failed: {e}')
+                continue
+            if result.get('success'):
+                results[claim_id] = result
+            else:
+                self.stderr.write(f"Claim {claim_id}: {result.get('error', 'no transcript')}")
+
+        now = timezone.now()
+        updated_claims = [claim for claim in claims if claim.id in results]
+        voice_analyses = VoiceAnalysis.objects.in_bulk([claim.id for claim in updated_claims], field_name='claim_id')
+        recycled = {}
+        if self.mode == 'full':
+            # Index every recording before rescoring so the chunk's own recycled audio is seen
+            recycled = {
+                claim.id: self.fingerprint_service.index_claim(
+                    claim, results[claim.id]['fingerprint'], results[claim.id].get('duration')
+                )
+                for claim in updated_claims if results[claim.id].get('fingerprint') is not None
+            }
+        to_update, to_create, score_logs = [], [], []
+        voice_field_names = set()
+
+        for claim in updated_claims:
+            result = results[claim.id]
+            self._apply_to_claim(claim, result)
+            claim.updated_at = now
+
+            if self.mode == 'text':
+                # speaking_rate is missing when the claim's duration is unknown
+                voice_fields = {field: result[field] for field in self.TEXT_VOICE_FIELDS if field in result}
+            else:
+                voice_fields = ClaimProcessingService.voice_analysis_fields(result)
+            voice_analysis = voice_analyses.get(claim.id)
+            if claim.id in recycled:
+                flags = [flag for flag in (voice_analysis.flags if voice_analysis else []) if flag != 'recycled_audio']
+                voice_fields['flags'] = flags + ['recycled_audio'] if recycled[claim.id] else flags
+            voice_field_names.update(voice_fields)
+
+            if voice_analysis is None:
+                to_create.append(VoiceAnalysis(claim=claim, **voice_fields))
+            else:
+                for field, value in voice_fields.items():
+                    setattr(voice_analysis, field, value)
+                voice_analysis.updated_at = now
+                to_update.append(voice_analysis)
+
+        claim_fields = self.TEXT_CLAIM_FIELDS if self.mode == 'text' else self.FULL_CLAIM_FIELDS
+        if self.mode == 'full':
+            # bulk_update skips the signal that re-indexes changed transcripts;
+            # index first so rescoring sees the new narratives
+            NarrativeSimilarityService().index_claims(updated_claims)
+        if self.rescore:
+            # One vectorized scoring call for the whole chunk
+            for claim, underwriting_result in zip(updated_claims, self.soro_service.score_claims(updated_claims)):
+                self._apply_score(claim, underwriting_result)
+                score_logs.append(ClaimProcessingService.score_log(claim, underwriting_result))
+            claim_fields = claim_fields + self.SCORE_CLAIM_FIELDS
+
+        # bulk_update skips save(), so auto_now timestamps are set above
+        with transaction.atomic():
+            Claim.objects.bulk_update(updated_claims, claim_fields + ['updated_at'])
+            if to_update:
+                VoiceAnalysis.objects.bulk_update(to_update, sorted(voice_field_names) + ['updated_at'])
+            VoiceAnalysis.objects.bulk_create(to_create)
+            SoroScoreLog.objects.bulk_create(score_logs)
+
+        self.state['processed'] += len(claims)
+        self.state['failed'] += len(claims) - len(updated_claims)
+        self.state['last_id'] = claims[-1].id
+        self._save_checkpoint()
+
+    def _apply_to_claim(self, claim, result):
+        claim.keywords = result['keywords']
+        claim.sentiment_score = result['sentiment_score']
+        if self.mode == 'full':
+            claim.transcript = result.get('transcript')
+            claim.transcript_confidence = result.get('confidence')
+            if claim.audio_duration is None and result.get('duration'):
+                claim.audio_duration = round(result['duration'])
+
+    @staticmethod
+    def _apply_score(claim, underwriting_result):
+        components = underwriting_result['components']
+        claim.soro_score = underwriting_result['soro_score']
+        claim.risk_level = underwriting_result['risk_level']
+        claim.auto_approval_recommended = underwriting_result['auto_approval_recommended']
+        claim.inconsistency_score = components['inconsistency']
+        claim.urgency_score = components['urgency']
+
+    def _report(self, started, processed_at_start):
+        elapsed = time.perf_counter() - started
+        done = self.state['processed'] - processed_at_start
+        self.stdout.write(
+            f"  {self.state['processed']} processed, {self.state['failed']} failed, "
+            f"last id {self.state['last_id']}, {done / elapsed if elapsed > 0 else 0:.1f} claims/s"
+        )
+
+    # ------------------------------------------------------------------
+    # Checkpointing
+    # ------------------------------------------------------------------
+    def _load_checkpoint(self, restart):
+        state = {
+            'mode': self.mode,
+            'rescore': self.rescore,
+            'analyzer_version': current_analyzer_version(),
+            'last_id': 0,
+            'processed': 0,
+            'failed': 0,
+            'started_at': timezone.now().isoformat(),
+        }
+        if restart or not os.path.exists(self.checkpoint_path):
+            return state
+
+        with open(self.checkpoint_path) as f:
+            saved = json.load(f)
+        if saved.get('mode') != self.mode or saved.get('rescore') != self.rescore:
+            raise CommandError(
+                f"Checkpoint {self.checkpoint_path} is for mode={saved.get('mode')} "
+                f"rescore={saved.get('rescore')}; pass --restart or a different --checkpoint"
+            )
+        if saved.get('analyzer_version') != state['analyzer_version']:
+            self.stderr.write(
+                f"Checkpoint was written by analyzer {saved.get('analyzer_version')}, "
+                f"now {state['analyzer_version']}; earlier claims keep the old analysis"
+            )
+        state.update({key: saved[key] for key in ('last_id', 'processed', 'failed', 'started_at') if key in saved})
+        return state
+
+    def _save_checkpoint(self):
+        """Write the checkpoint atomically so a crash never leaves a torn file"""
+        self.state['updated_at'] = timezone.now().isoformat()
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        temp_path = f'{self.checkpoint_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temp_path, self.checkpoint_path)
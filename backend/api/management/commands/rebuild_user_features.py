@@ -0,0 +1,39 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from api.services import UserFeatureService
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute UserRiskFeatures (and the User claim counters) from the claim, '
+        'policy and payment tables; for backfills and after bulk writes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users rebuilt per batch')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        service = UserFeatureService()
+        users = User.objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        started = time.perf_counter()
+        rebuilt = 0
+        last_id = 0
+        while True:
+            user_ids = list(users.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+            if not user_ids:
+                break
+            service.rebuild(user_ids)
+            rebuilt += len(user_ids)
+            last_id = user_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt features for {rebuilt} user(s) in {time.perf_counter() - started:.1f}s'
+        ))
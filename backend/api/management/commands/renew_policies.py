@@ -0,0 +1,34 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from api.services import PolicyRenewalService
+
+
+class Command(BaseCommand):
+    help = 'Renew active policies nearing their end date and queue their renewal payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Renew as of this date (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--window-days', type=int, default=None,
+                            help='Renew policies ending within this many days; defaults to POLICY_RENEWAL_WINDOW_DAYS')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Policies renewed per transaction')
+
+    def handle(self, *args, **options):
+        on = None
+        if options['date']:
+            try:
+                on = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be a date (YYYY-MM-DD)')
+
+        started = time.perf_counter()
+        progress = {'processed': 0, 'total': 0, 'renewed': 0, 'skipped': 0}
+        for progress in PolicyRenewalService().renew_due(on, options['window_days'], options['chunk_size']):
+            self.stdout.write(
+                f"  {progress['processed']}/{progress['total']} processed, "
+                f"{progress['renewed']} renewed, {progress['skipped']} skipped"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Renewed {progress['renewed']} of {progress['total']} due policies "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
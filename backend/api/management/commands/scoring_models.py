@@ -0,0 +1,53 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.models import ScoringModelVersion
+from api.services import ScoringModelService
+
+
+class Command(BaseCommand):
+    help = 'List, create, shadow, promote, retire and compare Soro-Score scoring model versions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'create', 'shadow', 'promote', 'retire', 'compare'])
+        parser.add_argument('version', nargs='?', help='Scoring model version label')
+        parser.add_argument('--weights', help='JSON object of component weights (create)')
+        parser.add_argument('--auto-approve-max-score', type=float, default=None, help='Auto-approval threshold (create)')
+        parser.add_argument('--description', default='', help='What changed in this version (create)')
+
+    def handle(self, *args, **options):
+        action = options['action']
+        version = options['version']
+        service = ScoringModelService()
+
+        if action == 'list':
+            for row in ScoringModelVersion.objects.all():
+                self.stdout.write(
+                    f'{row.version:<20} {row.status:<8} threshold={row.auto_approve_max_score:g} '
+                    f'weights={json.dumps(row.weights, sort_keys=True)}'
+                )
+            return
+        if not version:
+            raise CommandError(f'{action} needs a version')
+
+        try:
+            if action == 'create':
+                if not options['weights']:
+                    raise CommandError('create needs --weights')
+                try:
+                    weights = json.loads(options['weights'])
+                except json.JSONDecodeError as e:
+                    raise CommandError(f'--weights is not valid JSON: {e}')
+                service.create_version(version, weights, options['auto_approve_max_score'], options['description'])
+            elif action == 'shadow':
+                service.start_shadow(version)
+            elif action == 'promote':
+                service.promote(version)
+            elif action == 'retire':
+                service.retire(version)
+            elif action == 'compare':
+                self.stdout.write(json.dumps(service.compare(version), indent=2, default=str))
+                return
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Scoring model {version}: {action} done'))
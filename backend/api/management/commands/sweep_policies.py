@@ -0,0 +1,30 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from api.services import PolicyLifecycleService
+
+
+class Command(BaseCommand):
+    help = 'Expire active policies past their end date and lapse those with a missed payment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Sweep as of this date (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Policies transitioned per transaction')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be a date (YYYY-MM-DD)')
+
+        started = time.perf_counter()
+        totals = {}
+        for event, count in PolicyLifecycleService().sweep(today, options['chunk_size']):
+            totals[event] = totals.get(event, 0) + count
+            self.stdout.write(f'  {event}: {totals[event]}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {totals.get('expired', 0)} and lapsed {totals.get('lapsed', 0)} policies "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
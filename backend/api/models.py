@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 import uuid
 import json
 from decimal import Decimal
@@ -58,6 +59,7 @@ class Policy(models.Model):
         EXPIRED = 'expired', _('Expired')
         CANCELLED = 'cancelled', _('Cancelled')
         PENDING = 'pending', _('Pending Payment')
+        LAPSED = 'lapsed', _('Lapsed')
     
     policy_number = models.CharField(max_length=50, unique=True, default=uuid.uuid4)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='policies')
@@ -93,6 +95,10 @@ class Policy(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Policies'
+        indexes = [
+            models.Index(fields=['status', 'end_date']),
+            models.Index(fields=['status', 'next_payment_date']),
+        ]
     
     def __str__(self):
         return f"Policy {self.policy_number} - {self.user.get_full_name()}"
@@ -103,10 +109,11 @@ class Policy(models.Model):
     
     @property
     def days_remaining(self):
-        from django.utils import timezone
+        return self.days_remaining_on(timezone.now().date())
+
+    def days_remaining_on(self, today):
         if self.end_date:
-            delta = self.end_date - timezone.now().date()
-            return max(0, delta.days)
+            return max(0, (self.end_date - today).days)
         return 0
 
 
@@ -140,6 +147,7 @@ class Claim(models.Model):
     incident_date = models.DateField()
     incident_time = models.TimeField(null=True, blank=True)
     incident_location = models.CharField(max_length=500)
+    device_id = models.CharField(max_length=100, null=True, blank=True)  # identifier of the app install that filed the claim
     
     # Claim Amount
     estimated_loss = models.DecimalField(max_digits=12, decimal_places=2)
@@ -150,6 +158,7 @@ class Claim(models.Model):
     # Voice Claim Data
     audio_file = models.FileField(upload_to='claim_audio/', null=True, blank=True)
     audio_duration = models.IntegerField(null=True, blank=True)  # in seconds
+    audio_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # SHA-256 of the audio bytes
     transcript = models.TextField(null=True, blank=True)
     transcript_confidence = models.FloatField(null=True, blank=True)
     
@@ -214,12 +223,14 @@ class VoiceAnalysis(models.Model):
     channels = models.IntegerField(null=True, blank=True)
     bit_depth = models.IntegerField(null=True, blank=True)
     audio_format = models.CharField(max_length=20, null=True, blank=True)
+    audio_codec = models.CharField(max_length=20, null=True, blank=True)
     
     # Speech Analysis
     word_count = models.IntegerField(null=True, blank=True)
     speaking_rate = models.FloatField(null=True, blank=True)  # words per minute
     pause_frequency = models.FloatField(null=True, blank=True)
     filler_word_count = models.IntegerField(null=True, blank=True)
+    transcript_segments = models.JSONField(default=list, blank=True)  # [{start, end, text, confidence, engine}]
     
     # Sentiment Analysis
     sentiment_label = models.CharField(max_length=20, null=True, blank=True)
@@ -249,11 +260,215 @@ class VoiceAnalysis(models.Model):
         return f"Voice Analysis for Claim {self.claim.claim_number}"
 
 
+class VoiceAnalysisCacheEntry(models.Model):
+    """Voice analysis result cached by audio content hash and analyzer version"""
+    audio_hash = models.CharField(max_length=64)
+    analyzer_version = models.CharField(max_length=20)
+    result = models.JSONField(default=dict)
+    
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['audio_hash', 'analyzer_version'], name='unique_audio_hash_version'),
+        ]
+    
+    def __str__(self):
+        return f"Voice Analysis Cache {self.audio_hash[:12]} (v{self.analyzer_version})"
+
+
+class ClaimNarrativeSignature(models.Model):
+    """MinHash signature of a claim's description and transcript"""
+    claim = models.OneToOneField(Claim, on_delete=models.CASCADE, primary_key=True, related_name='narrative_signature')
+    signature = models.BinaryField()  # NUM_PERM little-endian uint32 values
+    shingle_count = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Narrative signature for claim {self.claim_id}"
+
+
+class ClaimNarrativeBucket(models.Model):
+    """One LSH band bucket of a claim's narrative signature"""
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='narrative_buckets')
+    bucket = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'claim']),
+        ]
+    
+    def __str__(self):
+        return f"Narrative bucket {self.bucket} for claim {self.claim_id}"
+
+
+class ClaimPhotoHash(models.Model):
+    """Perceptual hash and EXIF capture time of one claim photo"""
+
+    class HashStatus(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        HASHED = 'hashed', _('Hashed')
+        UNREADABLE = 'unreadable', _('Unreadable')
+
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='photo_hashes')
+    position = models.PositiveSmallIntegerField()  # index in Claim.photos
+    photo = models.CharField(max_length=500)
+    status = models.CharField(max_length=20, choices=HashStatus.choices)
+    phash = models.BigIntegerField(null=True, blank=True)  # 64-bit DCT hash, stored signed
+    # The hash split into four 16-bit blocks for multi-index lookups
+    hash_block_0 = models.IntegerField(null=True, blank=True)
+    hash_block_1 = models.IntegerField(null=True, blank=True)
+    hash_block_2 = models.IntegerField(null=True, blank=True)
+    hash_block_3 = models.IntegerField(null=True, blank=True)
+    taken_at = models.DateTimeField(null=True, blank=True)  # EXIF DateTimeOriginal
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hash_block_0']),
+            models.Index(fields=['hash_block_1']),
+            models.Index(fields=['hash_block_2']),
+            models.Index(fields=['hash_block_3']),
+            models.Index(fields=['status', 'claim']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['claim', 'position'], name='unique_claim_photo_position'),
+        ]
+
+    def __str__(self):
+        return f"Photo {self.position} of claim {self.claim_id} ({self.status})"
+
+
+class ClaimAudioFingerprint(models.Model):
+    """Spectral-peak fingerprint summary of a claim recording and its matches to earlier recordings"""
+    claim = models.OneToOneField(Claim, on_delete=models.CASCADE, primary_key=True, related_name='audio_fingerprint')
+    landmark_count = models.IntegerField()
+    duration = models.FloatField(null=True, blank=True)  # seconds
+    best_match_score = models.FloatField(default=0.0)  # share of landmarks aligned with the closest recording
+    matches = models.JSONField(default=list, blank=True)  # [{claim_id, aligned_landmarks, score, offset_seconds}]
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Audio fingerprint for claim {self.claim_id}"
+
+
+class AudioFingerprintHash(models.Model):
+    """One landmark of a claim recording's fingerprint, in the inverted index"""
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='audio_fingerprint_hashes')
+    landmark = models.IntegerField()  # anchor bin, target bin and frame delta
+    offset = models.IntegerField()  # anchor frame
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['landmark', 'claim', 'offset']),
+        ]
+
+    def __str__(self):
+        return f"Landmark {self.landmark} at frame {self.offset} of claim {self.claim_id}"
+
+
+class ClaimScoreExplanation(models.Model):
+    """
+    Cached score explanation of a claim for reviewers, valid while the
+    claim is unchanged since claim_updated_at and model_version is live
+    """
+    claim = models.OneToOneField(Claim, on_delete=models.CASCADE, primary_key=True, related_name='score_explanation')
+    model_version = models.CharField(max_length=50)
+    claim_updated_at = models.DateTimeField()
+    explanation = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Score explanation for claim {self.claim_id} ({self.model_version})"
+
+
+class VoiceProcessingJob(models.Model):
+    """Queued voice claim processing job, picked up by the voice worker pool"""
+    
+    class JobStatus(models.TextChoices):
+        QUEUED = 'queued', _('Queued')
+        RUNNING = 'running', _('Running')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+    
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='processing_jobs')
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    
+    # Processing details
+    stage_timings = models.JSONField(default=dict, blank=True)  # stage -> seconds
+    result = models.JSONField(default=dict, blank=True, encoder=DecimalEncoder)
+    error = models.TextField(blank=True, null=True)
+    attempts = models.IntegerField(default=0)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Voice Job {self.job_id} - {self.get_status_display()}"
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.JobStatus.DONE, self.JobStatus.FAILED)
+
+
+class ScoringModelVersion(models.Model):
+    """
+    Versioned claim scoring parameters. One version is live; shadow versions
+    score the same claims in the background for comparison.
+    """
+    
+    class Status(models.TextChoices):
+        DRAFT = 'draft', _('Draft')
+        SHADOW = 'shadow', _('Shadow')
+        LIVE = 'live', _('Live')
+        RETIRED = 'retired', _('Retired')
+    
+    version = models.CharField(max_length=50, unique=True)
+    description = models.TextField(blank=True)
+    weights = models.JSONField(default=dict)  # component -> weight, as SORO_SCORE_WEIGHTS
+    auto_approve_max_score = models.FloatField(default=30)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.DRAFT)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    shadow_started_at = models.DateTimeField(null=True, blank=True)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['status'], condition=models.Q(status='live'), name='single_live_scoring_model'),
+        ]
+    
+    def __str__(self):
+        return f"Scoring model {self.version} ({self.get_status_display()})"
+
+
 class SoroScoreLog(models.Model):
-    """Log of Soro-Score calculations for audit trail"""
-    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='score_logs', null=True, blank=True)
+    """
+    Log of Soro-Score calculations for audit trail. Components live in their
+    columns and claim features in a packed vector, so calculation_metadata
+    only holds what has no column (flags, confidence, event details). Old
+    entries move to monthly archive files (SoroScoreLogArchive).
+    """
+    # Looked up through the (claim, calculated_at) and (user, calculated_at) indexes
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='score_logs', null=True, blank=True,
+                              db_index=False)
     policy = models.ForeignKey(Policy, on_delete=models.CASCADE, related_name='score_logs', null=True, blank=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='score_logs', null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='score_logs', null=True, blank=True,
+                             db_index=False)
     
     # Score Components
     inconsistency_score = models.FloatField()
@@ -272,19 +487,225 @@ class SoroScoreLog(models.Model):
     # Final Score
     final_soro_score = models.FloatField()
     risk_level = models.CharField(max_length=20)
+    auto_approval_recommended = models.BooleanField(null=True, blank=True)  # claim scores only
+    
+    # Scoring model; shadow entries point at the live entry they were scored alongside
+    model_version = models.CharField(max_length=50, null=True, blank=True)
+    is_shadow = models.BooleanField(default=False)
+    shadow_of = models.ForeignKey('self', on_delete=models.CASCADE, related_name='shadow_logs', null=True, blank=True)
     
     # Metadata
+    features = models.BinaryField(null=True, blank=True)  # claim features, see soro_score_service.pack_features
     calculation_metadata = models.JSONField(default=dict)
     calculated_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-calculated_at']
+        indexes = [
+            models.Index(fields=['is_shadow', 'calculated_at']),
+            models.Index(fields=['model_version', 'is_shadow']),
+            models.Index(fields=['claim', 'calculated_at']),
+            models.Index(fields=['user', 'calculated_at']),
+            models.Index(fields=['calculated_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['shadow_of', 'model_version'], name='unique_shadow_score_per_version'),
+        ]
     
     def __str__(self):
         target = self.claim or self.policy or self.user
         return f"Soro-Score Log for {target}"
 
 
+class SoroScoreLogArchive(models.Model):
+    """A gzipped NDJSON file of SoroScoreLog entries from one month, moved out of the table"""
+    month = models.DateField()  # first day of the month the entries were calculated in
+    path = models.CharField(max_length=255)  # in default storage
+    row_count = models.IntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    first_calculated_at = models.DateTimeField()
+    last_calculated_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['month', 'first_id']
+        indexes = [
+            models.Index(fields=['first_calculated_at', 'last_calculated_at']),
+        ]
+    
+    def __str__(self):
+        return f"Score log archive {self.month:%Y-%m} ({self.row_count} entries)"
+
+
+class SoroScoreLogArchiveKey(models.Model):
+    """A claim and user with entries in a SoroScoreLogArchive file, so lookups open only the files holding theirs"""
+    archive = models.ForeignKey(SoroScoreLogArchive, on_delete=models.CASCADE, related_name='keys')
+    # Plain ids rather than foreign keys: archived entries outlive deleted claims and users
+    claim_id = models.BigIntegerField(null=True, blank=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['claim_id', 'archive']),
+            models.Index(fields=['user_id', 'archive']),
+        ]
+
+    def __str__(self):
+        return f"Claim {self.claim_id} / user {self.user_id} in {self.archive_id}"
+
+
+class UserRiskFeatures(models.Model):
+    """
+    Per-user claim, policy and payment history, kept current by the signals
+    in api.signals so scoring reads one row instead of aggregating history
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='risk_features')
+    
+    # Claims
+    claim_count = models.IntegerField(default=0)
+    claims_by_status = models.JSONField(default=dict, blank=True)  # status -> count
+    claims_by_type = models.JSONField(default=dict, blank=True)  # claim type -> count
+    total_claimed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_claim_at = models.DateTimeField(null=True, blank=True)
+    
+    # Policies
+    policy_count = models.IntegerField(default=0)
+    first_policy_start = models.DateField(null=True, blank=True)  # earliest policy put in force
+    
+    # Payments
+    payments_completed = models.IntegerField(default=0)
+    payments_failed = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'User risk features'
+    
+    def __str__(self):
+        return f"Risk features for {self.user}"
+    
+    @property
+    def approved_claims(self):
+        statuses = self.claims_by_status
+        return statuses.get(Claim.ClaimStatus.APPROVED, 0) + statuses.get(Claim.ClaimStatus.PAID, 0)
+    
+    @property
+    def rejected_claims(self):
+        return self.claims_by_status.get(Claim.ClaimStatus.REJECTED, 0)
+    
+    @property
+    def days_since_last_claim(self):
+        if self.last_claim_at is None:
+            return None
+        return (timezone.now() - self.last_claim_at).days
+    
+    @property
+    def policy_tenure_days(self):
+        if self.first_policy_start is None:
+            return 0
+        return max(0, (timezone.now().date() - self.first_policy_start).days)
+    
+    @property
+    def payment_failure_rate(self):
+        attempts = self.payments_completed + self.payments_failed
+        return self.payments_failed / attempts if attempts else 0.0
+
+
+class PolicyLifecycleEvent(models.Model):
+    """
+    A policy status transition made by the lifecycle sweeper
+    (`manage.py sweep_policies`): expiry after end_date, or lapse after a
+    missed next_payment_date.
+    """
+
+    class Event(models.TextChoices):
+        EXPIRED = 'expired', _('Expired')
+        LAPSED = 'lapsed', _('Lapsed')
+
+    policy = models.ForeignKey(Policy, on_delete=models.CASCADE, related_name='lifecycle_events')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='policy_lifecycle_events')
+    event = models.CharField(max_length=20, choices=Event.choices)
+    due_date = models.DateField()  # the end_date passed or the next_payment_date missed
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['event', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Policy {self.policy_id} {self.event} ({self.due_date})"
+
+
+class ScoreRecomputeRequest(models.Model):
+    """
+    Pending user and policy Soro-Score recomputation. Events for the same
+    user coalesce into one row until it is due and processed by
+    `manage.py process_score_events`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='score_recompute_request')
+    reasons = models.JSONField(default=list, blank=True)  # distinct event names, in arrival order
+    event_count = models.IntegerField(default=1)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    due_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        ordering = ['due_at']
+    
+    def __str__(self):
+        return f"Score recompute for {self.user} ({', '.join(self.reasons)})"
+
+
+class IdentifierLink(models.Model):
+    """
+    A normalised identifier held by a user. Users holding the same value
+    are linked into one fraud ring (see FraudRingNode).
+    """
+
+    class Kind(models.TextChoices):
+        BANK_ACCOUNT = 'bank_account', _('Bank Account')
+        BVN = 'bvn', _('BVN')
+        WHATSAPP = 'whatsapp', _('WhatsApp Number')
+        DEVICE = 'device', _('Device')
+        INCIDENT_LOCATION = 'incident_location', _('Incident Location')  # place and date of a claimed incident
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='identifier_links')
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    value = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'value']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'value'], name='unique_user_identifier'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.value} of user {self.user_id}"
+
+
+class FraudRingNode(models.Model):
+    """
+    Union-find node of a linked user. Users in one ring reach the same root
+    through their parents, and the root's size is the number of users in
+    its ring; users without a node are in a ring of their own.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='fraud_ring_node')
+    # Not a constraint: nodes outlive a deleted parent until its ring is rebuilt
+    parent = models.ForeignKey('self', on_delete=models.DO_NOTHING, db_constraint=False, related_name='children')
+    rank = models.PositiveSmallIntegerField(default=0)
+    size = models.IntegerField(default=1)  # ring members; kept up to date on roots only
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Fraud ring node of user {self.user_id}"
+
+
 class Payment(models.Model):
     """Payment records for premiums and claims"""
     
@@ -0,0 +1,51 @@
+"""
+Analysis worker for `manage.py reanalyze_voice_claims`.
+
+Spawned pool processes import this module before Django is configured, so
+it has no module-level Django imports; the pool initializer runs
+django.setup() and the analyzers are imported on first use. Workers only
+compute results; all database writes happen in the parent process.
+"""
+
+
+# Per-process analyzers, created on first use
+_text_service = None
+_voice_service = None
+
+
+def init_worker():
+    """Process pool initializer: configure Django in the spawned process"""
+    import django
+    django.setup()
+
+
+def analyze_text(claim_id, transcript, duration):
+    """Re-run keyword, sentiment and emotion analysis over a stored transcript"""
+    global _text_service
+    if _text_service is None:
+        from api.services.text_analysis_service import TextAnalysisService
+        _text_service = TextAnalysisService()
+
+    analysis = _text_service.analyze(transcript)
+    result = {
+        'success': True,
+        'keywords': analysis['keywords'],
+        'word_count': analysis['word_count'],
+        'sentiment_score': analysis['sentiment']['score'],
+        'sentiment_label': analysis['sentiment']['label'],
+        'sentiment_scores': analysis['sentiment']['scores'],
+        'emotion_scores': analysis['emotion_scores'],
+    }
+    # Without a known duration the stored speaking rate is kept
+    if duration:
+        result['speaking_rate'] = analysis['word_count'] / duration * 60
+    return claim_id, result
+
+
+def analyze_audio(claim_id, audio_path):
+    """Full re-analysis: decode, audio features, transcription and text analysis"""
+    global _voice_service
+    if _voice_service is None:
+        from api.services.voice_processing_service import VoiceProcessingService
+        _voice_service = VoiceProcessingService()
+    return claim_id, _voice_service.process_voice_claim(audio_path)
@@ -1,13 +1,54 @@
+import os
 from rest_framework import serializers
+from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from .models import (
     InsuranceProduct, Policy, Claim, VoiceAnalysis,
-    SoroScoreLog, Payment, Notification, AdminDashboard
+    SoroScoreLog, Payment, Notification, AdminDashboard,
+    VoiceProcessingJob
 )
+from .services.audio_probe_service import AudioProbeService, AudioProbeError
+from .services.soro_score_service import unpack_features
 
 User = get_user_model()
 
 
+def validate_audio_upload(audio_file):
+    """
+    Reject recordings with a disallowed extension, over the upload size or
+    over AUDIO_MAX_DURATION, using only the container headers. The probed
+    metadata is attached as audio_file.audio_metadata for saving; content
+    that cannot be probed is left for the full decode to judge.
+    """
+    extension = os.path.splitext(audio_file.name)[1].lower()
+    if extension not in settings.AUDIO_ALLOWED_EXTENSIONS:
+        raise serializers.ValidationError(
+            f"Unsupported audio format '{extension}'. Allowed: {', '.join(settings.AUDIO_ALLOWED_EXTENSIONS)}"
+        )
+    if audio_file.size > settings.MAX_UPLOAD_SIZE:
+        raise serializers.ValidationError(
+            f'Audio file is too large ({audio_file.size} bytes, maximum {settings.MAX_UPLOAD_SIZE})'
+        )
+
+    try:
+        metadata = AudioProbeService().probe(audio_file)
+    except AudioProbeError as e:
+        raise serializers.ValidationError(str(e))
+
+    if metadata:
+        if f".{metadata['format']}" != extension:
+            raise serializers.ValidationError(
+                f"File content is {metadata['format']} audio but the extension is '{extension}'"
+            )
+        if metadata['duration'] is not None and metadata['duration'] > settings.AUDIO_MAX_DURATION:
+            raise serializers.ValidationError(
+                f"Recording is {metadata['duration']:.0f}s long, maximum {settings.AUDIO_MAX_DURATION}s"
+            )
+    audio_file.audio_metadata = metadata
+    return audio_file
+
+
 class InsuranceProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = InsuranceProduct
@@ -19,7 +60,7 @@ class PolicySerializer(serializers.ModelSerializer):
     user_phone = serializers.CharField(source='user.phone_number', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
     is_active = serializers.BooleanField(read_only=True)
-    days_remaining = serializers.IntegerField(read_only=True)
+    days_remaining = serializers.SerializerMethodField()
     
     class Meta:
         model = Policy
@@ -33,6 +74,20 @@ class PolicySerializer(serializers.ModelSerializer):
             'deductible_amount': {'required': False},
         }
 
+    def get_days_remaining(self, obj):
+        # Today is read once per response, not once per policy in a list
+        root = self.root
+        if not hasattr(root, '_today'):
+            root._today = timezone.now().date()
+        return obj.days_remaining_on(root._today)
+
+    def validate_premium_frequency(self, value):
+        if value not in settings.PREMIUM_FREQUENCIES:
+            raise serializers.ValidationError(
+                f"Must be one of: {', '.join(settings.PREMIUM_FREQUENCIES)}"
+            )
+        return value
+
 
 
 class VoiceAnalysisSerializer(serializers.ModelSerializer):
@@ -61,20 +116,52 @@ class ClaimSerializer(serializers.ModelSerializer):
             'user',   # Re-added as it's set by viewset perform_create
         )
     
+    def validate_audio_file(self, value):
+        return validate_audio_upload(value)
+    
     def create(self, validated_data):
         audio_file = validated_data.pop('audio_file', None)
         claim = Claim.objects.create(**validated_data)
         
         if audio_file:
+            metadata = getattr(audio_file, 'audio_metadata', None)
             claim.audio_file = audio_file
+            if metadata and metadata['duration'] is not None:
+                claim.audio_duration = round(metadata['duration'])
             claim.save()
+            
+            # Probed header fields, so processing does not need to probe again
+            if metadata:
+                VoiceAnalysis.objects.update_or_create(
+                    claim=claim,
+                    defaults={
+                        'sample_rate': metadata['sample_rate'],
+                        'channels': metadata['channels'],
+                        'bit_depth': metadata['bit_depth'],
+                        'audio_format': metadata['format'],
+                        'audio_codec': metadata['codec'],
+                    }
+                )
         
         return claim
 
 
+class VoiceProcessingJobSerializer(serializers.ModelSerializer):
+    claim_number = serializers.CharField(source='claim.claim_number', read_only=True)
+    
+    class Meta:
+        model = VoiceProcessingJob
+        fields = (
+            'job_id', 'claim', 'claim_number', 'status', 'stage_timings',
+            'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at'
+        )
+        read_only_fields = fields
+
+
 class SoroScoreLogSerializer(serializers.ModelSerializer):
     target_type = serializers.SerializerMethodField()
     target_identifier = serializers.SerializerMethodField()
+    features = serializers.SerializerMethodField()
     
     class Meta:
         model = SoroScoreLog
@@ -97,6 +184,9 @@ class SoroScoreLogSerializer(serializers.ModelSerializer):
         elif obj.user:
             return obj.user.phone_number
         return None
+    
+    def get_features(self, obj):
+        return unpack_features(obj.features) if obj.features else obj.calculation_metadata.get('features')
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -141,6 +231,9 @@ class VoiceClaimSerializer(serializers.Serializer):
         default=list
     )
     description = serializers.CharField(required=False, allow_blank=True)
+    
+    def validate_audio_file(self, value):
+        return validate_audio_upload(value)
 
 
 class UnderwritingResultSerializer(serializers.Serializer):
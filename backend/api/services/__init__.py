@@ -1,13 +1,46 @@
 from .soro_score_service import SoroScoreService
 from .voice_processing_service import VoiceProcessingService
+from .text_analysis_service import TextAnalysisService
 from .payment_service import PaymentService
 from .notification_service import NotificationService
 from .ussd_service import USSDService
+from .voice_cache_service import VoiceCacheService
+from .claim_processing_service import ClaimProcessingService
+from .user_feature_service import UserFeatureService
+from .score_event_service import ScoreEventService
+from .scoring_model_service import ScoringModelService
+from .narrative_similarity_service import NarrativeSimilarityService
+from .photo_hash_service import PhotoHashService
+from .audio_fingerprint_service import AudioFingerprintService
+from .fraud_ring_service import FraudRingService
+from .score_batch_service import ScoreBatchService, ScoreBatchError
+from .score_log_service import ScoreLogService
+from .score_explanation_service import ScoreExplanationService
+from .pricing_service import PricingService
+from .policy_renewal_service import PolicyRenewalService
+from .policy_lifecycle_service import PolicyLifecycleService
 
 __all__ = [
     'SoroScoreService',
     'VoiceProcessingService',
+    'TextAnalysisService',
     'PaymentService',
     'NotificationService',
-    'USSDService'
+    'USSDService',
+    'VoiceCacheService',
+    'ClaimProcessingService',
+    'UserFeatureService',
+    'ScoreEventService',
+    'ScoringModelService',
+    'NarrativeSimilarityService',
+    'PhotoHashService',
+    'AudioFingerprintService',
+    'FraudRingService',
+    'ScoreBatchService',
+    'ScoreBatchError',
+    'ScoreLogService',
+    'ScoreExplanationService',
+    'PricingService',
+    'PolicyRenewalService',
+    'PolicyLifecycleService'
 ]
\ No newline at end of file
@@ -0,0 +1,176 @@
+import numpy as np
+from django.conf import settings
+
+
+def frame_energy_db(samples, frame_length, hop_length):
+    """
+    Per-frame energy in dBFS for 16-bit samples, computed from a running sum
+    of squares so no frame matrix is materialised.
+    """
+    frame_count = 1 + (len(samples) - frame_length) // hop_length if len(samples) >= frame_length else 0
+    if frame_count <= 0:
+        return np.empty(0)
+    squares = np.concatenate(([0.0], np.cumsum(samples.astype(np.float64) ** 2)))
+    starts = np.arange(frame_count) * hop_length
+    power = (squares[starts + frame_length] - squares[starts]) / frame_length
+    return 10 * np.log10(power / (32768.0 ** 2) + 1e-12)
+
+
+def speech_threshold(energy, floor_db, margin_db):
+    """
+    Energy threshold separating speech from background: a margin above the
+    noise floor, or a margin below the loud frames when the clip has no
+    quiet stretches, never below floor_db.
+    """
+    noise_floor = np.percentile(energy, 10)
+    loud_level = np.percentile(energy, 90)
+    return max(floor_db, min(noise_floor + margin_db, loud_level - margin_db))
+
+
+class AudioFeatureService:
+    """
+    Frame-level acoustic features for a DecodedAudio, computed in one
+    vectorized pass over the whole signal (strided windows, running sums and
+    block-wise FFT autocorrelation; no per-sample Python loops).
+    """
+
+    FRAME_SECONDS = 0.025  # 25 ms analysis window
+    HOP_SECONDS = 0.010  # 10 ms hop
+    MIN_PITCH_HZ = 60
+    MAX_PITCH_HZ = 400
+    PITCH_FRAME_SECONDS = 0.040  # long enough for two periods at MIN_PITCH_HZ
+    VOICING_THRESHOLD = 0.45  # normalised autocorrelation peak for a voiced frame
+    OCTAVE_COST = 0.02  # per-octave penalty on longer lags, avoids sub-harmonic picks
+    MIN_PAUSE_SECONDS = 0.25
+    PITCH_BLOCK_FRAMES = 4096  # frames per FFT block, bounds peak memory
+
+    def __init__(self):
+        self.floor_db = settings.TRANSCRIPTION_VAD_FLOOR_DB
+        self.margin_db = settings.TRANSCRIPTION_VAD_MARGIN_DB
+
+    def extract(self, audio):
+        """
+        Returns VoiceAnalysis-ready features:
+        pitch_variance (std of voiced pitch in semitones), volume_variance
+        (std of speech-frame level in dB), speech_clarity (0-1 from SNR),
+        background_noise_level (noise floor, dBFS), snr_db, pause_frequency
+        (pauses per minute) and the recording format fields, None where the
+        decoder could not read them from the source.
+        """
+        features = {
+            # The decoder resamples to 16 kHz; only the source rate says anything about the upload
+            'sample_rate': audio.source_sample_rate,
+            'channels': audio.source_channels,
+            'bit_depth': audio.source_bit_depth,
+            'audio_format': audio.audio_format,
+            'duration': audio.duration,
+            'pitch_mean': None,
+            'pitch_variance': None,
+            'volume_variance': None,
+            'speech_clarity': None,
+            'background_noise_level': None,
+            'snr_db': None,
+            'pause_frequency': None,
+            'speech_ratio': 0.0,
+            'zero_crossing_rate': None,
+        }
+
+        samples = audio.samples
+        frame_length = int(audio.sample_rate * self.FRAME_SECONDS)
+        hop_length = int(audio.sample_rate * self.HOP_SECONDS)
+        energy = frame_energy_db(samples, frame_length, hop_length)
+        if not len(energy):
+            return features
+
+        speech = energy > speech_threshold(energy, self.floor_db, self.margin_db)
+        starts = np.arange(len(energy)) * hop_length
+
+        # Loudness and noise
+        noise_floor = float(np.percentile(energy, 10))
+        features['background_noise_level'] = round(noise_floor, 2)
+        features['speech_ratio'] = round(float(speech.mean()), 4)
+        if speech.any():
+            speech_level = float(10 * np.log10(np.mean(10 ** (energy[speech] / 10))))
+            snr_db = speech_level - noise_floor
+            features['snr_db'] = round(snr_db, 2)
+            features['speech_clarity'] = round(float(np.clip(snr_db / 30.0, 0.0, 1.0)), 4)
+            features['volume_variance'] = round(float(np.std(energy[speech])), 4)
+
+        # Zero-crossing rate from a running count of sign changes
+        crossings = np.concatenate(([0], np.cumsum(np.signbit(samples[1:]) != np.signbit(samples[:-1]))))
+        zcr = (crossings[np.minimum(starts + frame_length - 1, len(crossings) - 1)] - crossings[starts]) / frame_length
+        if speech.any():
+            features['zero_crossing_rate'] = round(float(np.mean(zcr[speech])), 4)
+
+        # Pitch over speech frames only
+        pitch_length = int(audio.sample_rate * self.PITCH_FRAME_SECONDS)
+        pitch_starts = starts[speech]
+        pitch = self._pitch(samples, pitch_starts[pitch_starts + pitch_length <= len(samples)],
+                            pitch_length, audio.sample_rate)
+        if len(pitch) >= 2:
+            semitones = 12 * np.log2(pitch / np.median(pitch))
+            features['pitch_mean'] = round(float(np.mean(pitch)), 2)
+            features['pitch_variance'] = round(float(np.std(semitones)), 4)
+
+        # Pauses: silent runs between speech at least MIN_PAUSE_SECONDS long
+        edges = np.diff(np.concatenate(([0], (~speech).astype(np.int8), [0])))
+        silence_starts, silence_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        inner = (silence_starts > 0) & (silence_ends < len(speech))
+        min_pause_frames = self.MIN_PAUSE_SECONDS / self.HOP_SECONDS
+        pauses = int(np.count_nonzero((silence_ends - silence_starts)[inner] >= min_pause_frames))
+        if audio.duration > 0:
+            features['pause_frequency'] = round(pauses / (audio.duration / 60.0), 4)
+
+        return features
+
+    def _pitch(self, samples, frame_starts, frame_length, sample_rate):
+        """Autocorrelation pitch (Hz) of the voiced frames among frame_starts"""
+        if not len(frame_starts):
+            return np.empty(0)
+
+        min_lag = int(sample_rate / self.MAX_PITCH_HZ)
+        max_lag = min(int(sample_rate / self.MIN_PITCH_HZ), frame_length // 2)
+        nfft = 1 << int(np.ceil(np.log2(2 * frame_length)))
+        windows = np.lib.stride_tricks.sliding_window_view(samples, frame_length)
+        taper = np.hanning(frame_length).astype(np.float32)
+
+        # Dividing by the taper's own autocorrelation undoes its decay with lag
+        taper_autocorrelation = np.fft.irfft(np.abs(np.fft.rfft(taper, n=nfft)) ** 2, n=nfft)[:max_lag + 1]
+        taper_autocorrelation /= taper_autocorrelation[0]
+        lag_range = np.arange(min_lag, max_lag + 1)
+        octave_weight = 1 - self.OCTAVE_COST * np.log2(lag_range / min_lag)
+
+        pitches = []
+        for block_start in range(0, len(frame_starts), self.PITCH_BLOCK_FRAMES):
+            block = windows[frame_starts[block_start:block_start + self.PITCH_BLOCK_FRAMES]].astype(np.float32)
+            block -= block.mean(axis=1, keepdims=True)
+            block *= taper
+
+            # Wiener-Khinchin: autocorrelation is the inverse FFT of the power spectrum
+            spectrum = np.fft.rfft(block, n=nfft, axis=1)
+            autocorrelation = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, n=nfft, axis=1)[:, :max_lag + 1]
+
+            zero_lag = autocorrelation[:, 0]
+            valid = zero_lag > 0
+            normalised = np.zeros_like(autocorrelation)
+            normalised[valid] = autocorrelation[valid] / zero_lag[valid, None] / taper_autocorrelation
+
+            lags = min_lag + np.argmax(normalised[:, min_lag:] * octave_weight, axis=1)
+            strength = normalised[np.arange(len(block)), lags]
+
+            voiced = valid & (strength > self.VOICING_THRESHOLD)
+            pitches.append(sample_rate / lags[voiced])
+
+        return np.concatenate(pitches)
+
+    @staticmethod
+    def recording_quality(features):
+        """Coarse quality label from level and signal-to-noise ratio"""
+        snr_db = features.get('snr_db')
+        if snr_db is None:
+            return 'poor'
+        if snr_db >= 20 and features['background_noise_level'] < -40:
+            return 'good'
+        if snr_db >= 10:
+            return 'fair'
+        return 'poor'
@@ -0,0 +1,314 @@
+import math
+from collections import Counter
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from ..models import Claim, ClaimAudioFingerprint, AudioFingerprintHash
+
+
+SAMPLE_RATE = 16000  # recordings are fingerprinted as decoded, 16 kHz mono
+FFT_SIZE = 1024  # 64 ms, 15.6 Hz bins
+HOP_SIZE = 256  # 16 ms frames
+PEAK_NEIGHBOURHOOD = (4, 3)  # a peak is the maximum of +-4 bins and +-3 frames around it
+PEAK_MIN_DB = 15  # above the bin's median level over the recording
+PEAKS_PER_SECOND = 10
+FAN_OUT = 5  # landmarks per anchor peak, paired with the next peaks in time
+MAX_DELTA_FRAMES = 127  # ~2 s
+
+FREQUENCY_BITS = 9
+DELTA_BITS = 7
+_DELTA_MASK = (1 << DELTA_BITS) - 1
+_LOOKUP_CHUNK = 1000  # landmarks per IN (...) query
+
+
+def _sliding_max(values, radius, axis):
+    """Maximum over a window of +-radius along axis, the edges padded with -inf"""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (radius, radius)
+    padded = np.pad(values, pad, constant_values=-np.inf)
+    return np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1, axis=axis).max(axis=-1)
+
+
+class AudioFingerprinter:
+    """
+    Spectral-peak ("landmark") fingerprints. The strongest local maxima of
+    the log spectrogram are paired with the next few peaks after them, and
+    each pair is hashed to (anchor frequency, target frequency, frame
+    delta). Peaks survive gain changes, re-encoding and moderate noise, and
+    a pair's hash does not depend on where the recording starts, so a
+    replayed or trimmed recording shares many landmarks with the original
+    at one constant time offset.
+    """
+
+    def fingerprint(self, samples):
+        """(landmarks uint32, anchor frames int32) for 16 kHz int16 or float samples"""
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) < FFT_SIZE:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+        spectrogram = self._spectrogram(samples)
+        frames, bins = self._peaks(spectrogram, len(samples) / SAMPLE_RATE)
+        return self._landmarks(frames, bins)
+
+    @staticmethod
+    def _spectrogram(samples):
+        """(frames, FFT_SIZE // 2) log magnitude, the top bin dropped so frequencies fit FREQUENCY_BITS"""
+        windows = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+        magnitude = np.abs(np.fft.rfft(windows * np.hanning(FFT_SIZE), axis=1))[:, :FFT_SIZE // 2]
+        return 20 * np.log10(magnitude + 1e-6)
+
+    @staticmethod
+    def _peaks(spectrogram, duration):
+        """Frame and bin of the strongest local maxima, in time order"""
+        bin_radius, frame_radius = PEAK_NEIGHBOURHOOD
+        local_max = _sliding_max(_sliding_max(spectrogram, bin_radius, axis=1), frame_radius, axis=0)
+        # Ignore maxima in silence and steady noise: they must stand out from the bin's typical level
+        candidates = (spectrogram == local_max) & (spectrogram > np.median(spectrogram, axis=0) + PEAK_MIN_DB)
+        frames, bins = np.nonzero(candidates)
+        keep = max(1, int(duration * PEAKS_PER_SECOND))
+        if len(frames) > keep:
+            strongest = np.argpartition(spectrogram[frames, bins], -keep)[-keep:]
+            frames, bins = frames[strongest], bins[strongest]
+        order = np.lexsort((bins, frames))
+        return frames[order], bins[order]
+
+    @staticmethod
+    def _landmarks(frames, bins):
+        landmarks, anchors = [], []
+        for step in range(1, FAN_OUT + 1):
+            delta = frames[step:] - frames[:-step]
+            valid = (delta >= 1) & (delta <= MAX_DELTA_FRAMES)
+            anchor_bins, target_bins = bins[:-step][valid], bins[step:][valid]
+            landmarks.append(
+                (anchor_bins.astype(np.uint32) << (FREQUENCY_BITS + DELTA_BITS))
+                | (target_bins.astype(np.uint32) << DELTA_BITS)
+                | delta[valid].astype(np.uint32)
+            )
+            anchors.append(frames[:-step][valid])
+        if not landmarks:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+        return np.concatenate(landmarks), np.concatenate(anchors).astype(np.int32)
+
+
+def with_delta_neighbours(landmarks, frames):
+    """
+    The landmarks plus copies with the frame delta one lower and one
+    higher: a recording trimmed by a fraction of a frame can move a peak
+    into the neighbouring frame.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.int64)
+    frames = np.asarray(frames, dtype=np.int64)
+    deltas = landmarks & _DELTA_MASK
+    all_landmarks, all_frames = [landmarks], [frames]
+    for step in (-1, 1):
+        shifted = deltas + step
+        valid = (shifted >= 1) & (shifted <= MAX_DELTA_FRAMES)
+        all_landmarks.append((landmarks[valid] & ~_DELTA_MASK) | shifted[valid])
+        all_frames.append(frames[valid])
+    return np.concatenate(all_landmarks), np.concatenate(all_frames)
+
+
+def align(query_landmarks, query_frames, landmarks, frames):
+    """
+    (aligned landmark count, frame offset) of the best alignment between
+    a query fingerprint and another recording's landmark hits: the number
+    of shared landmarks that agree on one time offset, give or take a frame.
+    """
+    order = np.argsort(query_landmarks, kind='stable')
+    sorted_landmarks, sorted_frames = query_landmarks[order], query_frames[order]
+    left = np.searchsorted(sorted_landmarks, landmarks, 'left')
+    right = np.searchsorted(sorted_landmarks, landmarks, 'right')
+    counts = right - left
+    if not counts.sum():
+        return 0, 0
+    # Pair every hit with every query anchor that has its landmark
+    positions = np.repeat(left, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    offsets = np.repeat(frames, counts) - sorted_frames[positions]
+    values, occurrences = np.unique(offsets, return_counts=True)
+    # Count each offset together with its neighbours
+    cumulative = np.concatenate(([0], np.cumsum(occurrences)))
+    window = (
+        cumulative[np.searchsorted(values, values + 1, 'right')]
+        - cumulative[np.searchsorted(values, values - 1, 'left')]
+    )
+    best = int(np.argmax(window))
+    return int(window[best]), int(values[best])
+
+
+def rank_matches(landmark_count, query_landmarks, query_frames, hits):
+    """
+    Matches, best first, from (claim_id, landmark, frame) hit rows for a
+    query of landmark_count landmarks (query_* include the delta neighbours).
+    """
+    hits = hits[np.argsort(hits[:, 0], kind='stable')]
+    claim_ids, starts, counts = np.unique(hits[:, 0], return_index=True, return_counts=True)
+
+    matches = []
+    # Alignment is only worth counting for claims with enough hits to pass
+    for i in np.flatnonzero(counts >= settings.AUDIO_FINGERPRINT_MIN_MATCHES):
+        rows = hits[starts[i]:starts[i] + counts[i]]
+        aligned, offset = align(query_landmarks, query_frames, rows[:, 1], rows[:, 2])
+        score = min(1.0, aligned / landmark_count)
+        if aligned >= settings.AUDIO_FINGERPRINT_MIN_MATCHES and score >= settings.AUDIO_FINGERPRINT_MIN_SCORE:
+            matches.append({
+                'claim_id': int(claim_ids[i]),
+                'aligned_landmarks': aligned,
+                'score': round(score, 4),
+                'offset_seconds': round(offset * HOP_SIZE / SAMPLE_RATE, 2),
+            })
+    matches.sort(key=lambda match: (-match['score'], match['claim_id']))
+    return matches[:settings.AUDIO_FINGERPRINT_MAX_MATCHES]
+
+
+class LandmarkTable:
+    """
+    In-memory landmark index over a fixed set of fingerprints, sorted once
+    and looked up by binary search; the same matching as the database
+    index, for offline analysis and benchmarks.
+    """
+
+    def __init__(self, claim_ids, landmarks, frames):
+        order = np.argsort(landmarks, kind='stable')
+        self.landmarks = np.asarray(landmarks)[order]
+        self.claim_ids = np.asarray(claim_ids)[order]
+        self.frames = np.asarray(frames)[order]
+
+    def find_matches(self, landmarks, frames):
+        query_landmarks, query_frames = with_delta_neighbours(landmarks, frames)
+        # Same dtype as the table, or searchsorted converts the whole table
+        unique = np.unique(query_landmarks).astype(self.landmarks.dtype)
+        left = np.searchsorted(self.landmarks, unique, 'left')
+        right = np.searchsorted(self.landmarks, unique, 'right')
+        counts = right - left
+        rows = np.repeat(left, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        hits = np.column_stack([self.claim_ids[rows], self.landmarks[rows], self.frames[rows]]).astype(np.int64)
+        return rank_matches(len(landmarks), query_landmarks, query_frames, hits)
+
+
+class AudioFingerprintService:
+    """
+    Inverted landmark index over claim recordings for recycled audio.
+
+    Every fingerprinted claim stores one AudioFingerprintHash row per
+    landmark, indexed by landmark. A new recording is matched in two steps.
+    First the database counts, per prior claim, the rows sharing its
+    landmarks (indexed range scans grouped by claim). Then the rows of the
+    AUDIO_FINGERPRINT_MAX_CANDIDATES claims sharing the most are fetched,
+    and the landmarks that line up at one time offset are counted. The
+    matches are kept on the claim's ClaimAudioFingerprint for scoring and
+    review.
+    """
+
+    def __init__(self):
+        self.fingerprinter = AudioFingerprinter()
+
+    def fingerprint(self, audio):
+        """Fingerprint of a DecodedAudio"""
+        return self.fingerprinter.fingerprint(audio.samples)
+
+    def index_claim(self, claim, fingerprint, duration=None):
+        """
+        Match the claim's (landmarks, frames) fingerprint against prior
+        recordings and (re)index it; returns the matches, best first.
+        """
+        landmarks, frames = fingerprint
+        matches = self.find_matches(landmarks, frames, exclude_claim_id=claim.pk)
+        with transaction.atomic():
+            AudioFingerprintHash.objects.filter(claim_id=claim.pk).delete()
+            ClaimAudioFingerprint.objects.update_or_create(
+                claim_id=claim.pk,
+                defaults={
+                    'landmark_count': len(landmarks),
+                    'duration': duration,
+                    'best_match_score': matches[0]['score'] if matches else 0.0,
+                    'matches': matches,
+                }
+            )
+            AudioFingerprintHash.objects.bulk_create(
+                [
+                    AudioFingerprintHash(claim_id=claim.pk, landmark=int(landmark), offset=int(frame))
+                    for landmark, frame in zip(landmarks, frames)
+                ],
+                batch_size=2000
+            )
+        return matches
+
+    def find_matches(self, landmarks, frames, exclude_claim_id=None):
+        """
+        Prior claims whose recordings share at least
+        AUDIO_FINGERPRINT_MIN_MATCHES time-aligned landmarks with this one,
+        covering at least AUDIO_FINGERPRINT_MIN_SCORE of its landmarks.
+        """
+        if not len(landmarks):
+            return []
+        query_landmarks, query_frames = with_delta_neighbours(landmarks, frames)
+
+        unique = np.unique(query_landmarks).tolist()
+        chunks = [unique[start:start + _LOOKUP_CHUNK] for start in range(0, len(unique), _LOOKUP_CHUNK)]
+        rows = AudioFingerprintHash.objects.all()
+        if exclude_claim_id is not None:
+            rows = rows.exclude(claim_id=exclude_claim_id)
+
+        # A claim with AUDIO_FINGERPRINT_MIN_MATCHES shared landmarks has at
+        # least its share of them within one chunk, so smaller counts are
+        # dropped in the database
+        floor = math.ceil(settings.AUDIO_FINGERPRINT_MIN_MATCHES / len(chunks))
+        shared = Counter()
+        for chunk in chunks:
+            shared.update(dict(
+                rows.filter(landmark__in=chunk).values('claim_id')
+                .annotate(hits=Count('*')).filter(hits__gte=floor).values_list('claim_id', 'hits')
+            ))
+        candidates = [claim_id for claim_id, _ in shared.most_common(settings.AUDIO_FINGERPRINT_MAX_CANDIDATES)]
+        if not candidates:
+            return []
+
+        hits = []
+        for chunk in chunks:
+            hits.extend(
+                rows.filter(claim_id__in=candidates, landmark__in=chunk).values_list('claim_id', 'landmark', 'offset')
+            )
+        if not hits:
+            return []
+
+        return rank_matches(len(landmarks), query_landmarks, query_frames, np.array(hits, dtype=np.int64))
+
+    @staticmethod
+    def indexed_fingerprint(audio_hash, exclude_claim_id=None):
+        """
+        ((landmarks, frames), duration) as indexed for another claim with the
+        same audio bytes, or None; saves decoding a recording again.
+        """
+        source = (
+            ClaimAudioFingerprint.objects.filter(claim__audio_hash=audio_hash)
+            .exclude(claim_id=exclude_claim_id).values_list('claim_id', 'duration').first()
+        )
+        if source is None:
+            return None
+        rows = np.array(
+            list(AudioFingerprintHash.objects.filter(claim_id=source[0]).values_list('landmark', 'offset')),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        return (rows[:, 0], rows[:, 1]), source[1]
+
+    @staticmethod
+    def match_scores(claim_ids):
+        """{claim_id: best recycled-audio score} for fingerprinted claims"""
+        return dict(
+            ClaimAudioFingerprint.objects.filter(claim_id__in=claim_ids).values_list('claim_id', 'best_match_score')
+        )
+
+    @staticmethod
+    def recycled_audio(claim):
+        """The claim's recording matches with claim numbers, for reviewers"""
+        fingerprint = ClaimAudioFingerprint.objects.filter(claim_id=claim.pk).first()
+        if fingerprint is None:
+            return []
+        numbers = dict(
+            Claim.objects.filter(id__in=[match['claim_id'] for match in fingerprint.matches])
+            .values_list('id', 'claim_number')
+        )
+        return [
+            {**match, 'claim_number': numbers[match['claim_id']]}
+            for match in fingerprint.matches if match['claim_id'] in numbers
+        ]
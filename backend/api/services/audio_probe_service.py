@@ -0,0 +1,256 @@
+import os
+import struct
+
+
+class AudioProbeError(Exception):
+    """The file looked like a known container but its headers are unusable"""
+
+
+# MPEG audio frame header tables, indexed by [version][layer]
+_MPEG_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MPEG_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+_WAV_CODECS = {1: 'pcm', 3: 'ieee_float', 6: 'alaw', 7: 'mulaw', 0xFFFE: 'extensible'}
+
+# MP4 boxes that only contain other boxes on the path to the audio sample description
+_MP4_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+class AudioProbeService:
+    """
+    Reads duration, codec, channels and sample rate from container headers
+    (WAV, MP3, Ogg Vorbis/Opus, MP4/M4A) without decoding. Only header bytes
+    and, for Ogg, the final page are read; payloads are skipped with seeks,
+    so memory use is constant in the file size.
+    """
+
+    SCAN_BYTES = 64 * 1024  # window searched for the first MP3 frame / last Ogg page
+    MAX_BOXES = 512  # guards against malformed MP4 box trees
+
+    def probe(self, audio_file):
+        """
+        Probe an open binary file (or Django UploadedFile). Returns a dict with
+        format, codec, duration (seconds), channels, sample_rate and bit_depth,
+        or None when the content is not a recognised container. The read
+        position is restored afterwards.
+        """
+        position = audio_file.tell()
+        try:
+            audio_file.seek(0, os.SEEK_END)
+            self.file_size = audio_file.tell()
+            audio_file.seek(0)
+            head = audio_file.read(12)
+
+            if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+                probe = self._probe_wav
+            elif head[:4] == b'OggS':
+                probe = self._probe_ogg
+            elif head[4:8] == b'ftyp':
+                probe = self._probe_mp4
+            elif head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+                probe = self._probe_mp3
+            else:
+                return None
+
+            try:
+                return probe(audio_file)
+            except (struct.error, ValueError, IndexError, ZeroDivisionError) as e:
+                raise AudioProbeError(f'Corrupt audio header: {e}')
+        finally:
+            audio_file.seek(position)
+
+    @staticmethod
+    def _metadata(audio_format, codec, duration, channels, sample_rate, bit_depth=None):
+        return {
+            'format': audio_format,
+            'codec': codec,
+            'duration': round(duration, 3) if duration is not None else None,
+            'channels': channels,
+            'sample_rate': sample_rate,
+            'bit_depth': bit_depth,
+        }
+
+    def _probe_wav(self, f):
+        f.seek(12)
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+            if chunk_id == b'fmt ':
+                codec_tag, channels, sample_rate, byte_rate, _, bit_depth = struct.unpack('<HHIIHH', f.read(16))
+                fmt = (codec_tag, channels, sample_rate, byte_rate, bit_depth)
+                f.seek(chunk_size - 16 + chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    break
+                codec_tag, channels, sample_rate, byte_rate, bit_depth = fmt
+                # Streamed recorders leave the size unset; fall back to the bytes present
+                available = self.file_size - f.tell()
+                data_size = chunk_size if 0 < chunk_size <= available else available
+                return self._metadata(
+                    'wav', _WAV_CODECS.get(codec_tag, f'0x{codec_tag:04x}'),
+                    data_size / byte_rate, channels, sample_rate, bit_depth
+                )
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+        raise AudioProbeError('WAV file has no fmt/data chunk')
+
+    def _probe_mp3(self, f):
+        f.seek(0)
+        audio_start = 0
+        header = f.read(10)
+        if header[:3] == b'ID3':
+            # Syncsafe size; a footer adds another 10 bytes
+            tag_size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+            audio_start = 10 + tag_size + (10 if header[5] & 0x10 else 0)
+
+        f.seek(audio_start)
+        window = f.read(self.SCAN_BYTES)
+        for offset in range(len(window) - 4):
+            frame = self._mpeg_frame(window[offset:offset + 4])
+            if frame is not None:
+                break
+        else:
+            raise AudioProbeError('No MPEG audio frame found')
+
+        version, layer, bitrate, sample_rate, channels = frame
+        samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+
+        # VBR files carry the frame count in a Xing/Info or VBRI header in the first frame
+        side_info = (32 if channels == 2 else 17) if version == 1 else (17 if channels == 2 else 9)
+        frame_count = None
+        xing = window[offset + 4 + side_info:offset + 4 + side_info + 12]
+        vbri = window[offset + 36:offset + 36 + 18]
+        if xing[:4] in (b'Xing', b'Info') and struct.unpack('>I', xing[4:8])[0] & 1:
+            frame_count = struct.unpack('>I', xing[8:12])[0]
+        elif vbri[:4] == b'VBRI':
+            frame_count = struct.unpack('>I', vbri[14:18])[0]
+
+        if frame_count:
+            duration = frame_count * samples_per_frame / sample_rate
+        else:
+            duration = (self.file_size - audio_start - offset) * 8 / (bitrate * 1000)
+
+        return self._metadata('mp3', f'mpeg{version}-layer{layer}', duration, channels, sample_rate)
+
+    @staticmethod
+    def _mpeg_frame(header):
+        """(version, layer, kbps, sample_rate, channels) for a valid frame header, else None"""
+        if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+            return None
+        version = {3: 1, 2: 2, 0: 2.5}.get((header[1] >> 3) & 3)
+        layer = {3: 1, 2: 2, 1: 3}.get((header[1] >> 1) & 3)
+        bitrate_index, rate_index = header[2] >> 4, (header[2] >> 2) & 3
+        if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+            return None
+
+        bitrate = _MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+        sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+        channels = 1 if header[3] >> 6 == 3 else 2
+        return version, layer, bitrate, sample_rate, channels
+
+    def _probe_ogg(self, f):
+        f.seek(0)
+        page = f.read(27)
+        serial = page[14:18]
+        segment_count = page[26]
+        payload_size = sum(f.read(segment_count))
+        identification = f.read(min(payload_size, 64))
+
+        if identification[:7] == b'\x01vorbis':
+            codec = 'vorbis'
+            channels, sample_rate = struct.unpack('<BI', identification[11:16])
+            granule_rate, pre_skip = sample_rate, 0
+        elif identification[:8] == b'OpusHead':
+            codec = 'opus'
+            channels, pre_skip, sample_rate = struct.unpack('<BHI', identification[9:16])
+            granule_rate = 48000  # Opus granule positions are always 48 kHz
+        else:
+            raise AudioProbeError('Unsupported Ogg codec')
+
+        # Duration is the granule position of the stream's last page
+        f.seek(max(0, self.file_size - self.SCAN_BYTES))
+        tail = f.read(self.SCAN_BYTES)
+        duration = None
+        index = tail.rfind(b'OggS')
+        while index != -1:
+            if tail[index + 14:index + 18] == serial:
+                granule = struct.unpack('<q', tail[index + 6:index + 14])[0]
+                if granule >= 0:
+                    duration = max(0, granule - pre_skip) / granule_rate
+                    break
+            index = tail.rfind(b'OggS', 0, index)
+
+        return self._metadata('ogg', codec, duration, channels, sample_rate)
+
+    def _probe_mp4(self, f):
+        found = {}
+        self._walk_mp4(f, 0, self.file_size, found, [0])
+        if 'codec' not in found:
+            raise AudioProbeError('No audio track found in MP4 container')
+
+        duration = None
+        if found.get('track_timescale'):
+            duration = found['track_duration'] / found['track_timescale']
+        elif found.get('movie_timescale'):
+            duration = found['movie_duration'] / found['movie_timescale']
+        return self._metadata('m4a', found['codec'], duration, found['channels'], found['sample_rate'],
+                              found.get('bit_depth'))
+
+    def _walk_mp4(self, f, start, end, found, box_count):
+        position = start
+        track = {}
+        while position + 8 <= end:
+            box_count[0] += 1
+            if box_count[0] > self.MAX_BOXES:
+                raise AudioProbeError('Too many MP4 boxes')
+
+            f.seek(position)
+            size, box_type = struct.unpack('>I4s', f.read(8))
+            header_size = 8
+            if size == 1:
+                size = struct.unpack('>Q', f.read(8))[0]
+                header_size = 16
+            elif size == 0:
+                size = end - position
+            if size < header_size:
+                raise AudioProbeError('Invalid MP4 box size')
+            body = position + header_size
+
+            if box_type in _MP4_CONTAINERS:
+                self._walk_mp4(f, body, position + size, found if box_type != b'trak' else track, box_count)
+                if box_type == b'trak' and track.get('handler') == b'soun' and 'codec' not in found:
+                    found.update(track)
+                track = {}
+            elif box_type in (b'mvhd', b'mdhd'):
+                version = f.read(1)[0]
+                f.seek(3 + (16 if version == 1 else 8), os.SEEK_CUR)
+                if version == 1:
+                    timescale, duration = struct.unpack('>IQ', f.read(12))
+                else:
+                    timescale, duration = struct.unpack('>II', f.read(8))
+                prefix = 'movie' if box_type == b'mvhd' else 'track'
+                found[f'{prefix}_timescale'], found[f'{prefix}_duration'] = timescale, duration
+            elif box_type == b'hdlr':
+                f.seek(8, os.SEEK_CUR)
+                found['handler'] = f.read(4)
+            elif box_type == b'stsd':
+                # First sample entry: AudioSampleEntry layout (ISO/IEC 14496-12)
+                f.seek(8, os.SEEK_CUR)
+                entry = f.read(36)
+                found['codec'] = entry[4:8].decode('latin-1').strip()
+                found['channels'], found['bit_depth'] = struct.unpack('>HH', entry[24:28])
+                found['sample_rate'] = struct.unpack('>I', entry[32:36])[0] >> 16
+
+            position += size
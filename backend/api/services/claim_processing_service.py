@@ -0,0 +1,324 @@
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import Claim, VoiceAnalysis, SoroScoreLog, VoiceProcessingJob, ClaimAudioFingerprint
+from .voice_processing_service import VoiceProcessingService
+from .soro_score_service import SoroScoreService, pack_features
+from .voice_cache_service import VoiceCacheService
+from .audio_fingerprint_service import AudioFingerprintService
+from .photo_hash_service import PhotoHashService
+from .score_explanation_service import ScoreExplanationService
+from .notification_service import NotificationService
+
+
+# Underwriting result entries a SoroScoreLog keeps in columns (or, like the
+# recommendation, derives from them) rather than in calculation_metadata
+LOGGED_IN_COLUMNS = {
+    'soro_score', 'risk_level', 'auto_approval_recommended', 'recommendation', 'components', 'features',
+    'model_version',
+}
+
+
+class ClaimProcessingService:
+    """
+    Runs the voice claim pipeline (voice analysis, scoring, persistence,
+    notification) either inline or through queued VoiceProcessingJob rows.
+    Worker loops keep one instance so its services are reused across jobs.
+    """
+
+    def __init__(self):
+        self.voice_service = VoiceProcessingService()
+        self.soro_service = SoroScoreService()
+        self.cache_service = VoiceCacheService()
+        self.fingerprint_service = AudioFingerprintService()
+        self.explanation_service = ScoreExplanationService()
+        self.photo_service = PhotoHashService()
+
+    def process_claim(self, claim, timings=None):
+        """
+        Process a voice claim and return (underwriting_result, stage_timings).
+        Pass a timings dict to keep per-stage timings even if a stage raises.
+        """
+        timings = {} if timings is None else timings
+
+        with self._stage('voice_analysis', timings):
+            analysis_result = self._analyze_audio(claim)
+
+        # Update claim with voice analysis
+        claim.transcript = analysis_result.get('transcript')
+        claim.transcript_confidence = analysis_result.get('confidence')
+        claim.keywords = analysis_result.get('keywords', [])
+        claim.sentiment_score = analysis_result.get('sentiment_score')
+
+        with self._stage('scoring', timings):
+            underwriting_result = self.soro_service.calculate_claim_score(claim)
+
+        # Re-used recordings are a fraud signal in their own right
+        if analysis_result['duplicate_audio_claims']:
+            underwriting_result['flags'] = list(underwriting_result.get('flags', [])) + ['duplicate_audio']
+            underwriting_result['duplicate_audio_claims'] = analysis_result['duplicate_audio_claims']
+        if analysis_result['recycled_audio_claims']:
+            underwriting_result['recycled_audio_claims'] = analysis_result['recycled_audio_claims']
+
+        with self._stage('persistence', timings):
+            self._save_results(claim, analysis_result, underwriting_result)
+
+        with self._stage('notification', timings):
+            if claim.auto_approval_recommended:
+                NotificationService.send_claim_notification(
+                    claim.user,
+                    'voice',
+                    'Claim Auto-Approved',
+                    f'Your claim {claim.claim_number} has been automatically approved.',
+                    claim=claim
+                )
+
+        return underwriting_result, timings
+
+    def _analyze_audio(self, claim):
+        """Voice analysis, served from the content-hash cache when possible"""
+        audio_path = claim.audio_file.path
+        audio_hash = self.cache_service.hash_file(audio_path)
+
+        analysis_result = self.cache_service.get(audio_hash)
+        cache_hit = analysis_result is not None
+        fingerprint = None
+        if not cache_hit:
+            analysis_result = self.voice_service.process_voice_claim(audio_path)
+            fingerprint = analysis_result.pop('fingerprint', None)
+            # Only complete analyses are cached; failures may be transient
+            if analysis_result.get('success'):
+                self.cache_service.put(audio_hash, analysis_result)
+
+        previous_hash, claim.audio_hash = claim.audio_hash, audio_hash
+        analysis_result = dict(analysis_result)
+        analysis_result['cache_hit'] = cache_hit
+        analysis_result['duplicate_audio_claims'] = self.cache_service.find_duplicate_claims(claim, audio_hash)
+        analysis_result['recycled_audio_claims'] = self._match_recording(
+            claim, audio_path, fingerprint, analysis_result, previous_hash
+        )
+        return analysis_result
+
+    def _match_recording(self, claim, audio_path, fingerprint, analysis_result, previous_hash=None):
+        """Index the recording's fingerprint and return the earlier recordings it matches"""
+        duration = analysis_result.get('duration')
+        if fingerprint is None:
+            # Cached analyses carry no fingerprint: reuse the one indexed for these
+            # bytes before decoding the recording again
+            if previous_hash == claim.audio_hash:
+                indexed = ClaimAudioFingerprint.objects.filter(claim_id=claim.pk).values_list('matches', flat=True)
+                if indexed:
+                    return indexed[0]
+            copied = self.fingerprint_service.indexed_fingerprint(claim.audio_hash, exclude_claim_id=claim.pk)
+            if copied is not None:
+                fingerprint, duration = copied[0], duration or copied[1]
+            else:
+                try:
+                    landmarks, frames = self.voice_service.fingerprint(audio_path)
+                except Exception:
+                    return []
+                fingerprint = (landmarks, frames)
+        return self.fingerprint_service.index_claim(claim, fingerprint, duration)
+
+    @staticmethod
+    def voice_analysis_fields(analysis_result):
+        """VoiceAnalysis field values from a process_voice_claim result"""
+        features = analysis_result.get('audio_features', {})
+        fields = {
+            'word_count': analysis_result.get('word_count'),
+            'speaking_rate': analysis_result.get('speaking_rate'),
+            'sentiment_label': analysis_result.get('sentiment_label'),
+            'sentiment_scores': analysis_result.get('sentiment_scores', {}),
+            'emotion_scores': analysis_result.get('emotion_scores', {}),
+            'recording_quality': analysis_result.get('recording_quality'),
+            'confidence_score': analysis_result.get('confidence'),
+            'transcript_segments': analysis_result.get('segments', []),
+            'pitch_variance': features.get('pitch_variance'),
+            'volume_variance': features.get('volume_variance'),
+            'speech_clarity': features.get('speech_clarity'),
+            'background_noise_level': features.get('background_noise_level'),
+            'pause_frequency': features.get('pause_frequency'),
+        }
+        # Format fields the decoder could not determine keep their upload-time probed values
+        for field in ('sample_rate', 'channels', 'bit_depth', 'audio_format'):
+            if features.get(field) is not None:
+                fields[field] = features[field]
+        return fields
+
+    @staticmethod
+    def score_log(claim, underwriting_result):
+        """Unsaved SoroScoreLog recording a claim score calculation; claim is None for inline features"""
+        components = underwriting_result['components']
+        return SoroScoreLog(
+            claim=claim,
+            user_id=claim.user_id if claim else None,
+            inconsistency_score=components['inconsistency'],
+            urgency_score=components['urgency'],
+            sentiment_score=components['sentiment'],
+            media_integrity_score=components['media_integrity'],
+            historical_score=components['historical'],
+            weighted_inconsistency=components['weighted_inconsistency'],
+            weighted_urgency=components['weighted_urgency'],
+            weighted_sentiment=components['weighted_sentiment'],
+            weighted_media=components['weighted_media'],
+            weighted_historical=components['weighted_historical'],
+            final_soro_score=underwriting_result['soro_score'],
+            risk_level=underwriting_result['risk_level'],
+            auto_approval_recommended=underwriting_result['auto_approval_recommended'],
+            model_version=underwriting_result.get('model_version'),
+            features=pack_features(underwriting_result['features']) if 'features' in underwriting_result else None,
+            calculation_metadata={
+                key: value for key, value in underwriting_result.items() if key not in LOGGED_IN_COLUMNS
+            }
+        )
+
+    def _save_results(self, claim, analysis_result, underwriting_result):
+        """Write claim, voice analysis, score log and score explanation in one transaction"""
+        components = underwriting_result['components']
+
+        claim.soro_score = underwriting_result['soro_score']
+        claim.risk_level = underwriting_result['risk_level']
+        claim.auto_approval_recommended = underwriting_result['auto_approval_recommended']
+        claim.inconsistency_score = components['inconsistency']
+        claim.urgency_score = components['urgency']
+        if claim.auto_approval_recommended:
+            claim.status = Claim.ClaimStatus.APPROVED
+
+        if claim.audio_duration is None and analysis_result.get('duration'):
+            claim.audio_duration = round(analysis_result['duration'])
+
+        with transaction.atomic():
+            claim.save()
+
+            # Re-submissions replace the previous analysis
+            defaults = self.voice_analysis_fields(analysis_result)
+            defaults['flags'] = [
+                flag for flag, claims in (
+                    ('duplicate_audio', analysis_result.get('duplicate_audio_claims')),
+                    ('recycled_audio', analysis_result.get('recycled_audio_claims')),
+                ) if claims
+            ]
+            VoiceAnalysis.objects.update_or_create(claim=claim, defaults=defaults)
+
+            # Log Soro-Score calculation
+            self.score_log(claim, underwriting_result).save()
+
+            # Reviewers read the explanation from here until the claim or model changes
+            if 'features' in underwriting_result:
+                self.explanation_service.store(claim, underwriting_result)
+
+    @staticmethod
+    @contextmanager
+    def _stage(name, timings):
+        """Record wall-clock seconds spent in a pipeline stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = round(time.perf_counter() - started, 4)
+
+    # ------------------------------------------------------------------
+    # Queued processing
+    # ------------------------------------------------------------------
+    def enqueue(self, claim):
+        """
+        Queue a claim for processing, reusing any unfinished job. A job left
+        RUNNING past VOICE_JOB_TIMEOUT_SECONDS lost its worker; it is failed
+        and replaced rather than reused.
+        """
+        cutoff = self._stale_cutoff()
+        claim.processing_jobs.filter(
+            status=VoiceProcessingJob.JobStatus.RUNNING, started_at__lt=cutoff
+        ).update(
+            status=VoiceProcessingJob.JobStatus.FAILED,
+            error='Worker stopped responding; superseded by a new job',
+            finished_at=timezone.now()
+        )
+        job = claim.processing_jobs.filter(
+            status__in=[VoiceProcessingJob.JobStatus.QUEUED, VoiceProcessingJob.JobStatus.RUNNING]
+        ).first()
+        if job is None:
+            job = VoiceProcessingJob.objects.create(claim=claim)
+        return job
+
+    def acquire_next_job(self):
+        """
+        Atomically move the oldest queued job to RUNNING and return it.
+        Uses a conditional UPDATE so several workers can poll the same table.
+        Stale RUNNING jobs are reaped first, so a killed worker's job is retried.
+        """
+        self.reap_stale_jobs()
+        candidates = VoiceProcessingJob.objects.filter(
+            status=VoiceProcessingJob.JobStatus.QUEUED
+        ).order_by('created_at').values_list('pk', flat=True)[:10]
+
+        for pk in candidates:
+            acquired = VoiceProcessingJob.objects.filter(
+                pk=pk, status=VoiceProcessingJob.JobStatus.QUEUED
+            ).update(
+                status=VoiceProcessingJob.JobStatus.RUNNING,
+                started_at=timezone.now(),
+                attempts=F('attempts') + 1
+            )
+            if acquired:
+                return VoiceProcessingJob.objects.select_related('claim', 'claim__user').get(pk=pk)
+        return None
+
+    def reap_stale_jobs(self):
+        """
+        Requeue jobs left RUNNING for over VOICE_JOB_TIMEOUT_SECONDS (their
+        worker was killed mid-job), or fail them once they have been tried
+        VOICE_JOB_MAX_ATTEMPTS times; returns (requeued, failed).
+        """
+        stale = VoiceProcessingJob.objects.filter(
+            status=VoiceProcessingJob.JobStatus.RUNNING, started_at__lt=self._stale_cutoff()
+        )
+        failed = stale.filter(attempts__gte=settings.VOICE_JOB_MAX_ATTEMPTS).update(
+            status=VoiceProcessingJob.JobStatus.FAILED,
+            error=f'Worker stopped responding after {settings.VOICE_JOB_MAX_ATTEMPTS} attempt(s)',
+            finished_at=timezone.now()
+        )
+        requeued = stale.filter(attempts__lt=settings.VOICE_JOB_MAX_ATTEMPTS).update(
+            status=VoiceProcessingJob.JobStatus.QUEUED, started_at=None
+        )
+        return requeued, failed
+
+    @staticmethod
+    def _stale_cutoff():
+        return timezone.now() - timedelta(seconds=settings.VOICE_JOB_TIMEOUT_SECONDS)
+
+    def run_job(self, job):
+        """Run a RUNNING job to completion and record its outcome"""
+        claim = job.claim
+
+        if not claim.audio_file:
+            return self._finish_job(job, VoiceProcessingJob.JobStatus.FAILED,
+                                    error='No audio file found for voice claim')
+
+        timings = {}
+        try:
+            # Score with the claim's photos hashed even if the worker has not reached them yet
+            self.photo_service.index_pending(claim_ids=[claim.pk])
+            underwriting_result, timings = self.process_claim(claim, timings)
+        except Exception as e:
+            return self._finish_job(job, VoiceProcessingJob.JobStatus.FAILED,
+                                    timings=timings, error=str(e))
+
+        return self._finish_job(job, VoiceProcessingJob.JobStatus.DONE,
+                                result=underwriting_result, timings=timings)
+
+    def _finish_job(self, job, status, result=None, timings=None, error=None):
+        job.status = status
+        job.result = result or {}
+        job.stage_timings = timings or {}
+        job.error = error
+        job.finished_at = timezone.now()
+        if job.started_at:
+            job.stage_timings['queued'] = round((job.started_at - job.created_at).total_seconds(), 4)
+            job.stage_timings['total'] = round((job.finished_at - job.started_at).total_seconds(), 4)
+        job.save()
+        return job
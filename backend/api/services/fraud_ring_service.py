@@ -0,0 +1,348 @@
+import re
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+from ..models import Claim, IdentifierLink, FraudRingNode
+
+User = get_user_model()
+Kind = IdentifierLink.Kind
+
+USER_IDENTIFIER_FIELDS = ('bank_account_number', 'bvn', 'whatsapp_number')
+
+_NON_DIGITS = re.compile(r'\D')
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def _digits(value):
+    return _NON_DIGITS.sub('', value or '')
+
+
+def normalise_phone(value):
+    """Last ten digits, so +234 803 ..., 234803... and 0803... agree"""
+    digits = _digits(value)
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def normalise_location(location, incident_date):
+    """Incident date and lower-case words of the location, or None when too vague to identify a place"""
+    words = _NON_WORD.sub(' ', (location or '').lower()).split()
+    # "Lagos, Nigeria" names a city, not the scene of an incident
+    if len(words) < settings.FRAUD_RING_MIN_LOCATION_WORDS or incident_date is None:
+        return None
+    return f"{incident_date.isoformat()} {' '.join(words)}"[:255]
+
+
+def user_identifiers(user, claims=()):
+    """{(kind, value)} for a user's account fields and their claims"""
+    identifiers = set()
+    bank_account = _digits(user.bank_account_number)
+    if len(bank_account) >= 10:
+        identifiers.add((Kind.BANK_ACCOUNT, bank_account))
+    bvn = _digits(user.bvn)
+    if len(bvn) == 11:
+        identifiers.add((Kind.BVN, bvn))
+    whatsapp = normalise_phone(user.whatsapp_number)
+    if whatsapp:
+        identifiers.add((Kind.WHATSAPP, whatsapp))
+    for claim in claims:
+        device = (claim.device_id or '').strip().lower()
+        if device:
+            identifiers.add((Kind.DEVICE, device[:255]))
+        location = normalise_location(claim.incident_location, claim.incident_date)
+        if location:
+            identifiers.add((Kind.INCIDENT_LOCATION, location))
+    return identifiers
+
+
+def _identifier_query(keys):
+    """Q matching IdentifierLink rows with any of the (kind, value) keys"""
+    by_kind = {}
+    for kind, value in keys:
+        by_kind.setdefault(kind, []).append(value)
+    query = Q(pk__in=[])
+    for kind, values in by_kind.items():
+        query |= Q(kind=kind, value__in=values)
+    return query
+
+
+class FraudRingService:
+    """
+    Fraud rings: users linked, directly or through others, by a shared
+    bank account, BVN, WhatsApp number, device or incident place and date.
+
+    Each user's normalised identifiers are kept as IdentifierLink rows, and
+    the rings as a union-find forest of FraudRingNode rows (union by rank,
+    path compression). A new shared identifier is one union; ring size is a
+    walk to the root, a few primary-key lookups. Identifiers that go away
+    can split a ring, which union-find cannot undo, so the rings they touch
+    are rebuilt from their members' links.
+
+    Bulk queryset writes bypass the signals; run
+    `manage.py rebuild_fraud_rings` after them.
+    """
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def roots(self, user_ids):
+        """{user_id: root user id of their ring}, one query per tree level, without writing"""
+        parents = {}
+        pending = set(user_ids)
+        while pending:
+            found = dict(FraudRingNode.objects.filter(pk__in=pending).values_list('pk', 'parent_id'))
+            for user_id in pending:
+                parents[user_id] = found.get(user_id, user_id)
+            pending = {parent for parent in found.values() if parent not in parents}
+
+        def root(user_id):
+            while parents[user_id] != user_id:
+                user_id = parents[user_id]
+            return user_id
+
+        return {user_id: root(user_id) for user_id in user_ids}
+
+    def ring_sizes(self, user_ids):
+        """{user_id: number of users in their ring, themselves included}"""
+        roots = self.roots(user_ids)
+        sizes = dict(FraudRingNode.objects.filter(pk__in=set(roots.values())).values_list('pk', 'size'))
+        return {user_id: sizes.get(root, 1) for user_id, root in roots.items()}
+
+    def find(self, user_id):
+        """Root user id of the user's ring, pointing the nodes walked straight at it"""
+        path = []
+        node = user_id
+        while True:
+            parent = FraudRingNode.objects.filter(pk=node).values_list('parent_id', flat=True).first()
+            if parent is None or parent == node:
+                break
+            path.append(node)
+            node = parent
+        if len(path) > 1:
+            FraudRingNode.objects.filter(pk__in=path[:-1]).update(parent_id=node)
+        return node
+
+    def members(self, user_id):
+        """User ids in the user's ring, root first; one query per tree level"""
+        root = self.find(user_id)
+        members = [root]
+        level = [root]
+        while level:
+            level = list(
+                FraudRingNode.objects.filter(parent_id__in=level).exclude(pk__in=level).values_list('pk', flat=True)
+            )
+            members.extend(level)
+        return members
+
+    def ring(self, user_id):
+        """The user's ring with its members and the identifiers they share, for admins"""
+        members = self.members(user_id)
+        users = User.objects.in_bulk(members)
+        holders = {}
+        for member, kind, value in (
+            IdentifierLink.objects.filter(user_id__in=members).order_by('kind', 'value', 'user_id')
+            .values_list('user_id', 'kind', 'value')
+        ):
+            holders.setdefault((kind, value), []).append(member)
+        return {
+            'user_id': user_id,
+            'ring_size': len(members),
+            'members': [
+                {
+                    'id': member,
+                    'full_name': users[member].get_full_name(),
+                    'phone_number': users[member].phone_number,
+                    'soro_score': users[member].soro_score,
+                }
+                for member in sorted(members) if member in users
+            ],
+            'shared_identifiers': [
+                {'kind': kind, 'value': value, 'user_ids': user_ids}
+                for (kind, value), user_ids in holders.items() if len(user_ids) > 1
+            ],
+        }
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def user_saved(self, user, created=False):
+        """Apply a registration or a change to the user's bank account, BVN or WhatsApp number"""
+        # A new user has no claims yet
+        self.sync_user(user, claims=() if created else None)
+
+    def claim_changed(self, claim):
+        """Apply a new or deleted claim, or a change to its device or incident place and date"""
+        user = User.objects.only(*USER_IDENTIFIER_FIELDS).filter(pk=claim.user_id).first()
+        if user is not None:
+            self.sync_user(user)
+
+    def sync_user(self, user, claims=None):
+        """Bring the user's identifier links and ring up to date"""
+        cap = settings.FRAUD_RING_MAX_SHARED_USERS
+        with transaction.atomic():
+            added, removed = self.sync_links(user, claims)
+            if not added and not removed:
+                return
+            counts = self._holder_counts(added | removed)
+            rebuild = set()
+            for key in added:
+                count = counts.get(key, 0)
+                if count == cap + 1:
+                    # Just became too common: the rings it built no longer hold
+                    rebuild.update(self._holders([key]))
+                elif 1 < count <= cap:
+                    # Every other holder is already in one ring
+                    other = (
+                        IdentifierLink.objects.filter(kind=key[0], value=key[1]).exclude(user_id=user.pk)
+                        .values_list('user_id', flat=True).first()
+                    )
+                    self.union(user.pk, other)
+            for key in removed:
+                count = counts.get(key, 0)
+                if 1 <= count < cap:
+                    # It linked the user to the remaining holders
+                    rebuild.add(user.pk)
+                elif count == cap:
+                    # Rare enough to link its holders again
+                    rebuild.update(self._holders([key]))
+            if rebuild:
+                self.rebuild_rings(rebuild)
+
+    def sync_links(self, user, claims=None):
+        """Replace the user's IdentifierLink rows; returns the (added, removed) (kind, value) sets"""
+        if claims is None:
+            claims = Claim.objects.filter(user_id=user.pk).only('device_id', 'incident_location', 'incident_date')
+        desired = user_identifiers(user, claims)
+        current = set(IdentifierLink.objects.filter(user_id=user.pk).values_list('kind', 'value'))
+        added, removed = desired - current, current - desired
+        if removed:
+            IdentifierLink.objects.filter(_identifier_query(removed), user_id=user.pk).delete()
+        if added:
+            IdentifierLink.objects.bulk_create(
+                [IdentifierLink(user_id=user.pk, kind=kind, value=value) for kind, value in added],
+                ignore_conflicts=True
+            )
+        return added, removed
+
+    def union(self, user_a, user_b):
+        """Merge the two users' rings; returns the root of the merged ring"""
+        with transaction.atomic():
+            while True:
+                root_a, root_b = self.find(user_a), self.find(user_b)
+                if root_a == root_b:
+                    return root_a
+                FraudRingNode.objects.bulk_create(
+                    [FraudRingNode(user_id=root, parent_id=root) for root in (root_a, root_b)],
+                    ignore_conflicts=True
+                )
+                nodes = FraudRingNode.objects.select_for_update().in_bulk([root_a, root_b])
+                a, b = nodes[root_a], nodes[root_b]
+                # Another writer may have merged either ring since the walk
+                if a.parent_id == a.pk and b.parent_id == b.pk:
+                    break
+            if a.rank < b.rank:
+                a, b = b, a
+            b.parent_id = a.pk
+            a.size += b.size
+            if a.rank == b.rank:
+                a.rank += 1
+            a.save(update_fields=['size', 'rank', 'updated_at'])
+            b.save(update_fields=['parent', 'updated_at'])
+            return a.pk
+
+    # ------------------------------------------------------------------
+    # Rebuilds
+    # ------------------------------------------------------------------
+    def rebuild_rings(self, user_ids):
+        """Recompute the rings of these users from their members' links; returns the users rebuilt"""
+        affected = set(user_ids)
+        for root in set(self.roots(user_ids).values()):
+            affected.update(self.members(root))
+        existing = set(User.objects.filter(pk__in=affected).values_list('pk', flat=True))
+        links = list(IdentifierLink.objects.filter(user_id__in=existing).values_list('user_id', 'kind', 'value'))
+
+        with transaction.atomic():
+            FraudRingNode.objects.filter(pk__in=affected).delete()
+            outside = self._write_rings(links)
+            # Holders outside the rebuilt rings (normally none) are merged back in
+            for user_id, other in outside:
+                self.union(user_id, other)
+        return existing
+
+    def rebuild_all(self):
+        """Recompute every ring from the IdentifierLink table; returns the number of users in rings of two or more"""
+        with transaction.atomic():
+            FraudRingNode.objects.all().delete()
+            links = IdentifierLink.objects.values_list('user_id', 'kind', 'value').iterator(chunk_size=10000)
+            self._write_rings(links, complete=True)
+        return FraudRingNode.objects.filter(size__gt=1).count()
+
+    def _write_rings(self, links, complete=False):
+        """
+        Union the (user_id, kind, value) links in memory and save the rings
+        as flat trees; returns (holder, other holder) pairs for linking values
+        also held by users not in links. complete means links is the whole
+        table, so holder counts need no queries.
+        """
+        holders = {}
+        for user_id, kind, value in links:
+            holders.setdefault((kind, value), []).append(user_id)
+        if complete:
+            counts = {key: len(user_ids) for key, user_ids in holders.items()}
+        else:
+            counts = self._holder_counts(holders)
+        cap = settings.FRAUD_RING_MAX_SHARED_USERS
+
+        parent = {}
+
+        def find(user_id):
+            parent.setdefault(user_id, user_id)
+            while parent[user_id] != user_id:
+                parent[user_id] = parent[parent[user_id]]
+                user_id = parent[user_id]
+            return user_id
+
+        outside = []
+        for key, user_ids in holders.items():
+            if not 1 < counts.get(key, 0) <= cap:
+                continue
+            first = find(user_ids[0])
+            for user_id in user_ids[1:]:
+                parent[find(user_id)] = first
+                first = find(first)
+            if counts[key] > len(user_ids):
+                outside.append((user_ids[0], key))
+
+        rings = {}
+        for user_id in list(parent):
+            rings.setdefault(find(user_id), []).append(user_id)
+        FraudRingNode.objects.bulk_create(
+            [
+                FraudRingNode(user_id=user_id, parent_id=root, rank=int(user_id == root), size=len(ring_members))
+                for root, ring_members in rings.items() if len(ring_members) > 1
+                for user_id in ring_members
+            ],
+            batch_size=2000
+        )
+        return [
+            (user_id, IdentifierLink.objects.filter(kind=key[0], value=key[1]).exclude(user_id__in=holders[key])
+             .values_list('user_id', flat=True).first())
+            for user_id, key in outside
+        ]
+
+    @staticmethod
+    def _holder_counts(keys):
+        """{(kind, value): number of users holding it}"""
+        keys = list(keys)
+        counts = {}
+        for start in range(0, len(keys), 500):
+            counts.update(
+                ((row['kind'], row['value']), row['holders'])
+                for row in IdentifierLink.objects.filter(_identifier_query(keys[start:start + 500]))
+                .values('kind', 'value').annotate(holders=Count('user_id'))
+            )
+        return counts
+
+    @staticmethod
+    def _holders(keys):
+        return set(IdentifierLink.objects.filter(_identifier_query(keys)).values_list('user_id', flat=True))
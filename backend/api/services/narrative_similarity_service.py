@@ -0,0 +1,209 @@
+import zlib
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from ..models import Claim, ClaimNarrativeSignature, ClaimNarrativeBucket
+from .text_analysis_service import tokenize
+
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands of 4 rows: candidate pairs from about 0.5 Jaccard similarity
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3  # word 3-grams
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_MASK = np.uint64(0xFFFFFFFF)
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+_CHUNK = 1 << 18  # shingle hashes permuted at once
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles. The permutations come from a
+    fixed seed, so signatures are stable across processes and deploys.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        # a, b < 2**32 keep a * x + b within uint64 for 32-bit x
+        self.a = rng.integers(1, 2 ** 32 - 1, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2 ** 32 - 1, num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    @staticmethod
+    def shingle_hashes(text, min_tokens=0):
+        """Distinct CRC-32 hashes of the text's word shingles; empty below min_tokens"""
+        tokens = tokenize(text or '')
+        if not tokens or len(tokens) < min_tokens:
+            return np.empty(0, dtype=np.uint32)
+        size = min(SHINGLE_SIZE, len(tokens))
+        shingles = {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+        return np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles), dtype=np.uint32, count=len(shingles))
+
+    def signature(self, text, min_tokens=0):
+        """(num_perm,) uint32 signature, or None for text with too few tokens"""
+        hashes = self.shingle_hashes(text, min_tokens)
+        if not len(hashes):
+            return None
+        return self.signatures([hashes])[0]
+
+    def signatures(self, hash_sets):
+        """(len(hash_sets), num_perm) signatures for non-empty arrays of shingle hashes, in one pass"""
+        lengths = np.array([len(hashes) for hashes in hash_sets])
+        flat = np.concatenate(hash_sets).astype(np.uint64)
+        owner = np.repeat(np.arange(len(hash_sets)), lengths)
+
+        # Permutations run along rows so each per-document minimum is a contiguous reduction
+        result = np.full((self.num_perm, len(hash_sets)), np.iinfo(np.uint32).max, dtype=np.uint64)
+        a, b = self.a[:, None], self.b[:, None]
+        for chunk_start in range(0, len(flat), _CHUNK):
+            chunk = flat[chunk_start:chunk_start + _CHUNK]
+            permuted = ((a * chunk + b) % _PRIME) & _MASK
+            # Minimum per document within the chunk, merged into the running result
+            documents = owner[chunk_start:chunk_start + len(chunk)]
+            offsets = np.concatenate([[0], np.flatnonzero(np.diff(documents)) + 1])
+            columns = documents[offsets]
+            result[:, columns] = np.minimum(result[:, columns], np.minimum.reduceat(permuted, offsets, axis=1))
+        return np.ascontiguousarray(result.T, dtype=np.uint32)
+
+    @staticmethod
+    def band_keys(signatures):
+        """(n, BANDS) int64 LSH bucket keys: an FNV-1a hash of each band's rows and its index"""
+        signatures = np.asarray(signatures, dtype=np.uint64).reshape(-1, BANDS, ROWS)
+        keys = np.broadcast_to(_FNV_OFFSET ^ np.arange(BANDS, dtype=np.uint64), signatures.shape[:2]).copy()
+        for row in range(ROWS):
+            keys = (keys ^ signatures[:, :, row]) * _FNV_PRIME
+        return keys.view(np.int64)
+
+    @staticmethod
+    def similarity(signature, others):
+        """Estimated Jaccard similarity of signature to each row of others"""
+        return (np.asarray(others) == signature).mean(axis=-1)
+
+
+class LSHTable:
+    """
+    In-memory LSH index over a fixed set of signatures: each band's keys
+    sorted once, looked up by binary search. The same banding as the
+    database index, for offline analysis and benchmarks.
+    """
+
+    def __init__(self, keys):
+        keys = np.asarray(keys)
+        self.order = np.argsort(keys, axis=0, kind='stable')
+        self.sorted_keys = np.take_along_axis(keys, self.order, axis=0)
+
+    def candidates(self, keys):
+        """Row indices sharing at least one band bucket with keys"""
+        found = []
+        for band, key in enumerate(keys):
+            column = self.sorted_keys[:, band]
+            left, right = np.searchsorted(column, key, 'left'), np.searchsorted(column, key, 'right')
+            found.append(self.order[left:right, band])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+
+class NarrativeSimilarityService:
+    """
+    Near-duplicate claim narratives (description plus transcript) by MinHash
+    with locality-sensitive hashing. Each indexed claim stores its signature
+    and one ClaimNarrativeBucket row per band; a lookup fetches the claims
+    sharing any of its BANDS bucket keys through the bucket index and ranks
+    only those by estimated similarity, instead of comparing against every
+    claim. Narratives shorter than NARRATIVE_MIN_TOKENS words are not indexed.
+    """
+
+    def __init__(self):
+        self.hasher = MinHasher()
+
+    @staticmethod
+    def narrative(claim):
+        return ' '.join(text for text in (claim.description, claim.transcript) if text)
+
+    def index_claims(self, claims):
+        """(Re)index the narratives of saved claims"""
+        min_tokens = settings.NARRATIVE_MIN_TOKENS
+        hashes = {claim.id: self.hasher.shingle_hashes(self.narrative(claim), min_tokens) for claim in claims}
+        indexed = [claim_id for claim_id, claim_hashes in hashes.items() if len(claim_hashes)]
+
+        signature_rows, bucket_rows = [], []
+        if indexed:
+            signatures = self.hasher.signatures([hashes[claim_id] for claim_id in indexed])
+            keys = self.hasher.band_keys(signatures)
+            for claim_id, signature, claim_keys in zip(indexed, signatures, keys):
+                signature_rows.append(ClaimNarrativeSignature(
+                    claim_id=claim_id, signature=signature.tobytes(), shingle_count=len(hashes[claim_id])
+                ))
+                bucket_rows.extend(ClaimNarrativeBucket(claim_id=claim_id, bucket=int(key)) for key in claim_keys)
+
+        with transaction.atomic():
+            ClaimNarrativeBucket.objects.filter(claim_id__in=hashes).delete()
+            ClaimNarrativeSignature.objects.filter(claim_id__in=hashes).delete()
+            ClaimNarrativeSignature.objects.bulk_create(signature_rows)
+            ClaimNarrativeBucket.objects.bulk_create(bucket_rows)
+        return len(signature_rows)
+
+    def matches(self, claim_ids, threshold=None):
+        """
+        {claim_id: [(other claim id, similarity), ...]} best first, for
+        indexed claims; three queries for the whole batch.
+        """
+        threshold = settings.NARRATIVE_SIMILARITY_THRESHOLD if threshold is None else threshold
+        signatures = self._signatures(claim_ids)
+        if not signatures:
+            return {}
+
+        own_keys = {claim_id: self.hasher.band_keys(signature)[0] for claim_id, signature in signatures.items()}
+        bucket_claims = {}
+        rows = ClaimNarrativeBucket.objects.filter(
+            bucket__in={int(key) for keys in own_keys.values() for key in keys}
+        ).values_list('bucket', 'claim_id')
+        for bucket, claim_id in rows:
+            bucket_claims.setdefault(bucket, set()).add(claim_id)
+
+        candidates = {
+            claim_id: set().union(*(bucket_claims.get(int(key), ()) for key in keys)) - {claim_id}
+            for claim_id, keys in own_keys.items()
+        }
+        candidate_signatures = self._signatures(set().union(*candidates.values()))
+
+        results = {}
+        for claim_id, others in candidates.items():
+            others = [other for other in others if other in candidate_signatures]
+            if not others:
+                results[claim_id] = []
+                continue
+            scores = self.hasher.similarity(signatures[claim_id], [candidate_signatures[other] for other in others])
+            ranked = sorted(zip(others, scores.tolist()), key=lambda match: (-match[1], match[0]))
+            results[claim_id] = [(other, round(score, 4)) for other, score in ranked if score >= threshold]
+        return results
+
+    def max_similarities(self, claim_ids):
+        """{claim_id: highest similarity to any other claim}, 0.0 when there is none"""
+        matches = self.matches(claim_ids, threshold=0)
+        return {claim_id: (matches.get(claim_id) or [(None, 0.0)])[0][1] for claim_id in claim_ids}
+
+    def similar_claims(self, claim, threshold=None, limit=None):
+        """Near-duplicate claims of claim for reviewers, most similar first"""
+        limit = limit or settings.NARRATIVE_MAX_MATCHES
+        ranked = self.matches([claim.id], threshold).get(claim.id, [])[:limit]
+        others = Claim.objects.in_bulk([claim_id for claim_id, _ in ranked])
+        return [
+            {
+                'claim_id': claim_id,
+                'claim_number': others[claim_id].claim_number,
+                'user_id': others[claim_id].user_id,
+                'status': others[claim_id].status,
+                'similarity': similarity,
+            }
+            for claim_id, similarity in ranked if claim_id in others
+        ]
+
+    @staticmethod
+    def _signatures(claim_ids):
+        return {
+            claim_id: np.frombuffer(bytes(signature), dtype=np.uint32)
+            for claim_id, signature in ClaimNarrativeSignature.objects.filter(claim_id__in=claim_ids)
+            .values_list('claim_id', 'signature')
+        }
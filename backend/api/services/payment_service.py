@@ -252,7 +252,7 @@ class PaymentService:
 
     def _update_after_payment(self, payment):
         """Update related objects after successful payment"""
-        if payment.payment_type == 'premium' and payment.policy:
+        if payment.payment_type in ('premium', 'renewal') and payment.policy:
             # Activate policy
             policy = payment.policy
             policy.status = Policy.PolicyStatus.ACTIVE
@@ -274,10 +274,4 @@ class PaymentService:
             claim.status = Claim.ClaimStatus.PAID
             claim.payment_reference = payment.payment_reference
             claim.paid_at = timezone.now()
-            claim.save()
-
-            # Update user stats
-            user = claim.user
-            user.approved_claims += 1
-            user.total_claims += 1
-            user.save()
\ No newline at end of file
+            claim.save()
\ No newline at end of file
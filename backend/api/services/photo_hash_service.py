@@ -0,0 +1,313 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import combinations
+from urllib.parse import urlparse
+import numpy as np
+import requests
+from PIL import Image, UnidentifiedImageError
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from ..models import Claim, ClaimPhotoHash
+
+HASH_SIZE = 8  # 8 x 8 low-frequency DCT coefficients -> 64-bit hash
+DCT_SIZE = 32
+BLOCKS = 4
+BLOCK_BITS = 64 // BLOCKS
+PROBE_CHUNK_SIZE = 500  # block values per candidate query, well under database parameter limits
+_BLOCK_MASK = (1 << BLOCK_BITS) - 1
+_UNSIGNED = 1 << 64
+
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+
+def _dct_matrix(size):
+    """Orthonormal DCT-II matrix: D @ x is the DCT of column vector x"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Threads that fetch and hash photos; decoding and resizing release the GIL"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PHOTO_HASH_WORKERS,
+                thread_name_prefix='photo-hash'
+            )
+        return _executor
+
+
+def perceptual_hash(image):
+    """
+    64-bit DCT perceptual hash (pHash) as an unsigned int: the image is
+    reduced to 32 x 32 greyscale, and each of the 8 x 8 lowest-frequency DCT
+    coefficients contributes a bit for being above their median. Resizing,
+    recompression and small edits change only a few bits.
+    """
+    pixels = np.asarray(image.convert('L').resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS), dtype=float)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term is the mean brightness; it is left out of the median
+    bits = coefficients > np.median(coefficients[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def exif_taken_at(image):
+    """EXIF capture time (DateTimeOriginal, else DateTime) as an aware datetime, or None"""
+    exif = image.getexif()
+    value = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    if not isinstance(value, str):
+        return None
+    try:
+        taken_at = datetime.strptime(value.strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+    return timezone.make_aware(taken_at)
+
+
+def hash_blocks(phash):
+    """The four 16-bit blocks of an unsigned 64-bit hash, most significant first"""
+    return [(phash >> (BLOCK_BITS * (BLOCKS - 1 - i))) & _BLOCK_MASK for i in range(BLOCKS)]
+
+
+def block_neighbours(block, radius):
+    """Every 16-bit value within radius bits of block"""
+    values = [block]
+    for distance in range(1, radius + 1):
+        for positions in combinations(range(BLOCK_BITS), distance):
+            flipped = block
+            for position in positions:
+                flipped ^= 1 << position
+            values.append(flipped)
+    return values
+
+
+def _signed(phash):
+    return phash - _UNSIGNED if phash >= 1 << 63 else phash
+
+
+def _unsigned(phash):
+    return phash % _UNSIGNED
+
+
+class PhotoHashService:
+    """
+    Perceptual-hash index over claim photos for the media-integrity score.
+
+    When a claim is submitted its photos are queued as PENDING ClaimPhotoHash
+    rows, written with the claim. The voice worker (`manage.py
+    process_voice_jobs`) or `manage.py index_claim_photos` later fetches
+    each photo, hashes it and reads its EXIF capture time in a shared thread
+    pool, off the request path. Reuse is found by multi-index hashing: the 64-bit
+    hash is split into four indexed 16-bit blocks, and any photo within
+    PHOTO_HASH_MAX_DISTANCE bits must match one block within
+    PHOTO_HASH_MAX_DISTANCE // 4 bits (pigeonhole). One indexed query fetches
+    those candidates and only they are compared bit by bit.
+    """
+
+    # ------------------------------------------------------------------
+    # Indexing
+    # ------------------------------------------------------------------
+    def queue_claim(self, claim):
+        """Replace the claim's rows with PENDING ones for its current photos; cheap enough for a request"""
+        with transaction.atomic():
+            ClaimPhotoHash.objects.filter(claim_id=claim.pk).delete()
+            ClaimPhotoHash.objects.bulk_create([
+                ClaimPhotoHash(claim_id=claim.pk, position=position, photo=photo[:500],
+                               status=ClaimPhotoHash.HashStatus.PENDING)
+                for position, photo in enumerate(claim.photos or ())
+            ])
+
+    def index_pending(self, limit=None, claim_ids=None):
+        """
+        Hash the photos of claims with PENDING rows, oldest queued first;
+        returns the number of claims indexed. A claim whose photos were
+        queued again while being hashed is left for the next pass.
+        """
+        pending = ClaimPhotoHash.objects.filter(status=ClaimPhotoHash.HashStatus.PENDING)
+        if claim_ids is not None:
+            pending = pending.filter(claim_id__in=claim_ids)
+        oldest = pending.values('claim_id').annotate(first_id=Min('id')).order_by('first_id')
+        claim_ids = [entry['claim_id'] for entry in (oldest[:limit] if limit is not None else oldest)]
+        queued = {}
+        for row_id, claim_id in pending.filter(claim_id__in=claim_ids).values_list('id', 'claim_id'):
+            queued.setdefault(claim_id, set()).add(row_id)
+
+        indexed = 0
+        for claim in Claim.objects.filter(id__in=queued).only('id', 'photos'):
+            if self.index_claim(claim, queued_ids=queued[claim.id]) is not None:
+                indexed += 1
+        return indexed
+
+    def index_claim(self, claim, queued_ids=None):
+        """
+        (Re)hash the claim's photos; returns the saved ClaimPhotoHash rows.
+        With queued_ids, the rows are only replaced if exactly those PENDING
+        rows are still queued, else None.
+        """
+        photos = list(claim.photos or ())
+        results = list(_get_executor().map(self.analyze_photo, photos))
+        rows = [self._row(claim, position, photo, result) for position, (photo, result) in enumerate(zip(photos, results))]
+        with transaction.atomic():
+            current = ClaimPhotoHash.objects.select_for_update().filter(claim_id=claim.pk)
+            if queued_ids is not None and set(
+                current.filter(status=ClaimPhotoHash.HashStatus.PENDING).values_list('id', flat=True)
+            ) != queued_ids:
+                return None
+            current.delete()
+            ClaimPhotoHash.objects.bulk_create(rows)
+        return rows
+
+    def analyze_photo(self, photo):
+        """{'phash', 'taken_at'} for one photo URL or storage path, or {'error'}"""
+        try:
+            with Image.open(io.BytesIO(self.load_photo(photo))) as image:
+                image.load()
+                return {'phash': perceptual_hash(image), 'taken_at': exif_taken_at(image)}
+        except (OSError, UnidentifiedImageError, ValueError, SuspiciousFileOperation, requests.RequestException) as e:
+            return {'error': str(e)[:255] or type(e).__name__}
+
+    @staticmethod
+    def load_photo(photo):
+        """
+        Photo bytes from storage for media URLs and paths, or from a remote URL
+        on one of the PHOTO_FETCH_HOSTS. Photo URLs come from customers, so
+        any other host (internal services included) is refused, and
+        redirects are not followed.
+        """
+        parsed = urlparse(photo)
+        limit = settings.PHOTO_MAX_BYTES
+        if parsed.scheme in ('http', 'https') and not parsed.path.startswith(settings.MEDIA_URL):
+            if parsed.hostname not in settings.PHOTO_FETCH_HOSTS:
+                raise ValueError(f'Photo host not allowed: {parsed.hostname}')
+            with requests.get(photo, timeout=settings.PHOTO_FETCH_TIMEOUT, stream=True,
+                              allow_redirects=False) as response:
+                response.raise_for_status()
+                if response.is_redirect:
+                    raise ValueError('Photo URL redirects elsewhere')
+                content = response.raw.read(limit + 1, decode_content=True)
+        else:
+            name = parsed.path
+            if name.startswith(settings.MEDIA_URL):
+                name = name[len(settings.MEDIA_URL):]
+            with default_storage.open(name, 'rb') as f:
+                content = f.read(limit + 1)
+        if len(content) > limit:
+            raise ValueError(f'Photo larger than {limit} bytes')
+        return content
+
+    @staticmethod
+    def _row(claim, position, photo, result):
+        row = ClaimPhotoHash(claim_id=claim.pk, position=position, photo=photo[:500])
+        if 'error' in result:
+            row.status = ClaimPhotoHash.HashStatus.UNREADABLE
+            row.error = result['error']
+            return row
+        row.status = ClaimPhotoHash.HashStatus.HASHED
+        row.phash = _signed(result['phash'])
+        row.hash_block_0, row.hash_block_1, row.hash_block_2, row.hash_block_3 = hash_blocks(result['phash'])
+        row.taken_at = result['taken_at']
+        return row
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def find_matches(self, rows, max_distance=None):
+        """
+        {row id: [(matching ClaimPhotoHash on another claim, distance), ...]}
+        closest first, for hashed rows. Candidates are fetched per hash block,
+        PROBE_CHUNK_SIZE probe values per query, so scoring batches of
+        hundreds of claims stay within database parameter limits.
+        """
+        max_distance = settings.PHOTO_HASH_MAX_DISTANCE if max_distance is None else max_distance
+        rows = [row for row in rows if row.phash is not None]
+        if not rows:
+            return {}
+
+        radius = max_distance // BLOCKS
+        probes = [set() for _ in range(BLOCKS)]
+        for row in rows:
+            for i, block in enumerate(hash_blocks(_unsigned(row.phash))):
+                probes[i].update(block_neighbours(block, radius))
+        candidates = {}
+        for i, values in enumerate(probes):
+            values = sorted(values)
+            for start in range(0, len(values), PROBE_CHUNK_SIZE):
+                chunk = values[start:start + PROBE_CHUNK_SIZE]
+                for candidate in ClaimPhotoHash.objects.filter(**{f'hash_block_{i}__in': chunk}):
+                    candidates[candidate.id] = candidate
+        candidates = list(candidates.values())
+
+        matches = {}
+        for row in rows:
+            phash = _unsigned(row.phash)
+            found = [
+                (candidate, distance) for candidate in candidates
+                if candidate.claim_id != row.claim_id
+                and (distance := (phash ^ _unsigned(candidate.phash)).bit_count()) <= max_distance
+            ]
+            matches[row.id] = sorted(found, key=lambda match: (match[1], match[0].id))
+        return matches
+
+    def duplicate_photos(self, claim):
+        """Photos on other claims matching this claim's photos, for reviewers"""
+        rows = list(claim.photo_hashes.all())
+        matches = self.find_matches(rows)
+        claims = Claim.objects.in_bulk({other.claim_id for found in matches.values() for other, _ in found})
+        return [
+            {
+                'photo': row.photo,
+                'matched_claim_id': other.claim_id,
+                'matched_claim_number': claims[other.claim_id].claim_number,
+                'matched_photo': other.photo,
+                'distance': distance,
+            }
+            for row in rows for other, distance in matches.get(row.id, ())
+        ]
+
+    def media_signals(self, claims):
+        """
+        {claim_id: (reused photo ratio, misdated photo ratio, unverified photo
+        ratio)} for claims whose photos are hashed. Misdated photos were taken
+        more than PHOTO_DATE_TOLERANCE_DAYS before the incident; unverified
+        photos could not be read or carry no capture time.
+        """
+        claims = {claim.pk: claim for claim in claims if claim.pk}
+        rows = list(ClaimPhotoHash.objects.filter(claim_id__in=claims).exclude(status=ClaimPhotoHash.HashStatus.PENDING))
+        if not rows:
+            return {}
+        matches = self.find_matches(rows)
+        tolerance = timedelta(days=settings.PHOTO_DATE_TOLERANCE_DAYS)
+
+        by_claim = {}
+        for row in rows:
+            by_claim.setdefault(row.claim_id, []).append(row)
+        signals = {}
+        for claim_id, claim_rows in by_claim.items():
+            incident_date = claims[claim_id].incident_date
+            reused = sum(1 for row in claim_rows if matches.get(row.id))
+            misdated = sum(
+                1 for row in claim_rows
+                if row.taken_at and isinstance(incident_date, date) and row.taken_at.date() < incident_date - tolerance
+            )
+            unverified = sum(1 for row in claim_rows if row.taken_at is None)
+            total = len(claim_rows)
+            signals[claim_id] = (reused / total, misdated / total, unverified / total)
+        return signals
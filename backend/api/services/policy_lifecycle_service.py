@@ -0,0 +1,58 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..models import Policy, PolicyLifecycleEvent
+from .score_event_service import ScoreEventService, POLICY_LAPSED
+
+
+class PolicyLifecycleService:
+    """
+    Periodic sweep of active policies that have run out.
+
+    A policy whose end_date has passed is expired; one whose
+    next_payment_date is more than POLICY_PAYMENT_GRACE_DAYS past is
+    lapsed, and is reactivated when the premium is paid. Due policies are
+    read through the (status, end_date) and (status, next_payment_date)
+    indexes, POLICY_SWEEP_CHUNK_SIZE at a time, and each chunk is one
+    transaction: one UPDATE of the policies, a bulk insert of their
+    PolicyLifecycleEvents and one batch of score events for the holders.
+    """
+
+    def __init__(self):
+        self.score_event_service = ScoreEventService()
+
+    def sweep(self, today=None, chunk_size=None):
+        """Expire, then lapse, every due policy; yields (event, policies transitioned) per chunk"""
+        today = today or timezone.now().date()
+        chunk_size = chunk_size or settings.POLICY_SWEEP_CHUNK_SIZE
+        yield from self._transition(
+            PolicyLifecycleEvent.Event.EXPIRED, Policy.PolicyStatus.EXPIRED,
+            'end_date', today, chunk_size
+        )
+        yield from self._transition(
+            PolicyLifecycleEvent.Event.LAPSED, Policy.PolicyStatus.LAPSED,
+            'next_payment_date', today - timedelta(days=settings.POLICY_PAYMENT_GRACE_DAYS), chunk_size
+        )
+
+    def _transition(self, event, status, date_field, before, chunk_size):
+        """Move active policies whose date_field is before `before` to status"""
+        due = Policy.objects.filter(status=Policy.PolicyStatus.ACTIVE, **{f'{date_field}__lt': before})
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    due.select_for_update(skip_locked=True).order_by(date_field, 'id')
+                    .values_list('id', 'user_id', date_field)[:chunk_size]
+                )
+                if not rows:
+                    return
+                Policy.objects.filter(id__in=[policy_id for policy_id, _, _ in rows]).update(
+                    status=status, updated_at=timezone.now()
+                )
+                PolicyLifecycleEvent.objects.bulk_create([
+                    PolicyLifecycleEvent(policy_id=policy_id, user_id=user_id, event=event, due_date=due_date)
+                    for policy_id, user_id, due_date in rows
+                ])
+                # update() skips the post_save signal that records these for single saves
+                self.score_event_service.record_many({user_id for _, user_id, _ in rows}, POLICY_LAPSED)
+            yield event, len(rows)
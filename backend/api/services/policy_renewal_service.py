@@ -0,0 +1,142 @@
+import uuid
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from ..models import Policy, PolicyLifecycleEvent, Payment
+from .pricing_service import PricingService, product_catalog
+from .user_feature_service import UserFeatureService
+
+
+class PolicyRenewalService:
+    """
+    Batch renewal of active policies nearing their end date.
+
+    Due policies are found through the (status, end_date) index and renewed
+    POLICY_RENEWAL_CHUNK_SIZE at a time. Each chunk is one transaction: the
+    policies are repriced from the cached product catalog, their renewals
+    and pending renewal payments are bulk-created, the old policies are
+    expired in one UPDATE, and the holders' policy counts are bumped.
+    Policies on inactive products are left for manual renewal.
+
+    Renewal and the lifecycle sweep (`manage.py sweep_policies`) may run in
+    either order: a policy the sweeper expired at its end date is still due
+    for POLICY_RENEWAL_WINDOW_DAYS after it, until it has been renewed.
+    """
+
+    def __init__(self):
+        self.pricing = PricingService()
+        self.feature_service = UserFeatureService()
+
+    def due(self, on=None, window_days=None):
+        """
+        Active policies ending within window_days of `on` (today by default),
+        and policies the sweeper expired that ended within window_days before it
+        """
+        on = on or timezone.now().date()
+        if window_days is None:
+            window_days = settings.POLICY_RENEWAL_WINDOW_DAYS
+        window = timedelta(days=window_days)
+        return Policy.objects.filter(
+            Q(status=Policy.PolicyStatus.ACTIVE, end_date__lte=on + window)
+            | self._swept(on - window)
+        )
+
+    def _swept(self, ended_since):
+        """Policies the sweeper expired at an end date on or after ended_since, not yet renewed"""
+        expired_by_sweep = PolicyLifecycleEvent.objects.filter(
+            policy=OuterRef('pk'), event=PolicyLifecycleEvent.Event.EXPIRED
+        )
+        renewed = Policy.objects.filter(
+            user=OuterRef('user'), product=OuterRef('product'), start_date__gt=OuterRef('end_date')
+        )
+        return Q(
+            Exists(expired_by_sweep),
+            ~Exists(renewed),
+            status=Policy.PolicyStatus.EXPIRED,
+            end_date__gte=ended_since,
+        )
+
+    def renew_due(self, on=None, window_days=None, chunk_size=None):
+        """
+        Renew every due policy; yields progress after each chunk as
+        {'processed', 'total', 'renewed', 'skipped'} with running totals.
+        """
+        on = on or timezone.now().date()
+        chunk_size = chunk_size or settings.POLICY_RENEWAL_CHUNK_SIZE
+        ids = list(self.due(on, window_days).order_by('end_date', 'id').values_list('id', flat=True))
+        renewed = skipped = 0
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            chunk_renewed = len(self.renew(chunk, on))
+            renewed += chunk_renewed
+            skipped += len(chunk) - chunk_renewed
+            yield {'processed': start + len(chunk), 'total': len(ids), 'renewed': renewed, 'skipped': skipped}
+
+    def renew(self, policy_ids, on=None):
+        """
+        Renew the policies in policy_ids that are still active, or that the
+        sweeper expired within POLICY_RENEWAL_WINDOW_DAYS of `on`; returns the
+        new PENDING policies. A renewal starts the day after the later of the
+        old end date and `on`, at the holder's current Soro-Score.
+        """
+        on = on or timezone.now().date()
+        products = {product.pk: product for product in product_catalog()}
+        now = timezone.now()
+
+        with transaction.atomic():
+            policies = list(
+                Policy.objects.select_for_update(of=('self',))
+                .filter(id__in=policy_ids)
+                .filter(Q(status=Policy.PolicyStatus.ACTIVE)
+                        | self._swept(on - timedelta(days=settings.POLICY_RENEWAL_WINDOW_DAYS)))
+                .annotate(holder_score=F('user__soro_score'))
+                .order_by('id')
+            )
+            renewals, expired = [], []
+            for policy in policies:
+                product = products.get(policy.product_id)
+                if product is None:
+                    continue
+                try:
+                    premium = self.pricing.premium(product, policy.holder_score, policy.premium_frequency)
+                except ValueError:
+                    continue
+                start_date = max(policy.end_date, on) + timedelta(days=1)
+                renewals.append(Policy(
+                    user_id=policy.user_id,
+                    product_id=policy.product_id,
+                    start_date=start_date,
+                    end_date=start_date + timedelta(days=settings.POLICY_RENEWAL_TERM_DAYS),
+                    status=Policy.PolicyStatus.PENDING,
+                    initial_soro_score=policy.holder_score,
+                    current_soro_score=policy.holder_score,
+                    premium_amount=premium,
+                    premium_frequency=policy.premium_frequency,
+                    coverage_amount=policy.coverage_amount,
+                    deductible_amount=policy.deductible_amount,
+                    coverage_details=policy.coverage_details,
+                ))
+                expired.append(policy.id)
+            if not renewals:
+                return []
+
+            Policy.objects.bulk_create(renewals)
+            Policy.objects.filter(id__in=expired).update(status=Policy.PolicyStatus.EXPIRED, updated_at=now)
+            Payment.objects.bulk_create([
+                Payment(
+                    payment_reference=f"PAY-{uuid.uuid4().hex[:10].upper()}",
+                    user_id=renewal.user_id,
+                    payment_type=Payment.PaymentType.RENEWAL,
+                    amount=renewal.premium_amount,
+                    status=Payment.PaymentStatus.PENDING,
+                    policy=renewal,
+                    payment_gateway='',
+                )
+                for renewal in renewals
+            ])
+            # bulk_create skips the post_save signals that count policies per holder
+            self.feature_service.policies_created(Counter(renewal.user_id for renewal in renewals))
+        return renewals
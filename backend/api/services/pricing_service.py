@@ -0,0 +1,148 @@
+"""
+Soro-Score premium pricing for every quote, new policy and renewal.
+
+Each product's premiums are precomputed in Decimal into a rate table with
+one entry per risk band and premium frequency, so a quote is a band lookup
+and a dictionary lookup. Tables are cached per process, keyed by the
+product's id and updated_at: a worker holding an older copy of a product
+builds a fresh table as soon as it sees the new updated_at, and saving or
+deleting a product drops this process's table at once.
+
+The catalog of active products used for bulk quotes is cached the same way
+as scoring models: reloaded every PRODUCT_CATALOG_RELOAD_SECONDS, and at
+once in the process that saves or deletes a product.
+"""
+import math
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from ..models import InsuranceProduct
+
+CENTS = Decimal('0.01')
+
+_tables = {}  # product id -> (updated_at, {(risk level, frequency): premium})
+_tables_lock = threading.Lock()
+
+_catalog = None  # (loaded_at, [active InsuranceProduct])
+_catalog_lock = threading.Lock()
+
+
+def risk_band(soro_score):
+    """(risk level, premium adjustment) of the PREMIUM_RISK_BANDS band a score falls in"""
+    for max_score, level, adjustment in settings.PREMIUM_RISK_BANDS:
+        if max_score is None or soro_score <= max_score:
+            return level, Decimal(adjustment)
+    raise ValueError(f'No premium risk band for score {soro_score}')
+
+
+def rate_table(product):
+    """The product's {(risk level, frequency): premium} table, built on first use"""
+    cached = _tables.get(product.pk)
+    if cached is not None and cached[0] == product.updated_at:
+        return cached[1]
+    table = build_rate_table(product)
+    with _tables_lock:
+        _tables[product.pk] = (product.updated_at, table)
+    return table
+
+
+def build_rate_table(product):
+    """
+    Premium for each band and frequency: the base premium adjusted for the
+    band and clamped to the product's bounds. The frequency only sets how
+    often it is collected, so every frequency of a band has the same premium.
+    """
+    base = Decimal(product.base_premium)
+    low, high = Decimal(product.min_premium), Decimal(product.max_premium)
+    table = {}
+    for _, level, adjustment in settings.PREMIUM_RISK_BANDS:
+        premium = min(high, max(low, base * (1 + Decimal(adjustment)))).quantize(CENTS, rounding=ROUND_HALF_UP)
+        for frequency in settings.PREMIUM_FREQUENCIES:
+            table[(level, frequency)] = premium
+    return table
+
+
+def invalidate_rate_table(product_id):
+    with _tables_lock:
+        _tables.pop(product_id, None)
+
+
+def clear_rate_tables():
+    """Drop every cached table in this process"""
+    with _tables_lock:
+        _tables.clear()
+
+
+def product_catalog():
+    """Active products ordered by id, from this process's cache"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None or time.monotonic() - _catalog[0] >= settings.PRODUCT_CATALOG_RELOAD_SECONDS:
+            _catalog = (time.monotonic(), list(InsuranceProduct.objects.filter(is_active=True).order_by('id')))
+        return _catalog[1]
+
+
+def reload_product_catalog():
+    """Drop this process's cached catalog; the next lookup reads the database"""
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
+class PricingService:
+    """Premium quotes for a product, Soro-Score and premium frequency"""
+
+    def quote(self, product, soro_score, frequency='monthly'):
+        """
+        {'risk_level', 'premium_adjustment', 'premium_frequency', 'premium'};
+        raises ValueError for a score that is not a number or an unknown frequency.
+        """
+        soro_score = float(soro_score)
+        if not math.isfinite(soro_score):
+            raise ValueError('Soro-Score must be a finite number')
+        if frequency not in settings.PREMIUM_FREQUENCIES:
+            raise ValueError(f'Unknown premium frequency: {frequency}')
+        level, adjustment = risk_band(soro_score)
+        return {
+            'risk_level': level,
+            'premium_adjustment': adjustment,
+            'premium_frequency': frequency,
+            'premium': rate_table(product)[(level, frequency)],
+        }
+
+    def premium(self, product, soro_score, frequency='monthly'):
+        """The premium per payment as a Decimal"""
+        return self.quote(product, soro_score, frequency)['premium']
+
+    def quote_catalog(self, soro_score, frequencies=('monthly',), product_ids=None, product_type=None):
+        """
+        Quotes for every active product in the cached catalog, or those with
+        the given ids and/or type, in one pass: {'risk_level',
+        'premium_adjustment', 'quotes': [...]}. Raises ValueError like quote().
+        """
+        soro_score = float(soro_score)
+        if not math.isfinite(soro_score):
+            raise ValueError('Soro-Score must be a finite number')
+        unknown = [frequency for frequency in frequencies if frequency not in settings.PREMIUM_FREQUENCIES]
+        if unknown:
+            raise ValueError(f"Unknown premium frequency: {', '.join(map(str, unknown))}")
+        level, adjustment = risk_band(soro_score)
+
+        wanted = set(product_ids) if product_ids is not None else None
+        quotes = []
+        for product in product_catalog():
+            if wanted is not None and product.pk not in wanted:
+                continue
+            if product_type is not None and product.product_type != product_type:
+                continue
+            table = rate_table(product)
+            quotes.append({
+                'product_id': product.pk,
+                'product': product.name,
+                'product_type': product.product_type,
+                'base_premium': product.base_premium,
+                'coverage_amount': product.coverage_details.get('max_coverage', 0),
+                'premiums': {frequency: table[(level, frequency)] for frequency in frequencies},
+            })
+        return {'risk_level': level, 'premium_adjustment': adjustment, 'quotes': quotes}
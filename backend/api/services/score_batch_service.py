@@ -0,0 +1,111 @@
+import numpy as np
+from django.conf import settings
+from ..models import SoroScoreLog
+from .soro_score_service import SoroScoreService, FEATURES
+from .claim_processing_service import ClaimProcessingService
+
+
+class ScoreBatchError(ValueError):
+    """A score batch request that cannot be scored as a whole"""
+
+
+class ScoreBatchService:
+    """
+    Scores batches of claims for partners and backfills.
+
+    A batch names saved claims by id and/or carries inline feature payloads
+    ({feature name: value}, missing features counting as 0). It is scored
+    in chunks of SCORE_BATCH_CHUNK_SIZE: each chunk is one feature matrix,
+    one vectorised SoroScoreService pass and one SoroScoreLog bulk_create,
+    and its results are yielded as soon as they are written so the caller
+    can stream them.
+    """
+
+    def __init__(self):
+        self.soro_service = SoroScoreService()
+
+    def parse(self, payload):
+        """(claim ids, [(reference, feature vector)]) from a request body; raises ScoreBatchError"""
+        if not isinstance(payload, dict):
+            raise ScoreBatchError('Expected a JSON object with claim_ids and/or claims')
+        claim_ids = payload.get('claim_ids') or []
+        inline = payload.get('claims') or []
+        if not isinstance(claim_ids, list) or not isinstance(inline, list):
+            raise ScoreBatchError('claim_ids and claims must be lists')
+        if not claim_ids and not inline:
+            raise ScoreBatchError('Nothing to score: pass claim_ids or claims')
+        if len(claim_ids) + len(inline) > settings.SCORE_BATCH_MAX_ITEMS:
+            raise ScoreBatchError(f'At most {settings.SCORE_BATCH_MAX_ITEMS} claims per batch')
+        if not all(isinstance(claim_id, int) and not isinstance(claim_id, bool) for claim_id in claim_ids):
+            raise ScoreBatchError('claim_ids must be integers')
+
+        vectors = []
+        for position, item in enumerate(inline):
+            features = item.get('features') if isinstance(item, dict) else None
+            if not isinstance(features, dict):
+                raise ScoreBatchError(f'claims[{position}] must be an object with a features object')
+            unknown = set(features) - set(FEATURES)
+            if unknown:
+                raise ScoreBatchError(f"claims[{position}] has unknown features: {', '.join(sorted(unknown))}")
+            try:
+                vector = [float(features.get(name, 0)) for name in FEATURES]
+            except (TypeError, ValueError):
+                raise ScoreBatchError(f'claims[{position}] features must be numbers')
+            if not np.all(np.isfinite(vector)):
+                raise ScoreBatchError(f'claims[{position}] features must be finite')
+            vectors.append((item.get('reference', position), vector))
+        return claim_ids, vectors
+
+    def score(self, claims, claim_ids, vectors):
+        """
+        Yield one result dict per claim id (in order) and inline payload, then
+        a summary. claims is the queryset the caller may score; ids outside
+        it get an error line.
+        """
+        chunk_size = settings.SCORE_BATCH_CHUNK_SIZE
+        scored = errors = 0
+
+        for start in range(0, len(claim_ids), chunk_size):
+            chunk = claim_ids[start:start + chunk_size]
+            found = claims.in_bulk(chunk)
+            batch = [found[claim_id] for claim_id in dict.fromkeys(chunk) if claim_id in found]
+            results = dict(zip((claim.pk for claim in batch), self.soro_service.score_claims(batch)))
+            SoroScoreLog.objects.bulk_create(
+                [self._log(ClaimProcessingService.score_log(claim, results[claim.pk])) for claim in batch]
+            )
+            for claim_id in chunk:
+                if claim_id in results:
+                    scored += 1
+                    yield {
+                        'claim_id': claim_id,
+                        'claim_number': str(found[claim_id].claim_number),
+                        **self._summary(results[claim_id]),
+                    }
+                else:
+                    errors += 1
+                    yield {'claim_id': claim_id, 'error': 'Claim not found'}
+
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            results = self.soro_service.score_features(np.array([vector for _, vector in chunk], dtype=float))
+            SoroScoreLog.objects.bulk_create([
+                self._log(ClaimProcessingService.score_log(None, result), reference=reference)
+                for (reference, _), result in zip(chunk, results)
+            ])
+            for (reference, _), result in zip(chunk, results):
+                scored += 1
+                yield {'reference': reference, **self._summary(result)}
+
+        yield {'done': True, 'scored': scored, 'errors': errors}
+
+    @staticmethod
+    def _summary(result):
+        return {key: value for key, value in result.items() if key != 'features'}
+
+    @staticmethod
+    def _log(log, reference=None):
+        """Mark a score log as written by a batch; inline scores keep the caller's reference"""
+        log.calculation_metadata = {**log.calculation_metadata, 'source': 'score_batch'}
+        if reference is not None:
+            log.calculation_metadata['reference'] = reference
+        return log
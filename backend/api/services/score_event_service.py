@@ -0,0 +1,181 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import Claim, Payment, Policy, ScoreRecomputeRequest, SoroScoreLog
+from .soro_score_service import SoroScoreService
+from .user_feature_service import UserFeatureService
+
+User = get_user_model()
+
+CLAIM_DECIDED = 'claim_decided'
+PAYMENT_FAILED = 'payment_failed'
+POLICY_LAPSED = 'policy_lapsed'
+
+DECIDED_CLAIM_STATUSES = (Claim.ClaimStatus.APPROVED, Claim.ClaimStatus.REJECTED, Claim.ClaimStatus.PAID)
+LAPSED_POLICY_STATUSES = (Policy.PolicyStatus.EXPIRED, Policy.PolicyStatus.CANCELLED, Policy.PolicyStatus.LAPSED)
+
+# Policies whose current score is refreshed with their holder's
+SCORED_POLICY_STATUSES = (Policy.PolicyStatus.ACTIVE, Policy.PolicyStatus.PENDING)
+
+
+class ScoreEventService:
+    """
+    Event-driven user and policy Soro-Score recomputation.
+
+    Transitions that change a user's risk record a ScoreRecomputeRequest
+    (one cheap upsert on the request path). Requests for the same user
+    coalesce until due_at, which is fixed by the first event so a busy user
+    is still rescored within one window. process_due() then recomputes a
+    batch of users, and their open policies, in a single transaction.
+    """
+
+    def __init__(self):
+        self.soro_service = SoroScoreService()
+        self.feature_service = UserFeatureService()
+
+    # ------------------------------------------------------------------
+    # Events
+    # ------------------------------------------------------------------
+    def claim_saved(self, claim, previous_status=None):
+        if claim.status != previous_status and claim.status in DECIDED_CLAIM_STATUSES:
+            self.record(claim.user_id, CLAIM_DECIDED)
+
+    def payment_saved(self, payment, previous_status=None):
+        if payment.status != previous_status and payment.status == Payment.PaymentStatus.FAILED:
+            self.record(payment.user_id, PAYMENT_FAILED)
+
+    def policy_saved(self, policy, previous_status=None):
+        if policy.status != previous_status and policy.status in LAPSED_POLICY_STATUSES:
+            self.record(policy.user_id, POLICY_LAPSED)
+
+    def record(self, user_id, reason):
+        """Queue a recomputation for user_id, or join the one already pending"""
+        with transaction.atomic():
+            request = ScoreRecomputeRequest.objects.select_for_update().filter(user_id=user_id).first()
+            if request is not None:
+                request.event_count = F('event_count') + 1
+                if reason not in request.reasons:
+                    request.reasons.append(reason)
+                request.save(update_fields=['event_count', 'reasons'])
+                return
+
+        due_at = timezone.now() + timedelta(seconds=settings.SCORE_RECOMPUTE_COALESCE_SECONDS)
+        try:
+            with transaction.atomic():
+                ScoreRecomputeRequest.objects.create(user_id=user_id, reasons=[reason], due_at=due_at)
+        except IntegrityError:
+            # A concurrent event opened the window first; join it
+            self.record(user_id, reason)
+
+    def record_many(self, user_ids, reason):
+        """
+        record() for many users at once, for transitions made by set-based
+        updates: pending requests are joined with one UPDATE and new ones
+        bulk-created.
+        """
+        user_ids = set(user_ids)
+        with transaction.atomic():
+            pending = ScoreRecomputeRequest.objects.select_for_update().filter(user_id__in=user_ids)
+            pending.update(event_count=F('event_count') + 1)
+            joined = list(pending.only('id', 'user_id', 'reasons'))
+            missing_reason = [request for request in joined if reason not in request.reasons]
+            for request in missing_reason:
+                request.reasons.append(reason)
+            ScoreRecomputeRequest.objects.bulk_update(missing_reason, ['reasons'])
+
+            due_at = timezone.now() + timedelta(seconds=settings.SCORE_RECOMPUTE_COALESCE_SECONDS)
+            # A request opened concurrently already covers its user
+            ScoreRecomputeRequest.objects.bulk_create(
+                [
+                    ScoreRecomputeRequest(user_id=user_id, reasons=[reason], due_at=due_at)
+                    for user_id in user_ids - {request.user_id for request in joined}
+                ],
+                ignore_conflicts=True,
+            )
+
+    # ------------------------------------------------------------------
+    # Processing
+    # ------------------------------------------------------------------
+    def process_due(self, batch_size=None, now=None):
+        """
+        Recompute one batch of due requests; returns the number of users
+        rescored. Requests are claimed with SKIP LOCKED so several processors
+        can run side by side, and deleted in the same transaction as the new
+        scores are written.
+        """
+        batch_size = batch_size or settings.SCORE_RECOMPUTE_BATCH_SIZE
+        now = now or timezone.now()
+
+        with transaction.atomic():
+            requests = list(
+                ScoreRecomputeRequest.objects.select_for_update(skip_locked=True)
+                .filter(due_at__lte=now)
+                .order_by('due_at')[:batch_size]
+            )
+            if not requests:
+                return 0
+            self.recompute({request.user_id: request for request in requests})
+            ScoreRecomputeRequest.objects.filter(id__in=[request.id for request in requests]).delete()
+        return len(requests)
+
+    def recompute(self, requests):
+        """Rescore the users in requests ({user_id: ScoreRecomputeRequest}) and their open policies"""
+        features = self.feature_service.get_features(requests)
+        user_results = self.soro_service.score_users(features)
+        users = list(User.objects.filter(id__in=user_results).only('id', 'soro_score'))
+        policies = list(Policy.objects.filter(user_id__in=user_results, status__in=SCORED_POLICY_STATUSES))
+        policy_results = self.soro_service.score_policies(
+            policies, {user_id: result['soro_score'] for user_id, result in user_results.items()}
+        )
+
+        now = timezone.now()
+        logs = []
+        for user in users:
+            result = user_results[user.id]
+            logs.append(self._score_log(result, requests[user.id], user=user, previous=user.soro_score))
+            user.soro_score = result['soro_score']
+        for policy in policies:
+            result = policy_results[policy.id]
+            logs.append(self._score_log(result, requests[policy.user_id], policy=policy,
+                                        previous=policy.current_soro_score))
+            policy.current_soro_score = result['soro_score']
+            policy.updated_at = now
+
+        # bulk_update skips save(), so auto_now timestamps are set above
+        User.objects.bulk_update(users, ['soro_score'])
+        Policy.objects.bulk_update(policies, ['current_soro_score', 'updated_at'])
+        SoroScoreLog.objects.bulk_create(logs)
+
+    @staticmethod
+    def _score_log(result, request, previous, user=None, policy=None):
+        """
+        Audit entry for a user or policy score. These scores are built from
+        history alone, so the whole score is logged as the historical component.
+        """
+        score = result['soro_score']
+        return SoroScoreLog(
+            user_id=user.id if user is not None else policy.user_id,
+            policy=policy,
+            inconsistency_score=0,
+            urgency_score=0,
+            sentiment_score=0,
+            media_integrity_score=0,
+            historical_score=score,
+            weighted_inconsistency=0,
+            weighted_urgency=0,
+            weighted_sentiment=0,
+            weighted_media=0,
+            weighted_historical=score,
+            final_soro_score=score,
+            risk_level=result['risk_level'],
+            calculation_metadata={
+                'target': 'policy' if policy is not None else 'user',
+                'components': result['components'],
+                'previous_score': previous,
+                'reasons': request.reasons,
+                'event_count': request.event_count,
+            }
+        )
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db.models import F
+from ..models import Claim, ClaimScoreExplanation
+from .soro_score_service import SoroScoreService, COMPONENTS, FEATURES
+from .scoring_models import live_scoring_model
+from .narrative_similarity_service import NarrativeSimilarityService
+from .photo_hash_service import PhotoHashService
+from .audio_fingerprint_service import AudioFingerprintService
+
+
+class ScoreExplanationService:
+    """
+    Per-claim score explanations for reviewers: component contributions,
+    the features that moved the score most, and the claims it matched.
+
+    An explanation is computed when a claim is scored and stored as a
+    ClaimScoreExplanation stamped with the claim's updated_at and the model
+    version. It is served as is until the claim is saved again or another
+    model version goes live, and is then recomputed on the next read.
+    """
+
+    def __init__(self):
+        self.soro_service = SoroScoreService()
+
+    def get(self, claim_id):
+        """The claim's explanation, from the cache when still valid; None for an unknown claim"""
+        cached = (
+            ClaimScoreExplanation.objects
+            .filter(claim_id=claim_id, claim_updated_at=F('claim__updated_at'),
+                    model_version=live_scoring_model().version)
+            .values_list('explanation', flat=True).first()
+        )
+        if cached is not None:
+            return cached
+        claim = Claim.objects.filter(pk=claim_id).first()
+        if claim is None:
+            return None
+        return self.store(claim, self.soro_service.calculate_claim_score(claim))
+
+    def store(self, claim, underwriting_result):
+        """Explain a fresh underwriting result for a saved claim and cache it; returns the explanation"""
+        explanation = self.explain(claim, underwriting_result)
+        ClaimScoreExplanation.objects.update_or_create(
+            claim_id=claim.pk,
+            defaults={
+                'model_version': underwriting_result['model_version'],
+                'claim_updated_at': claim.updated_at,
+                'explanation': explanation,
+            }
+        )
+        return explanation
+
+    def explain(self, claim, underwriting_result):
+        components = underwriting_result['components']
+        score = underwriting_result['soro_score']
+        contributions = []
+        for name in COMPONENTS:
+            weighted = components[f"weighted_{'media' if name == 'media_integrity' else name}"]
+            contributions.append({
+                'name': name,
+                'score': components[name],
+                'contribution': weighted,
+                'share': round(weighted / score, 4) if score else 0.0,
+            })
+        contributions.sort(key=lambda component: -component['contribution'])
+
+        features = underwriting_result['features']
+        impacts = self.soro_service.feature_impacts([features[name] for name in FEATURES])
+        top_features = [
+            {'name': name, 'value': features[name], 'impact': impact}
+            for name, impact in sorted(impacts.items(), key=lambda item: -item[1])
+            if impact > 0
+        ][:settings.SCORE_EXPLANATION_TOP_FEATURES]
+
+        limit = settings.SCORE_EXPLANATION_MAX_MATCHES
+        return {
+            'claim_id': claim.pk,
+            'claim_number': str(claim.claim_number),
+            'soro_score': score,
+            'risk_level': underwriting_result['risk_level'],
+            'recommendation': underwriting_result['recommendation'],
+            'confidence': underwriting_result['confidence'],
+            'model_version': underwriting_result['model_version'],
+            'flags': underwriting_result['flags'],
+            'components': contributions,
+            'top_features': top_features,
+            'similar_claims': [
+                {**match, 'claim_number': str(match['claim_number'])}
+                for match in NarrativeSimilarityService().similar_claims(claim, limit=limit)
+            ],
+            'duplicate_photos': [
+                {**match, 'matched_claim_number': str(match['matched_claim_number'])}
+                for match in PhotoHashService().duplicate_photos(claim)[:limit]
+            ],
+            'recycled_audio': [
+                {**match, 'claim_number': str(match['claim_number'])}
+                for match in AudioFingerprintService.recycled_audio(claim)[:limit]
+            ],
+        }
@@ -0,0 +1,184 @@
+import gzip
+import json
+from datetime import datetime
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from ..models import SoroScoreLog, SoroScoreLogArchive, SoroScoreLogArchiveKey
+from .soro_score_service import pack_features, unpack_features
+from .claim_processing_service import LOGGED_IN_COLUMNS
+
+# SoroScoreLog columns written to archive files and returned by lookups
+LOG_FIELDS = (
+    'id', 'claim_id', 'policy_id', 'user_id',
+    'inconsistency_score', 'urgency_score', 'sentiment_score', 'media_integrity_score', 'historical_score',
+    'weighted_inconsistency', 'weighted_urgency', 'weighted_sentiment', 'weighted_media', 'weighted_historical',
+    'final_soro_score', 'risk_level', 'auto_approval_recommended',
+    'model_version', 'is_shadow', 'shadow_of_id', 'features', 'calculation_metadata', 'calculated_at',
+)
+
+
+class ScoreLogService:
+    """
+    SoroScoreLog storage: compaction of entries written in the old format,
+    archival of old entries to monthly gzipped NDJSON files, and lookups by
+    claim, user and date range across the table and the archives.
+
+    Archiving moves SCORE_LOG_ARCHIVE_CHUNK_SIZE entries at a time: each
+    chunk is written to one file per month in default storage, recorded as
+    SoroScoreLogArchive rows and deleted in one transaction, so an
+    interrupted run loses nothing and can simply be run again. Each archive
+    lists the claims and users it holds as SoroScoreLogArchiveKey rows, so a
+    claim or user lookup only opens their files.
+    """
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def history(self, claim_id=None, user_id=None, start=None, end=None, include_archived=False, limit=None):
+        """
+        Log entries as dicts, oldest first, for a claim and/or user calculated
+        in [start, end). Archived entries are streamed from the archive files
+        overlapping the range that hold the claim or user.
+        """
+        limit = limit or settings.SCORE_LOG_LOOKUP_LIMIT
+        logs = SoroScoreLog.objects.all()
+        if claim_id is not None:
+            logs = logs.filter(claim_id=claim_id)
+        if user_id is not None:
+            logs = logs.filter(user_id=user_id)
+        if start is not None:
+            logs = logs.filter(calculated_at__gte=start)
+        if end is not None:
+            logs = logs.filter(calculated_at__lt=end)
+        rows = [self._row(values) for values in logs.order_by('calculated_at', 'id').values(*LOG_FIELDS)[:limit]]
+
+        if include_archived:
+            archives = SoroScoreLogArchive.objects.all()
+            if start is not None:
+                archives = archives.filter(last_calculated_at__gte=start)
+            if end is not None:
+                archives = archives.filter(first_calculated_at__lt=end)
+            if claim_id is not None or user_id is not None:
+                keys = SoroScoreLogArchiveKey.objects.all()
+                if claim_id is not None:
+                    keys = keys.filter(claim_id=claim_id)
+                if user_id is not None:
+                    keys = keys.filter(user_id=user_id)
+                # Archives written before keys were recorded have none and are still read
+                archives = archives.filter(Q(id__in=keys.values('archive_id')) | Q(keys__isnull=True)).distinct()
+            for archive in archives:
+                rows.extend(
+                    row for row in self.read_archive(archive)
+                    if (claim_id is None or row['claim_id'] == claim_id)
+                    and (user_id is None or row['user_id'] == user_id)
+                    and (start is None or datetime.fromisoformat(row['calculated_at']) >= start)
+                    and (end is None or datetime.fromisoformat(row['calculated_at']) < end)
+                )
+            rows.sort(key=lambda row: (row['calculated_at'], row['id']))
+        return rows[:limit]
+
+    @staticmethod
+    def read_archive(archive):
+        """Yields the entries in a SoroScoreLogArchive file, one line at a time"""
+        with default_storage.open(archive.path, 'rb') as f:
+            with gzip.open(f, 'rt', encoding='utf-8') as lines:
+                for line in lines:
+                    yield json.loads(line)
+
+    @staticmethod
+    def _row(values):
+        """A log entry from values() as a JSON-ready dict, with its features unpacked"""
+        row = dict(values)
+        metadata = row['calculation_metadata'] or {}
+        row['features'] = unpack_features(row['features']) if row['features'] else metadata.get('features')
+        row['calculated_at'] = row['calculated_at'].isoformat()
+        return row
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def archive(self, before, chunk_size=None):
+        """Move entries calculated before `before` to archive files; yields the SoroScoreLogArchive rows written"""
+        chunk_size = chunk_size or settings.SCORE_LOG_ARCHIVE_CHUNK_SIZE
+        while True:
+            ids = list(
+                SoroScoreLog.objects.filter(calculated_at__lt=before).order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                return
+            # Shadow entries go with the entry they shadow; deleting it would delete them
+            rows = [
+                self._row(values) for values in
+                SoroScoreLog.objects.filter(Q(id__in=ids) | Q(shadow_of_id__in=ids)).order_by('id').values(*LOG_FIELDS)
+            ]
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(row['calculated_at'][:7], []).append(row)
+            months = sorted(by_month.items())
+            archives = [self._write_archive(month, month_rows) for month, month_rows in months]
+            with transaction.atomic():
+                SoroScoreLogArchive.objects.bulk_create(archives)
+                SoroScoreLogArchiveKey.objects.bulk_create([
+                    key for archive, (_, month_rows) in zip(archives, months)
+                    for key in self._archive_keys(archive, month_rows)
+                ])
+                SoroScoreLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            yield from archives
+
+    @staticmethod
+    def _write_archive(month, rows):
+        """Unsaved SoroScoreLogArchive for the rows of one month, after writing its file"""
+        content = gzip.compress(
+            ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows).encode('utf-8')
+        )
+        name = f"{settings.SCORE_LOG_ARCHIVE_DIR}/{month}/score-logs-{rows[0]['id']}-{rows[-1]['id']}.ndjson.gz"
+        calculated = [datetime.fromisoformat(row['calculated_at']) for row in rows]
+        return SoroScoreLogArchive(
+            month=datetime.strptime(month, '%Y-%m').date(),
+            path=default_storage.save(name, ContentFile(content)),
+            row_count=len(rows),
+            first_id=rows[0]['id'],
+            last_id=rows[-1]['id'],
+            first_calculated_at=min(calculated),
+            last_calculated_at=max(calculated),
+        )
+
+    @staticmethod
+    def _archive_keys(archive, rows):
+        """Unsaved SoroScoreLogArchiveKey rows for each claim and user pair in an archive's rows"""
+        pairs = {(row['claim_id'], row['user_id']) for row in rows}
+        return [SoroScoreLogArchiveKey(archive=archive, claim_id=claim_id, user_id=user_id) for claim_id, user_id in pairs]
+
+    def index_archives(self):
+        """Record the keys of archives written before keys were kept; returns the number indexed"""
+        indexed = 0
+        for archive in SoroScoreLogArchive.objects.filter(keys__isnull=True).iterator():
+            SoroScoreLogArchiveKey.objects.bulk_create(self._archive_keys(archive, self.read_archive(archive)))
+            indexed += 1
+        return indexed
+
+    def compact(self, chunk_size=None):
+        """Rewrite claim entries that carry the whole underwriting result in their metadata; returns the count"""
+        chunk_size = chunk_size or settings.SCORE_LOG_ARCHIVE_CHUNK_SIZE
+        legacy = SoroScoreLog.objects.filter(
+            features__isnull=True, calculation_metadata__has_key='features'
+        ).order_by('id')
+        compacted = 0
+        last_id = 0
+        while True:
+            logs = list(legacy.filter(id__gt=last_id).only('id', 'features', 'calculation_metadata')[:chunk_size])
+            if not logs:
+                return compacted
+            for log in logs:
+                metadata = log.calculation_metadata
+                log.features = pack_features(metadata['features'] or {})
+                log.calculation_metadata = {
+                    key: value for key, value in metadata.items() if key not in LOGGED_IN_COLUMNS
+                }
+            SoroScoreLog.objects.bulk_update(logs, ['features', 'calculation_metadata'])
+            compacted += len(logs)
+            last_id = logs[-1].id
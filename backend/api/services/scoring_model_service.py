@@ -0,0 +1,160 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Exists, F, OuterRef, Q
+from django.utils import timezone
+from ..models import Claim, ScoringModelVersion, SoroScoreLog
+from .claim_processing_service import ClaimProcessingService
+from .soro_score_service import SoroScoreService, COMPONENTS, FEATURES, unpack_features
+from .scoring_models import shadow_scoring_models
+
+
+class ScoringModelService:
+    """
+    Lifecycle of scoring model versions (draft -> shadow -> live -> retired)
+    and shadow evaluation.
+
+    A shadow version re-scores every claim that the live model scores after
+    the shadow started, from the feature vector stored in the live
+    SoroScoreLog, so both models see identical inputs. Shadow scoring runs
+    off the request path (`manage.py process_shadow_scores`) and writes
+    is_shadow logs linked to the live entry, which compare() aggregates.
+    """
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def create_version(self, version, weights, auto_approve_max_score=None, description=''):
+        unknown = set(weights) - set(COMPONENTS)
+        if unknown:
+            raise ValueError(f"Unknown score components: {', '.join(sorted(unknown))}")
+        if any(weight < 0 for weight in weights.values()) or not sum(weights.values()):
+            raise ValueError('Weights must be non-negative and not all zero')
+        if ScoringModelVersion.objects.filter(version=version).exists():
+            raise ValueError(f'Scoring model {version} already exists')
+
+        return ScoringModelVersion.objects.create(
+            version=version,
+            weights=weights,
+            auto_approve_max_score=(
+                settings.SORO_AUTO_APPROVE_MAX_SCORE if auto_approve_max_score is None else auto_approve_max_score
+            ),
+            description=description
+        )
+
+    def start_shadow(self, version):
+        row = self._get(version)
+        if row.status == ScoringModelVersion.Status.LIVE:
+            raise ValueError(f'Scoring model {version} is live')
+        row.status = ScoringModelVersion.Status.SHADOW
+        row.shadow_started_at = timezone.now()
+        row.save()
+        return row
+
+    def promote(self, version):
+        """Make version live; the current live version is retired"""
+        with transaction.atomic():
+            row = self._get(version, lock=True)
+            ScoringModelVersion.objects.filter(status=ScoringModelVersion.Status.LIVE).exclude(id=row.id).update(
+                status=ScoringModelVersion.Status.RETIRED, updated_at=timezone.now()
+            )
+            row.status = ScoringModelVersion.Status.LIVE
+            row.promoted_at = timezone.now()
+            row.save()
+        return row
+
+    def retire(self, version):
+        row = self._get(version)
+        row.status = ScoringModelVersion.Status.RETIRED
+        row.save()
+        return row
+
+    @staticmethod
+    def _get(version, lock=False):
+        rows = ScoringModelVersion.objects.select_for_update() if lock else ScoringModelVersion.objects
+        try:
+            return rows.get(version=version)
+        except ScoringModelVersion.DoesNotExist:
+            raise ValueError(f'Unknown scoring model: {version}')
+
+    # ------------------------------------------------------------------
+    # Shadow scoring
+    # ------------------------------------------------------------------
+    def run_shadow(self, batch_size=None):
+        """Score one batch of pending live claim logs with each shadow version; returns logs written"""
+        batch_size = batch_size or settings.SHADOW_SCORING_BATCH_SIZE
+        return sum(self._shadow_batch(model, batch_size) for model in shadow_scoring_models())
+
+    def _shadow_batch(self, model, batch_size):
+        already_scored = SoroScoreLog.objects.filter(shadow_of=OuterRef('pk'), model_version=model.version)
+        live_logs = list(
+            SoroScoreLog.objects.filter(
+                ~Exists(already_scored),
+                is_shadow=False,
+                claim__isnull=False,
+                calculated_at__gte=model.shadow_started_at,
+            ).order_by('id')[:batch_size]
+        )
+        if not live_logs:
+            return 0
+
+        # Entries written before features were logged, or before some were added,
+        # are scored from the claim as it is now
+        stored = [
+            unpack_features(log.features) if log.features else log.calculation_metadata.get('features') or {}
+            for log in live_logs
+        ]
+        missing = [log.claim_id for log, features in zip(live_logs, stored) if not set(FEATURES) <= set(features)]
+        claims = Claim.objects.in_bulk({log.claim_id for log in live_logs})
+
+        service = SoroScoreService(model)
+        rebuilt = {}
+        if missing:
+            matrix = service.build_feature_matrix([claims[claim_id] for claim_id in missing])
+            rebuilt = dict(zip(missing, matrix))
+        X = np.array([
+            rebuilt[log.claim_id] if log.claim_id in rebuilt else [features[name] for name in FEATURES]
+            for log, features in zip(live_logs, stored)
+        ], dtype=float).reshape(len(live_logs), len(FEATURES))
+
+        shadow_logs = []
+        for log, result in zip(live_logs, service.score_features(X)):
+            shadow_log = ClaimProcessingService.score_log(claims[log.claim_id], result)
+            shadow_log.is_shadow = True
+            shadow_log.shadow_of = log
+            shadow_logs.append(shadow_log)
+        # A concurrent shadow worker may have scored some of these already
+        SoroScoreLog.objects.bulk_create(shadow_logs, ignore_conflicts=True)
+        return len(shadow_logs)
+
+    def compare(self, version):
+        """Shadow vs live outcomes over every claim the shadow version has scored"""
+        totals = SoroScoreLog.objects.filter(is_shadow=True, model_version=version).aggregate(
+            claims=Count('id'),
+            shadow_approvals=Count('id', filter=Q(auto_approval_recommended=True)),
+            live_approvals=Count('id', filter=Q(shadow_of__auto_approval_recommended=True)),
+            agreements=Count('id', filter=Q(auto_approval_recommended=F('shadow_of__auto_approval_recommended'))),
+            risk_level_changes=Count('id', filter=~Q(risk_level=F('shadow_of__risk_level'))),
+            shadow_mean_score=Avg('final_soro_score'),
+            live_mean_score=Avg('shadow_of__final_soro_score'),
+        )
+        claims = totals['claims']
+
+        def rate(count):
+            return round(count / claims, 4) if claims else None
+
+        return {
+            'version': version,
+            'claims': claims,
+            'live_versions': sorted(
+                SoroScoreLog.objects.filter(is_shadow=True, model_version=version)
+                .order_by().values_list('shadow_of__model_version', flat=True).distinct(),
+                key=str
+            ),
+            'live_approval_rate': rate(totals['live_approvals']),
+            'shadow_approval_rate': rate(totals['shadow_approvals']),
+            'decision_agreement': rate(totals['agreements']),
+            'risk_level_changes': totals['risk_level_changes'],
+            'live_mean_score': totals['live_mean_score'],
+            'shadow_mean_score': totals['shadow_mean_score'],
+        }
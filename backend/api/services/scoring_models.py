@@ -0,0 +1,73 @@
+"""
+Live and shadow claim scoring models for SoroScoreService.
+
+Versions are read from ScoringModelVersion and cached per process for
+settings.SCORING_MODEL_RELOAD_SECONDS, so a promotion reaches every worker
+within one reload interval without a restart. Saving a version clears this
+process's cache immediately. Without a live version the SORO_SCORE_WEIGHTS
+and SORO_AUTO_APPROVE_MAX_SCORE settings are used.
+"""
+import threading
+import time
+from django.conf import settings
+from ..models import ScoringModelVersion
+
+
+SETTINGS_VERSION = 'settings'
+
+_cache = None  # (loaded_at, live ScoringModel or None, [shadow ScoringModel])
+_cache_lock = threading.Lock()
+
+
+class ScoringModel:
+    """Claim scoring parameters: component weights and the auto-approval threshold"""
+
+    def __init__(self, version, weights, auto_approve_max_score, shadow_started_at=None):
+        self.version = version
+        self.weights = dict(weights)
+        self.auto_approve_max_score = auto_approve_max_score
+        self.shadow_started_at = shadow_started_at
+
+    def __repr__(self):
+        return f'<ScoringModel {self.version}>'
+
+    @classmethod
+    def from_settings(cls):
+        return cls(SETTINGS_VERSION, settings.SORO_SCORE_WEIGHTS, settings.SORO_AUTO_APPROVE_MAX_SCORE)
+
+    @classmethod
+    def from_version(cls, row):
+        return cls(row.version, row.weights, row.auto_approve_max_score, row.shadow_started_at)
+
+
+def _loaded_models():
+    global _cache
+    with _cache_lock:
+        if _cache is None or time.monotonic() - _cache[0] >= settings.SCORING_MODEL_RELOAD_SECONDS:
+            rows = ScoringModelVersion.objects.filter(
+                status__in=[ScoringModelVersion.Status.LIVE, ScoringModelVersion.Status.SHADOW]
+            )
+            live, shadows = None, []
+            for row in rows:
+                if row.status == ScoringModelVersion.Status.LIVE:
+                    live = ScoringModel.from_version(row)
+                else:
+                    shadows.append(ScoringModel.from_version(row))
+            _cache = (time.monotonic(), live, shadows)
+        return _cache
+
+
+def live_scoring_model():
+    live = _loaded_models()[1]
+    return live if live is not None else ScoringModel.from_settings()
+
+
+def shadow_scoring_models():
+    return list(_loaded_models()[2])
+
+
+def reload_scoring_models():
+    """Drop this process's cached versions; the next lookup reads the database"""
+    global _cache
+    with _cache_lock:
+        _cache = None
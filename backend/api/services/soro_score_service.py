@@ -1,70 +1,426 @@
+from datetime import date
+import numpy as np
 from django.conf import settings
-import random
+from django.db.models import Sum
+from django.utils import timezone
+from ..models import Claim, Policy
+from .user_feature_service import UserFeatureService
+from .scoring_models import live_scoring_model
+from .narrative_similarity_service import NarrativeSimilarityService
+from .photo_hash_service import PhotoHashService
+from .audio_fingerprint_service import AudioFingerprintService
+from .fraud_ring_service import FraudRingService
+
+
+# Feature matrix columns, in order. Features are only ever appended: score logs
+# store packed vectors, and a vector of k values holds the first k features.
+FEATURES = [
+    'claimed_ratio',          # claimed amount / estimated loss
+    'coverage_ratio',         # claimed amount / policy coverage
+    'has_transcript',
+    'transcript_confidence',
+    'keyword_count',
+    'urgency_hits',           # urgency keywords in the transcript
+    'type_keyword_match',     # transcript mentions the claim type
+    'sentiment',              # -1 .. 1
+    'report_delay_days',      # incident date to claim creation
+    'media_count',            # photos + videos + documents
+    'has_audio',
+    'prior_claims',           # the user's other claims
+    'prior_rejected',
+    'payment_failure_rate',   # failed / attempted payments
+    'narrative_similarity',   # highest estimated similarity to another claim's narrative
+    'reused_photo_ratio',     # photos matching a photo on another claim
+    'misdated_photo_ratio',   # photos taken well before the incident
+    'unverified_photo_ratio', # photos unreadable or without a capture time
+    'recycled_audio_score',   # share of the recording aligned with an earlier claim's recording
+    'linked_users',           # other users in the claimant's fraud ring
+]
+F = {name: index for index, name in enumerate(FEATURES)}
+
+# A well-evidenced, consistent claim; explanations measure each feature's
+# impact as the score change from resetting it to this value
+REFERENCE_FEATURES = {
+    'claimed_ratio': 1.0,
+    'coverage_ratio': 0.0,
+    'has_transcript': 1.0,
+    'transcript_confidence': 1.0,
+    'keyword_count': 0.0,
+    'urgency_hits': 0.0,
+    'type_keyword_match': 1.0,
+    'sentiment': -0.3,
+    'report_delay_days': 7.0,
+    'media_count': 3.0,
+    'has_audio': 1.0,
+    'prior_claims': 0.0,
+    'prior_rejected': 0.0,
+    'payment_failure_rate': 0.0,
+    'narrative_similarity': 0.0,
+    'reused_photo_ratio': 0.0,
+    'misdated_photo_ratio': 0.0,
+    'unverified_photo_ratio': 0.0,
+    'recycled_audio_score': 0.0,
+    'linked_users': 0.0,
+}
+_PACKED_FEATURE = np.dtype('<f8')
+
+COMPONENTS = ['inconsistency', 'urgency', 'sentiment', 'media_integrity', 'historical']
+USER_COMPONENTS = ['claim_frequency', 'rejection_rate', 'payment_failure', 'short_tenure', 'recent_claim']
+POLICY_COMPONENTS = ['user', 'claims_exposure']
+
+TENURE_HORIZON_DAYS = 730  # customers with at least this tenure get no short-tenure risk
+RECENT_CLAIM_HORIZON_DAYS = 365
+
+URGENCY_KEYWORDS = {'emergency', 'urgent', 'immediate', 'serious', 'severe'}
+
+# Keywords that support each claim type
+CLAIM_TYPE_KEYWORDS = {
+    Claim.ClaimType.ACCIDENT: {'accident', 'crash', 'collision', 'okada', 'keke', 'danfo', 'molue', 'injury'},
+    Claim.ClaimType.THEFT: {'stolen', 'theft', 'robbery', 'burglary', 'area boys'},
+    Claim.ClaimType.DAMAGE: {'damage', 'broken', 'fire', 'flood', 'water', 'repair', 'replace'},
+    Claim.ClaimType.ILLNESS: {'hospital', 'doctor', 'sick', 'illness', 'injury', 'pain'},
+    Claim.ClaimType.DEATH: {'hospital', 'doctor', 'police', 'report'},
+}
+
+
+def pack_features(features):
+    """
+    {feature name: value} as little-endian float64 bytes in FEATURES order,
+    for score logs; features logged before later ones were added pack as
+    the shorter vector they were.
+    """
+    values = []
+    for name in FEATURES:
+        if name not in features:
+            break
+        values.append(features[name])
+    return np.array(values, dtype=_PACKED_FEATURE).tobytes()
+
+
+def unpack_features(packed):
+    """{feature name: value} from pack_features bytes, for as many features as were packed"""
+    values = np.frombuffer(bytes(packed or b''), dtype=_PACKED_FEATURE)
+    return {name: float(value) for name, value in zip(FEATURES, values)}
+
 
 class SoroScoreService:
     """
     Service for calculating Soro-Scores for users, policies, and claims.
-    This is a mock implementation for demonstration purposes.
+
+    Claim scores are deterministic: claims are turned into a feature matrix,
+    each risk component (0-100, higher is riskier) is computed column-wise,
+    and the score is the dot product with SORO_SCORE_WEIGHTS. A batch of any
+    size is scored with a handful of NumPy operations, and scoring one claim
+    is simply a batch of one. User and policy scores work the same way from
+    UserRiskFeatures rows and policy claim totals.
+
+    Claim weights and the auto-approval threshold come from the live
+    ScoringModelVersion (see scoring_models), or from scoring_model when one
+    is passed, e.g. to score a shadow candidate.
     """
 
+    def __init__(self, scoring_model=None):
+        self.scoring_model = scoring_model
+
+    def current_model(self):
+        return self.scoring_model or live_scoring_model()
+
     def calculate_claim_score(self, claim):
+        """Calculates a Soro-Score for a given claim."""
+        return self.score_claims([claim])[0]
+
+    def score_claims(self, claims, history=None, coverage=None, similarity=None, media=None, audio=None, rings=None):
         """
-        Calculates a Soro-Score for a given claim.
-        In a real scenario, this would involve complex AI/ML models.
+        Score many claims at once; returns one underwriting result per claim,
+        in order. history ({user_id: (claims, rejected, payment failure rate)}),
+        coverage ({policy_id: amount}), similarity ({claim_id: narrative
+        similarity}), media ({claim_id: photo signal ratios}), audio
+        ({claim_id: recycled-audio score}) and rings ({user_id: fraud ring
+        size}) are looked up in a few queries when omitted.
         """
-        # Mocking some logic for demonstration
-        soro_score = random.uniform(20.0, 90.0)
-        risk_level = 'low'
-        auto_approval_recommended = False
-
-        if soro_score > 70:
-            risk_level = 'high'
-            auto_approval_recommended = False
-        elif soro_score > 40:
-            risk_level = 'medium'
-            # Simulate auto-approval for some medium-risk claims
-            if random.random() > 0.7:
-                auto_approval_recommended = True
-        else:
-            risk_level = 'low'
-            auto_approval_recommended = True
-        
-        # Mock components based on weights from settings
-        weights = settings.SORO_SCORE_WEIGHTS
-        inconsistency = random.uniform(0, 100)
-        urgency = random.uniform(0, 100)
-        sentiment = random.uniform(0, 100)
-        media_integrity = random.uniform(0, 100)
-        historical = random.uniform(0, 100)
+        return self.score_features(
+            self.build_feature_matrix(claims, history, coverage, similarity, media, audio, rings)
+        )
+
+    def score_features(self, features):
+        """Underwriting results for the rows of a feature matrix"""
+        model = self.current_model()
+        components, scores = self.score_matrix(features, model)
+        return [
+            self._underwriting_result(features[i], components[i], scores[i], model)
+            for i in range(len(features))
+        ]
+
+    # ------------------------------------------------------------------
+    # Features
+    # ------------------------------------------------------------------
+    def build_feature_matrix(self, claims, history=None, coverage=None, similarity=None, media=None, audio=None,
+                             rings=None):
+        """(len(claims), len(FEATURES)) float matrix; unsaved claims have no narrative, photo or audio signals"""
+        if history is None:
+            history = self.user_history({claim.user_id for claim in claims})
+        if coverage is None:
+            coverage = dict(
+                Policy.objects.filter(id__in={claim.policy_id for claim in claims})
+                .values_list('id', 'coverage_amount')
+            )
+        if similarity is None:
+            similarity = NarrativeSimilarityService().max_similarities([claim.pk for claim in claims if claim.pk])
+        if media is None:
+            media = PhotoHashService().media_signals(claims)
+        if audio is None:
+            audio = AudioFingerprintService.match_scores([claim.pk for claim in claims if claim.pk])
+        if rings is None:
+            rings = FraudRingService().ring_sizes({claim.user_id for claim in claims})
 
+        today = timezone.now().date()
+        matrix = np.zeros((len(claims), len(FEATURES)))
+        for row, claim in enumerate(claims):
+            keywords = set(claim.keywords or ())
+            estimated = float(claim.estimated_loss or 0)
+            claimed = float(claim.claimed_amount or 0)
+            policy_coverage = float(coverage.get(claim.policy_id) or 0)
+            filed = claim.created_at.date() if claim.created_at else today
+            incident = claim.incident_date if isinstance(claim.incident_date, date) else filed
+            prior_claims, prior_rejected, payment_failure_rate = history.get(claim.user_id, (0, 0, 0.0))
+
+            # Exclude the claim being scored from its own history
+            if claim.pk is not None:
+                prior_claims = max(0, prior_claims - 1)
+                if claim.status == Claim.ClaimStatus.REJECTED:
+                    prior_rejected = max(0, prior_rejected - 1)
+
+            matrix[row] = (
+                claimed / estimated if estimated > 0 else 1.0,
+                claimed / policy_coverage if policy_coverage > 0 else 0.0,
+                1.0 if claim.transcript else 0.0,
+                claim.transcript_confidence or 0.0,
+                len(keywords),
+                len(keywords & URGENCY_KEYWORDS),
+                1.0 if keywords & CLAIM_TYPE_KEYWORDS.get(claim.claim_type, set()) else 0.0,
+                claim.sentiment_score or 0.0,
+                (filed - incident).days,
+                len(claim.photos or ()) + len(claim.videos or ()) + len(claim.documents or ()),
+                1.0 if claim.audio_file else 0.0,
+                prior_claims,
+                prior_rejected,
+                payment_failure_rate,
+                similarity.get(claim.pk, 0.0),
+                *media.get(claim.pk, (0.0, 0.0, 0.0)),
+                audio.get(claim.pk, 0.0),
+                rings.get(claim.user_id, 1) - 1,
+            )
+        return matrix
+
+    @staticmethod
+    def user_history(user_ids):
+        """{user_id: (claim count, rejected count, payment failure rate)} from the users' feature rows"""
+        features = UserFeatureService().get_features(user_ids)
+        return {
+            user_id: (row.claim_count, row.rejected_claims, row.payment_failure_rate)
+            for user_id, row in features.items()
+        }
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def weight_vector(self, model=None):
+        weights = (model or self.current_model()).weights
+        return np.array([weights.get(component, 0) for component in COMPONENTS], dtype=float)
+
+    def score_matrix(self, X, model=None):
+        """Component matrix (n, 5) on a 0-100 scale and the weighted scores (n,)"""
+        def col(name):
+            return X[:, F[name]]
+
+        has_transcript = col('has_transcript')
+        delay = col('report_delay_days')
+
+        inconsistency = (
+            0.30 * np.clip(col('claimed_ratio') - 1, 0, 1)                # asking for more than the assessed loss
+            + 0.15 * np.clip((col('coverage_ratio') - 0.8) / 0.2, 0, 1)   # at or above the policy coverage
+            + 0.10 * has_transcript * (1 - col('type_keyword_match'))     # account never mentions the claim type
+            + 0.10 * (1 - col('transcript_confidence'))                   # missing or unclear account
+            + 0.10 * (delay > 30)                                         # reported late
+            + 0.25 * np.clip((col('narrative_similarity') - 0.3) / 0.5, 0, 1)  # story recycled from another claim
+        )
+        urgency = (
+            0.70 * np.minimum(col('urgency_hits'), 2) / 2
+            + 0.30 * (delay <= 1)
+        )
+        # Distance from the mildly negative tone expected when reporting a loss
+        sentiment = np.clip(np.abs(col('sentiment') + 0.3) / 1.3, 0, 1)
+        # Missing evidence, reused photos or recordings, photos predating the
+        # incident and photos that cannot be verified each raise the risk independently
+        media_integrity = 1 - (
+            (1 - 0.6 ** (col('media_count') + col('has_audio')))
+            * (1 - 0.9 * col('reused_photo_ratio'))
+            * (1 - 0.6 * col('misdated_photo_ratio'))
+            * (1 - 0.2 * col('unverified_photo_ratio'))
+            * (1 - 0.9 * np.clip(col('recycled_audio_score') / 0.3, 0, 1))
+        )
+        prior = col('prior_claims')
+        # A claimant sharing identifiers with others is risky whatever their own record
+        historical = 1 - (
+            (1 - (
+                0.4 * np.minimum(prior, 5) / 5
+                + 0.4 * np.divide(col('prior_rejected'), prior, out=np.zeros_like(prior), where=prior > 0)
+                + 0.2 * col('payment_failure_rate')
+            ))
+            * (1 - 0.8 * np.minimum(col('linked_users'), 4) / 4)
+        )
+
+        components = 100 * np.clip(np.column_stack([inconsistency, urgency, sentiment, media_integrity, historical]), 0, 1)
+        scores = components @ self.weight_vector(model)
+        return components, scores
+
+    def feature_impacts(self, features, model=None):
+        """
+        {feature name: score change from resetting it to REFERENCE_FEATURES}
+        for one feature row, in one pass; positive impacts raised the score.
+        """
+        row = np.asarray(features, dtype=float)
+        X = np.tile(row, (len(FEATURES) + 1, 1))
+        for i, name in enumerate(FEATURES):
+            X[i + 1, i] = REFERENCE_FEATURES[name]
+        _, scores = self.score_matrix(X, model)
+        return {name: round(float(scores[0] - scores[i + 1]), 4) for i, name in enumerate(FEATURES)}
+
+    @staticmethod
+    def risk_level(score):
+        if score <= 30:
+            return 'low'
+        if score <= 70:
+            return 'medium'
+        return 'high'
+
+    def _underwriting_result(self, features, components, score, model):
+        weights = self.weight_vector(model)
+        soro_score = round(float(score), 4)
+        risk_level = self.risk_level(soro_score)
+
+        flags = []
+        if features[F['claimed_ratio']] > 1:
+            flags.append('claimed_exceeds_estimate')
+        if features[F['coverage_ratio']] > 1:
+            flags.append('claimed_exceeds_coverage')
+        if features[F['media_count']] == 0:
+            flags.append('no_media_evidence')
+        if features[F['has_transcript']] and features[F['transcript_confidence']] < 0.5:
+            flags.append('low_transcript_confidence')
+        if features[F['report_delay_days']] > 30:
+            flags.append('late_report')
+        if features[F['prior_claims']] >= 3:
+            flags.append('frequent_claimant')
+        if features[F['narrative_similarity']] >= settings.NARRATIVE_SIMILARITY_THRESHOLD:
+            flags.append('similar_narrative')
+        if features[F['reused_photo_ratio']] > 0:
+            flags.append('reused_photos')
+        if features[F['misdated_photo_ratio']] > 0:
+            flags.append('photo_predates_incident')
+        if features[F['recycled_audio_score']] > 0:
+            flags.append('recycled_audio')
+        if features[F['linked_users']] > 0:
+            flags.append('fraud_ring')
+
+        auto_approval_recommended = (
+            soro_score <= model.auto_approve_max_score
+            and not {'claimed_exceeds_estimate', 'claimed_exceeds_coverage'} & set(flags)
+        )
+        # More evidence to score on means more confidence in the score
+        confidence = 0.6 + 0.2 * features[F['has_transcript']] * features[F['transcript_confidence']] \
+            + 0.2 * min(features[F['media_count']], 3) / 3
+
+        values = dict(zip(COMPONENTS, (round(float(value), 4) for value in components)))
+        weighted = {
+            f"weighted_{'media' if name == 'media_integrity' else name}": round(float(value * weight), 4)
+            for name, value, weight in zip(COMPONENTS, components, weights)
+        }
         return {
             'soro_score': soro_score,
             'risk_level': risk_level,
-            'auto_approval_recommended': auto_approval_recommended,
-            'confidence': random.uniform(0.6, 0.99),
-            'components': {
-                'inconsistency': inconsistency,
-                'urgency': urgency,
-                'sentiment': sentiment,
-                'media_integrity': media_integrity,
-                'historical': historical,
-                'weighted_inconsistency': inconsistency * weights.get('inconsistency', 0),
-                'weighted_urgency': urgency * weights.get('urgency', 0),
-                'weighted_sentiment': sentiment * weights.get('sentiment', 0),
-                'weighted_media': media_integrity * weights.get('media_integrity', 0),
-                'weighted_historical': historical * weights.get('historical', 0),
-            },
-            'flags': ['mock_flag_1', 'mock_flag_2'] if soro_score > 70 else [],
-            'recommendation': 'Approve' if auto_approval_recommended else 'Review Manually'
+            'auto_approval_recommended': bool(auto_approval_recommended),
+            'confidence': round(float(confidence), 4),
+            'components': {**values, **weighted},
+            'features': {name: float(value) for name, value in zip(FEATURES, features)},
+            'flags': flags,
+            'recommendation': 'Approve' if auto_approval_recommended else 'Review Manually',
+            'model_version': model.version
         }
 
+    # ------------------------------------------------------------------
+    # Users and policies
+    # ------------------------------------------------------------------
     def calculate_user_score(self, user):
         """Calculates a Soro-Score for a given user."""
-        # This would be a more complex calculation based on user history, demographics, etc.
-        return random.uniform(30.0, 80.0)
+        features = UserFeatureService().get_features([user.id])
+        return self.score_users(features)[user.id]['soro_score']
 
     def calculate_policy_score(self, policy):
         """Calculates a Soro-Score for a given policy."""
-        # This would factor in product type, user score, coverage details, etc.
-        return random.uniform(25.0, 75.0)
+        return self.score_policies([policy])[policy.id]['soro_score']
 
+    def score_users(self, features):
+        """{user_id: {soro_score, risk_level, components}} for {user_id: UserRiskFeatures}"""
+        user_ids = list(features)
+        X = np.array([
+            (
+                row.claim_count,
+                row.rejected_claims,
+                row.payment_failure_rate,
+                row.policy_tenure_days,
+                row.days_since_last_claim if row.days_since_last_claim is not None else np.inf,
+            )
+            for row in (features[user_id] for user_id in user_ids)
+        ], dtype=float).reshape(len(user_ids), 5)
+
+        claims = X[:, 0]
+        components = 100 * np.column_stack([
+            np.minimum(claims, 5) / 5,
+            np.divide(X[:, 1], claims, out=np.zeros_like(claims), where=claims > 0),
+            np.clip(X[:, 2], 0, 1),
+            1 - np.minimum(X[:, 3], TENURE_HORIZON_DAYS) / TENURE_HORIZON_DAYS,
+            np.clip(1 - X[:, 4] / RECENT_CLAIM_HORIZON_DAYS, 0, 1),
+        ])
+        weights = settings.SORO_USER_SCORE_WEIGHTS
+        scores = components @ np.array([weights.get(name, 0) for name in USER_COMPONENTS], dtype=float)
+        return {
+            user_id: self._entity_result(USER_COMPONENTS, components[i], scores[i])
+            for i, user_id in enumerate(user_ids)
+        }
+
+    def score_policies(self, policies, user_scores=None):
+        """
+        {policy_id: {soro_score, risk_level, components}}. user_scores
+        ({user_id: score}) defaults to the holders' computed user scores.
+        """
+        if user_scores is None:
+            features = UserFeatureService().get_features({policy.user_id for policy in policies})
+            user_scores = {user_id: result['soro_score'] for user_id, result in self.score_users(features).items()}
+        claimed = dict(
+            Claim.objects.filter(policy_id__in=[policy.id for policy in policies])
+            .values('policy_id')
+            .annotate(total=Sum('claimed_amount'))
+            .values_list('policy_id', 'total')
+        )
+
+        user = np.array([user_scores.get(policy.user_id, 0) for policy in policies], dtype=float)
+        exposure = np.array([
+            float(claimed.get(policy.id) or 0) / float(policy.coverage_amount) if policy.coverage_amount else 0.0
+            for policy in policies
+        ])
+        components = np.column_stack([user, 100 * np.clip(exposure, 0, 1)]).reshape(len(policies), 2)
+        weights = settings.SORO_POLICY_SCORE_WEIGHTS
+        scores = components @ np.array([weights.get(name, 0) for name in POLICY_COMPONENTS], dtype=float)
+        return {
+            policy.id: self._entity_result(POLICY_COMPONENTS, components[i], scores[i])
+            for i, policy in enumerate(policies)
+        }
+
+    def _entity_result(self, names, components, score):
+        soro_score = round(float(score), 4)
+        return {
+            'soro_score': soro_score,
+            'risk_level': self.risk_level(soro_score),
+            'components': {name: round(float(value), 4) for name, value in zip(names, components)},
+        }
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import re
+from functools import lru_cache
+from django.conf import settings
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+_TAGS = None  # trie key holding the tags of a complete term; tokens are never None
+
+
+def tokenize(text):
+    """Lowercase word tokens, punctuation stripped"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class CompiledLexicon:
+    """
+    Every keyword, sentiment and emotion term compiled into one word-level
+    trie. Each complete term carries (category, label) tags, so a single walk
+    over the transcript tokens finds multi-word terms such as 'port harcourt'
+    alongside single words, and a term in several lexicons matches once.
+    """
+
+    def __init__(self, lexicons):
+        self.root = {}
+        self.emotions = list(lexicons.get('emotions', {}))
+
+        for terms in lexicons.get('keywords', {}).values():
+            for term in terms:
+                self._add(term, ('keyword', ' '.join(tokenize(term))))
+        for label, terms in lexicons.get('sentiment', {}).items():
+            for term in terms:
+                self._add(term, ('sentiment', label))
+        for emotion, terms in lexicons.get('emotions', {}).items():
+            for term in terms:
+                self._add(term, ('emotion', emotion))
+
+        canonical = json.dumps(lexicons, sort_keys=True).encode()
+        self.version = hashlib.sha256(canonical).hexdigest()[:12]
+
+    def _add(self, term, tag):
+        tokens = tokenize(term)
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        tags = node.setdefault(_TAGS, [])
+        if tag not in tags:
+            tags.append(tag)
+
+    def matches(self, tokens):
+        """Yield the tags of every term occurrence in tokens"""
+        root = self.root
+        for start in range(len(tokens)):
+            node = root.get(tokens[start])
+            position = start + 1
+            while node is not None:
+                tags = node.get(_TAGS)
+                if tags:
+                    yield from tags
+                if position == len(tokens):
+                    break
+                node = node.get(tokens[position])
+                position += 1
+
+
+def load_lexicon(path):
+    with open(path, encoding='utf-8') as f:
+        return CompiledLexicon(json.load(f))
+
+
+@lru_cache(maxsize=None)
+def _compiled_lexicon(path):
+    return load_lexicon(path)
+
+
+def get_lexicon():
+    """The compiled lexicon for settings.VOICE_LEXICON_PATH, built once per process"""
+    return _compiled_lexicon(str(settings.VOICE_LEXICON_PATH))
+
+
+class TextAnalysisService:
+    """
+    Keywords, sentiment and emotions of a transcript from one tokenization
+    and one pass of the compiled lexicon.
+    """
+
+    MAX_KEYWORDS = 10
+
+    def __init__(self, lexicon=None):
+        self.lexicon = lexicon or get_lexicon()
+
+    def analyze(self, text):
+        tokens = tokenize(text)
+        keywords = []
+        sentiment_counts = {'positive': 0, 'negative': 0}
+        emotion_scores = dict.fromkeys(self.lexicon.emotions, 0)
+
+        for category, label in self.lexicon.matches(tokens):
+            if category == 'keyword':
+                if label not in keywords:
+                    keywords.append(label)
+            elif category == 'sentiment':
+                sentiment_counts[label] = sentiment_counts.get(label, 0) + 1
+            else:
+                emotion_scores[label] += 1
+
+        return {
+            'word_count': len(tokens),
+            'keywords': keywords[:self.MAX_KEYWORDS],
+            'sentiment': self._sentiment(sentiment_counts, len(tokens)),
+            'emotion_scores': emotion_scores,
+        }
+
+    @staticmethod
+    def _sentiment(counts, word_count):
+        """Score in [-1, 1] from positive and negative term counts"""
+        pos_count, neg_count = counts['positive'], counts['negative']
+        total = pos_count + neg_count
+        score = (pos_count - neg_count) / total if total > 0 else 0
+
+        if score > 0.3:
+            label = 'positive'
+        elif score < -0.3:
+            label = 'negative'
+        else:
+            label = 'neutral'
+
+        return {
+            'score': score,
+            'label': label,
+            'scores': {
+                'positive': pos_count,
+                'negative': neg_count,
+                'neutral': max(0, word_count - pos_count - neg_count)
+            }
+        }
@@ -0,0 +1,412 @@
+"""
+Pluggable speech-to-text engines for TranscriptionService.
+
+Engines are tried in settings.TRANSCRIPTION_ENGINES order. Every call is
+bounded by the engine's deadline, counted from when the engine starts on
+it: a call still waiting for a thread or a Sphinx slot after
+TRANSCRIPTION_QUEUE_TIMEOUT is dropped as busy, which is not held against
+the engine. A per-engine circuit breaker skips an
+engine after consecutive failures until its cooldown has passed, so a slow
+or unreachable online engine costs at most one deadline per claim segment
+before it is taken out of rotation. Health and latency counters are kept per
+process and exposed through engine_stats().
+
+The Sphinx process pool is only started in the voice worker
+(`manage.py process_voice_jobs`). Other processes, such as web workers
+handling synchronous submissions, run Sphinx on one shared in-process
+decoder instead of spawning TRANSCRIPTION_POOL_SIZE processes each.
+"""
+import contextlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import speech_recognition as sr
+from django.conf import settings
+from .. import transcription_worker
+
+
+DEFAULT_DEADLINE_SECONDS = 15
+
+_engine_executor = None
+_engine_executor_lock = threading.Lock()
+_sphinx_pool = None
+_sphinx_pool_enabled = False
+_sphinx_pool_lock = threading.Lock()
+_sphinx_slots = None  # one per pool process, so calls never queue inside the pool
+_local_sphinx_loaded = False
+_local_sphinx_lock = threading.Lock()
+_health = {}
+_health_lock = threading.Lock()
+
+
+def _get_engine_executor():
+    """
+    Threads that run blocking engine calls so callers can stop waiting at the
+    deadline. Sized above the segment workers so abandoned calls that are
+    still winding down do not starve new ones.
+    """
+    global _engine_executor
+    with _engine_executor_lock:
+        if _engine_executor is None:
+            _engine_executor = ThreadPoolExecutor(
+                max_workers=settings.TRANSCRIPTION_WORKERS * 2,
+                thread_name_prefix='transcription-engine'
+            )
+        return _engine_executor
+
+
+def enable_sphinx_pool():
+    """Let this process start the Sphinx pool; only the voice worker does"""
+    global _sphinx_pool_enabled
+    with _sphinx_pool_lock:
+        _sphinx_pool_enabled = True
+
+
+def get_sphinx_pool():
+    """
+    Long-lived pool of offline transcription processes, or None in a process
+    that has not called enable_sphinx_pool(). Each worker loads the Sphinx
+    models once in its initializer and then serves jobs from the pool's
+    local call queue. Workers are spawned rather than forked so the pool is
+    safe to create from threaded callers.
+    """
+    global _sphinx_pool, _sphinx_slots
+    with _sphinx_pool_lock:
+        if _sphinx_pool is None and _sphinx_pool_enabled:
+            _sphinx_slots = threading.BoundedSemaphore(settings.TRANSCRIPTION_POOL_SIZE)
+            _sphinx_pool = ProcessPoolExecutor(
+                max_workers=settings.TRANSCRIPTION_POOL_SIZE,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=transcription_worker.init_worker,
+                initargs=(settings.SPHINX_MODEL_PATHS,)
+            )
+        return _sphinx_pool
+
+
+def warm_up_sphinx_pool():
+    """Enable the pool in this process and start every worker so model loading happens before the first claim"""
+    enable_sphinx_pool()
+    pool = get_sphinx_pool()
+    futures = [pool.submit(transcription_worker.ping) for _ in range(settings.TRANSCRIPTION_POOL_SIZE)]
+    return [future.result() for future in futures]
+
+
+def shutdown_sphinx_pool():
+    global _sphinx_pool
+    with _sphinx_pool_lock:
+        if _sphinx_pool is not None:
+            _sphinx_pool.shutdown(wait=True, cancel_futures=True)
+            _sphinx_pool = None
+
+
+def _transcribe_in_process(raw_data):
+    """
+    Sphinx without the pool: one decoder per process, loaded on first use.
+    Callers hold _local_sphinx_lock, as a decoder holds one utterance at a time.
+    """
+    global _local_sphinx_loaded
+    if not _local_sphinx_loaded:
+        transcription_worker.init_worker(settings.SPHINX_MODEL_PATHS)
+        _local_sphinx_loaded = True
+    return transcription_worker.transcribe(raw_data)
+
+
+def _reset_broken_sphinx_pool(pool):
+    """Drop a pool whose worker died so the next call starts a fresh one"""
+    global _sphinx_pool
+    with _sphinx_pool_lock:
+        if _sphinx_pool is pool:
+            _sphinx_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class EngineTimeout(Exception):
+    """An engine did not answer within its deadline"""
+
+
+class EngineBusy(Exception):
+    """A call never started: no engine thread or slot freed up in time"""
+
+
+class _Attempt:
+    """Start handshake between a caller and the engine thread serving its call"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+        self.abandoned = False
+
+    def start(self):
+        """Engine side: False if the caller already gave up waiting"""
+        with self.lock:
+            if self.abandoned:
+                return False
+            self.started.set()
+            return True
+
+    def abandon(self):
+        """Caller side: True if the call had not started and never will"""
+        with self.lock:
+            if self.started.is_set():
+                return False
+            self.abandoned = True
+            return True
+
+
+class TranscriptionEngine:
+    """
+    Base engine. Subclasses implement recognize() (blocking, run on the
+    engine thread pool) and may override slot() to bound concurrent calls.
+    """
+
+    name = None
+    confidence = 0.0
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline or DEFAULT_DEADLINE_SECONDS
+
+    def recognize(self, audio_data):
+        raise NotImplementedError
+
+    def slot(self):
+        """Context manager held while a call runs; waiting for it counts as queueing"""
+        return contextlib.nullcontext()
+
+    def _call(self, audio_data, attempt):
+        with self.slot():
+            if not attempt.start():
+                return None
+            return self.recognize(audio_data)
+
+    def run(self, audio_data):
+        """
+        Recognize audio_data, raising EngineBusy if the call has not started
+        within TRANSCRIPTION_QUEUE_TIMEOUT and EngineTimeout once the
+        deadline passes after it started.
+        """
+        attempt = _Attempt()
+        future = _get_engine_executor().submit(self._call, audio_data, attempt)
+        if not attempt.started.wait(settings.TRANSCRIPTION_QUEUE_TIMEOUT) and attempt.abandon():
+            future.cancel()
+            raise EngineBusy(f'{self.name} did not start within {settings.TRANSCRIPTION_QUEUE_TIMEOUT}s')
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            raise EngineTimeout(f'{self.name} exceeded its {self.deadline}s deadline')
+
+
+class GoogleEngine(TranscriptionEngine):
+    name = 'google'
+    confidence = 0.9
+    language = 'en-NG'
+
+    def recognize(self, audio_data):
+        recognizer = sr.Recognizer()
+        # Socket-level timeout too, so abandoned calls release their thread
+        recognizer.operation_timeout = self.deadline
+        return recognizer.recognize_google(audio_data, language=self.language)
+
+
+class SphinxEngine(TranscriptionEngine):
+    """Offline recognizer, served by the warm process pool where there is one"""
+
+    name = 'sphinx'
+    confidence = 0.6
+
+    def slot(self):
+        # A pool process or the in-process decoder, whichever serves this process
+        return _sphinx_slots if get_sphinx_pool() is not None else _local_sphinx_lock
+
+    def recognize(self, audio_data):
+        raw_data = audio_data.get_raw_data(convert_rate=16000, convert_width=2)
+        pool = get_sphinx_pool()
+        if pool is None:
+            return _transcribe_in_process(raw_data)
+        return pool.submit(transcription_worker.transcribe, raw_data).result()
+
+    def run(self, audio_data):
+        pool = get_sphinx_pool()
+        try:
+            text = super().run(audio_data)
+        except BrokenProcessPool:
+            if pool is not None:
+                _reset_broken_sphinx_pool(pool)
+            raise
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class StubEngine(TranscriptionEngine):
+    """
+    Local engine for tests and development. Returns the queued responses in
+    order (text, or an exception instance to raise), then
+    settings.TRANSCRIPTION_STUB_TEXT. Empty text means no speech recognised.
+    """
+
+    name = 'stub'
+    confidence = 0.5
+
+    def __init__(self, deadline=None, responses=None, delay=0.0, name=None):
+        super().__init__(deadline)
+        if name:
+            self.name = name
+        self.responses = iter(responses or ())
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def recognize(self, audio_data):
+        with self.lock:
+            self.calls += 1
+            response = next(self.responses, settings.TRANSCRIPTION_STUB_TEXT)
+        if self.delay:
+            time.sleep(self.delay)
+        if isinstance(response, Exception):
+            raise response
+        if not response:
+            raise sr.UnknownValueError()
+        return response
+
+
+ENGINE_CLASSES = {
+    'google': GoogleEngine,
+    'sphinx': SphinxEngine,
+    'stub': StubEngine,
+}
+
+
+def build_engines(names=None):
+    """Instantiate engines by name, in fallback order, with their configured deadlines"""
+    names = names or settings.TRANSCRIPTION_ENGINES
+    deadlines = settings.TRANSCRIPTION_ENGINE_DEADLINES
+    engines = []
+    for name in names:
+        if name not in ENGINE_CLASSES:
+            raise ValueError(f'Unknown transcription engine: {name}')
+        engines.append(ENGINE_CLASSES[name](deadline=deadlines.get(name)))
+    return engines
+
+
+class EngineHealth:
+    """
+    Circuit breaker and counters for one engine, shared by every
+    TranscriptionService in the process.
+
+    closed: calls pass through. open: calls are skipped until the cooldown
+    has passed. half-open: after the cooldown a single trial call is let
+    through; success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.open_until = None
+        self.trial_in_flight = False
+        self.counts = dict.fromkeys(['calls', 'successes', 'no_speech', 'errors', 'timeouts', 'skipped'], 0)
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def state(self):
+        if self.open_until is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() >= self.open_until else 'open'
+
+    def allow(self):
+        """Whether a call may go to the engine now"""
+        with self.lock:
+            if self.open_until is None:
+                return True
+            if time.monotonic() >= self.open_until and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.counts['skipped'] += 1
+            return False
+
+    def record(self, outcome, latency):
+        """Record a call outcome: 'success', 'no_speech', 'error', 'timeout' or 'busy'"""
+        with self.lock:
+            if outcome == 'busy':
+                # The call never reached the engine, so it says nothing about its health
+                self.counts['skipped'] += 1
+                self.trial_in_flight = False
+                return
+            self.counts['calls'] += 1
+            self.counts[{'success': 'successes', 'error': 'errors', 'timeout': 'timeouts'}.get(outcome, outcome)] += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+            if outcome in ('success', 'no_speech'):
+                # The engine answered; only errors and timeouts count against it
+                self.consecutive_failures = 0
+                self.open_until = None
+            else:
+                self.consecutive_failures += 1
+                if self.trial_in_flight or self.consecutive_failures >= settings.TRANSCRIPTION_BREAKER_THRESHOLD:
+                    self.open_until = time.monotonic() + settings.TRANSCRIPTION_BREAKER_COOLDOWN
+            self.trial_in_flight = False
+
+    def snapshot(self):
+        with self.lock:
+            calls = self.counts['calls']
+            return {
+                **self.counts,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'avg_latency_ms': round(self.latency_total / calls * 1000, 1) if calls else 0.0,
+                'max_latency_ms': round(self.latency_max * 1000, 1),
+            }
+
+
+def engine_health(name):
+    with _health_lock:
+        if name not in _health:
+            _health[name] = EngineHealth(name)
+        return _health[name]
+
+
+def engine_stats():
+    """Per-engine circuit state, outcome counters and latency for this process"""
+    with _health_lock:
+        health = list(_health.values())
+    return {entry.name: entry.snapshot() for entry in health}
+
+
+def reset_engine_stats():
+    with _health_lock:
+        _health.clear()
+
+
+def recognize(engines, audio_data):
+    """
+    Try engines in order, skipping those with an open circuit. Returns
+    (text, engine) from the first engine that recognises speech, or
+    ('', None) when none does.
+    """
+    for engine in engines:
+        health = engine_health(engine.name)
+        if not health.allow():
+            continue
+
+        started = time.perf_counter()
+        try:
+            text = engine.run(audio_data)
+        except sr.UnknownValueError:
+            outcome = 'no_speech'
+        except EngineTimeout:
+            outcome = 'timeout'
+        except EngineBusy:
+            outcome = 'busy'
+        except Exception:
+            outcome = 'error'
+        else:
+            outcome = 'success'
+        health.record(outcome, time.perf_counter() - started)
+
+        if outcome == 'success' and text:
+            return text, engine
+    return '', None
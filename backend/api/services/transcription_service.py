@@ -0,0 +1,161 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import speech_recognition as sr
+from django.conf import settings
+from .audio_feature_service import frame_energy_db, speech_threshold
+from .transcription_engines import build_engines, recognize
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Shared thread pool for segment transcription, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TRANSCRIPTION_WORKERS,
+                thread_name_prefix='transcription'
+            )
+        return _executor
+
+
+class TranscriptionService:
+    """
+    Splits decoded audio at silences with an energy-based VAD and
+    transcribes the resulting bounded segments in parallel, each through
+    the configured engines in fallback order.
+    """
+
+    FRAME_SECONDS = 0.03  # 30 ms analysis frames
+    PAD_SECONDS = 0.1  # context kept around each detected segment
+    MIN_SPEECH_SECONDS = 0.2  # shorter bursts are treated as clicks/noise
+
+    def __init__(self, engines=None):
+        self.engines = engines or build_engines()
+        self.max_segment_seconds = settings.TRANSCRIPTION_SEGMENT_MAX_SECONDS
+        self.min_silence_seconds = settings.TRANSCRIPTION_MIN_SILENCE_SECONDS
+        self.energy_floor_db = settings.TRANSCRIPTION_VAD_FLOOR_DB
+        self.energy_margin_db = settings.TRANSCRIPTION_VAD_MARGIN_DB
+
+    def transcribe(self, audio):
+        """
+        Transcribe a DecodedAudio. Returns the stitched text, a duration
+        weighted confidence and the per-segment results.
+        """
+        segments = self.detect_segments(audio)
+        if not segments:
+            return {'text': '', 'confidence': 0.0, 'engine': 'none', 'segments': []}
+
+        executor = _get_executor()
+        futures = [executor.submit(self._transcribe_segment, audio, start, end)
+                   for start, end in segments]
+        results = [future.result() for future in futures]
+
+        return self._stitch(results)
+
+    def detect_segments(self, audio):
+        """Return (start_sample, end_sample) speech regions, each at most max_segment_seconds long"""
+        frame_length = int(audio.sample_rate * self.FRAME_SECONDS)
+        energy = frame_energy_db(audio.samples, frame_length, frame_length)
+        frame_count = len(energy)
+        if frame_count == 0:
+            return []
+
+        speech = energy > speech_threshold(energy, self.energy_floor_db, self.energy_margin_db)
+
+        # Bridge pauses shorter than min_silence so words are not cut apart
+        min_silence_frames = int(self.min_silence_seconds / self.FRAME_SECONDS)
+        starts, ends = self._runs(~speech)
+        for start, end in zip(starts, ends):
+            if end - start < min_silence_frames and start > 0 and end < frame_count:
+                speech[start:end] = True
+
+        pad = int(self.PAD_SECONDS / self.FRAME_SECONDS)
+        min_speech_frames = int(self.MIN_SPEECH_SECONDS / self.FRAME_SECONDS)
+        max_frames = max(1, int(self.max_segment_seconds / self.FRAME_SECONDS))
+
+        regions = []
+        starts, ends = self._runs(speech)
+        for start, end in zip(starts, ends):
+            if end - start < min_speech_frames:
+                continue
+            start, end = max(0, start - pad), min(frame_count, end + pad)
+            regions.extend(self._split_long_region(energy, start, end, max_frames))
+
+        regions = self._merge_regions(regions, max_frames)
+        return [(start * frame_length, end * frame_length) for start, end in regions]
+
+    @staticmethod
+    def _runs(mask):
+        """Start/end (exclusive) indices of the True runs in a boolean array"""
+        edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    @staticmethod
+    def _split_long_region(energy, start, end, max_frames):
+        """Cut a region longer than max_frames at its quietest frames"""
+        regions = []
+        while end - start > max_frames:
+            # Search the second half of the window so pieces stay reasonably long
+            window_start = start + max_frames // 2
+            window_end = start + max_frames
+            cut = window_start + int(np.argmin(energy[window_start:window_end]))
+            regions.append((start, cut))
+            start = cut
+        regions.append((start, end))
+        return regions
+
+    @staticmethod
+    def _merge_regions(regions, max_frames):
+        """Join neighbouring regions while the result stays within max_frames"""
+        merged = []
+        for start, end in regions:
+            if merged:
+                # Padding can make neighbours overlap; never transcribe audio twice
+                start = max(start, merged[-1][1])
+            if merged and end - merged[-1][0] <= max_frames:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def _transcribe_segment(self, audio, start, end):
+        """Transcribe one segment; failures are contained to that segment"""
+        segment = {
+            'start': round(start / audio.sample_rate, 2),
+            'end': round(end / audio.sample_rate, 2),
+            'text': '',
+            'confidence': 0.0,
+            'engine': 'none',
+        }
+        audio_data = sr.AudioData(audio.samples[start:end].tobytes(), audio.sample_rate, audio.sample_width)
+
+        text, engine = recognize(self.engines, audio_data)
+        if engine is not None:
+            segment.update(text=text, confidence=engine.confidence, engine=engine.name)
+        return segment
+
+    @staticmethod
+    def _stitch(segments):
+        """Combine per-segment results into one transcript"""
+        text = ' '.join(segment['text'] for segment in segments if segment['text'])
+
+        durations = np.array([segment['end'] - segment['start'] for segment in segments])
+        confidences = np.array([segment['confidence'] for segment in segments])
+        total = durations.sum()
+        confidence = float(np.dot(durations, confidences) / total) if total > 0 else 0.0
+
+        engines = Counter(segment['engine'] for segment in segments if segment['text'])
+        engine = engines.most_common(1)[0][0] if engines else 'none'
+
+        return {
+            'text': text,
+            'confidence': round(confidence, 4),
+            'engine': engine,
+            'segments': segments,
+        }
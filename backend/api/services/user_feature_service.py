@@ -0,0 +1,248 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from ..models import Claim, Payment, Policy, UserRiskFeatures
+
+User = get_user_model()
+
+# Policy statuses that mean the policy has been in force
+IN_FORCE_STATUSES = (Policy.PolicyStatus.ACTIVE, Policy.PolicyStatus.EXPIRED, Policy.PolicyStatus.LAPSED)
+
+
+def _money(value):
+    return Decimal(str(value or 0))
+
+
+class UserFeatureService:
+    """
+    Maintains UserRiskFeatures incrementally. Each claim, policy or payment
+    transition applies a small delta to the owner's row under a row lock, so
+    the cost is constant in the size of the user's history. The User claim
+    counters are kept in step from the same row.
+
+    Bulk queryset writes (update, bulk_create) bypass the signals; run
+    `manage.py rebuild_user_features` after them.
+    """
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def get_features(self, user_ids):
+        """{user_id: UserRiskFeatures}; users without a row yet are rebuilt once"""
+        user_ids = set(user_ids)
+        features = UserRiskFeatures.objects.in_bulk(user_ids, field_name='user_id')
+        missing = user_ids - set(features)
+        if missing:
+            features.update(self.rebuild(missing))
+        return features
+
+    # ------------------------------------------------------------------
+    # Transitions
+    # ------------------------------------------------------------------
+    def claim_saved(self, claim, previous=None):
+        """
+        Apply a claim save. previous holds the status, claim_type,
+        claimed_amount and approved_amount loaded from the database, or is
+        None for a new claim.
+        """
+        def update(features):
+            if previous is None:
+                features.claim_count += 1
+                self._bump(features.claims_by_type, claim.claim_type, 1)
+                self._bump(features.claims_by_status, claim.status, 1)
+                features.total_claimed_amount += _money(claim.claimed_amount)
+                created_at = claim.created_at
+                if features.last_claim_at is None or created_at > features.last_claim_at:
+                    features.last_claim_at = created_at
+            else:
+                if previous['claim_type'] != claim.claim_type:
+                    self._bump(features.claims_by_type, previous['claim_type'], -1)
+                    self._bump(features.claims_by_type, claim.claim_type, 1)
+                if previous['status'] != claim.status:
+                    self._bump(features.claims_by_status, previous['status'], -1)
+                    self._bump(features.claims_by_status, claim.status, 1)
+                features.total_claimed_amount += _money(claim.claimed_amount) - _money(previous['claimed_amount'])
+
+            was_paid = previous is not None and previous['status'] == Claim.ClaimStatus.PAID
+            is_paid = claim.status == Claim.ClaimStatus.PAID
+            if was_paid:
+                features.total_paid_amount -= self._paid_amount(previous)
+            if is_paid:
+                features.total_paid_amount += self._paid_amount(claim.__dict__)
+
+        self._apply(claim.user_id, update)
+
+    def claim_deleted(self, claim):
+        def update(features):
+            features.claim_count = max(0, features.claim_count - 1)
+            self._bump(features.claims_by_type, claim.claim_type, -1)
+            self._bump(features.claims_by_status, claim.status, -1)
+            features.total_claimed_amount -= _money(claim.claimed_amount)
+            if claim.status == Claim.ClaimStatus.PAID:
+                features.total_paid_amount -= self._paid_amount(claim.__dict__)
+
+        self._apply(claim.user_id, update, create=False)
+
+    def policy_saved(self, policy, previous_status=None, created=False):
+        if not created and (previous_status == policy.status or policy.status not in IN_FORCE_STATUSES):
+            return
+
+        def update(features):
+            if created:
+                features.policy_count += 1
+            if policy.status in IN_FORCE_STATUSES and (
+                features.first_policy_start is None or policy.start_date < features.first_policy_start
+            ):
+                features.first_policy_start = policy.start_date
+
+        self._apply(policy.user_id, update)
+
+    def policies_created(self, counts):
+        """
+        Count policies bulk-created outside save() ({user_id: number created}),
+        with one UPDATE per distinct count; users without a row are rebuilt.
+        """
+        by_count = {}
+        for user_id, count in counts.items():
+            by_count.setdefault(count, []).append(user_id)
+        with transaction.atomic():
+            existing = set(
+                UserRiskFeatures.objects.filter(user_id__in=counts).values_list('user_id', flat=True)
+            )
+            for count, user_ids in by_count.items():
+                UserRiskFeatures.objects.filter(user_id__in=user_ids).update(policy_count=F('policy_count') + count)
+        missing = set(counts) - existing
+        if missing:
+            self.rebuild(missing)
+
+    def policy_deleted(self, policy):
+        def update(features):
+            features.policy_count = max(0, features.policy_count - 1)
+
+        self._apply(policy.user_id, update, create=False)
+
+    def payment_saved(self, payment, previous_status=None):
+        if previous_status != payment.status:
+            self._count_payment(payment.user_id, ((previous_status, -1), (payment.status, 1)))
+
+    def payment_deleted(self, payment):
+        self._count_payment(payment.user_id, ((payment.status, -1),), create=False)
+
+    def _count_payment(self, user_id, deltas, create=True):
+        """Apply (status, delta) pairs to the completed/failed payment counters"""
+        counters = {
+            Payment.PaymentStatus.COMPLETED: 'payments_completed',
+            Payment.PaymentStatus.FAILED: 'payments_failed',
+        }
+        deltas = [(counters[status], delta) for status, delta in deltas if status in counters]
+        if not deltas:
+            return
+
+        def update(features):
+            for field, delta in deltas:
+                setattr(features, field, max(0, getattr(features, field) + delta))
+
+        self._apply(user_id, update, create=create)
+
+    # ------------------------------------------------------------------
+    # Rebuild
+    # ------------------------------------------------------------------
+    def rebuild(self, user_ids):
+        """
+        Recompute rows from the claim, policy and payment tables for
+        user_ids (a few aggregate queries for the whole set) and save them.
+        Used for backfills and for users who have no row yet.
+        """
+        user_ids = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        rows = {user_id: UserRiskFeatures(user_id=user_id) for user_id in user_ids}
+
+        claims = (
+            Claim.objects.filter(user_id__in=user_ids)
+            .values('user_id', 'status', 'claim_type')
+            .annotate(
+                count=Count('id'),
+                claimed=Sum('claimed_amount'),
+                paid=Sum(Coalesce('approved_amount', 'claimed_amount'), filter=Q(status=Claim.ClaimStatus.PAID)),
+                last=Max('created_at'),
+            )
+        )
+        for entry in claims:
+            features = rows[entry['user_id']]
+            features.claim_count += entry['count']
+            self._bump(features.claims_by_status, entry['status'], entry['count'])
+            self._bump(features.claims_by_type, entry['claim_type'], entry['count'])
+            features.total_claimed_amount += _money(entry['claimed'])
+            features.total_paid_amount += _money(entry['paid'])
+            if features.last_claim_at is None or entry['last'] > features.last_claim_at:
+                features.last_claim_at = entry['last']
+
+        policies = (
+            Policy.objects.filter(user_id__in=user_ids)
+            .values('user_id')
+            .annotate(count=Count('id'), first_start=Min('start_date', filter=Q(status__in=IN_FORCE_STATUSES)))
+        )
+        for entry in policies:
+            rows[entry['user_id']].policy_count = entry['count']
+            rows[entry['user_id']].first_policy_start = entry['first_start']
+
+        payments = (
+            Payment.objects.filter(user_id__in=user_ids)
+            .values('user_id')
+            .annotate(
+                completed=Count('id', filter=Q(status=Payment.PaymentStatus.COMPLETED)),
+                failed=Count('id', filter=Q(status=Payment.PaymentStatus.FAILED)),
+            )
+        )
+        for entry in payments:
+            rows[entry['user_id']].payments_completed = entry['completed']
+            rows[entry['user_id']].payments_failed = entry['failed']
+
+        with transaction.atomic():
+            UserRiskFeatures.objects.filter(user_id__in=user_ids).delete()
+            UserRiskFeatures.objects.bulk_create(rows.values())
+            User.objects.bulk_update(
+                [User(id=user_id, **self._user_counters(features)) for user_id, features in rows.items()],
+                ['total_claims', 'approved_claims', 'rejected_claims']
+            )
+        return rows
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    def _apply(self, user_id, update, create=True):
+        """
+        Lock the user's row, apply update(features) and save it with the User
+        counters. A user without a row is rebuilt from the tables instead,
+        which already reflect the change; on deletes they are left alone.
+        """
+        with transaction.atomic():
+            features = UserRiskFeatures.objects.select_for_update().filter(user_id=user_id).first()
+            if features is None:
+                if create:
+                    self.rebuild([user_id])
+                return
+            update(features)
+            features.save()
+            User.objects.filter(id=user_id).update(**self._user_counters(features))
+
+    @staticmethod
+    def _user_counters(features):
+        return {
+            'total_claims': features.claim_count,
+            'approved_claims': features.approved_claims,
+            'rejected_claims': features.rejected_claims,
+        }
+
+    @staticmethod
+    def _bump(counts, key, delta):
+        counts[key] = max(0, counts.get(key, 0) + delta)
+        if not counts[key]:
+            del counts[key]
+
+    @staticmethod
+    def _paid_amount(values):
+        """Amount paid out on a claim: the approved amount, else the claimed amount"""
+        amount = values.get('approved_amount')
+        return _money(amount if amount is not None else values.get('claimed_amount'))
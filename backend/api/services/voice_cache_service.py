@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import VoiceAnalysisCacheEntry, Claim
+from .voice_processing_service import current_analyzer_version
+
+_puts_since_evict = 0  # new entries stored by this process since it last evicted
+_puts_lock = threading.Lock()
+
+
+class VoiceCacheService:
+    """
+    Bounded, least-recently-used cache of voice analysis results keyed by
+    SHA-256 of the audio bytes plus the analyzer version (code version and
+    lexicon fingerprint). Each process trims the cache back to its bound
+    after every VOICE_ANALYSIS_CACHE_EVICT_EVERY entries it stores, so the
+    bound may be overshot by that many entries per process in between.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, analyzer_version=None):
+        self.analyzer_version = analyzer_version or current_analyzer_version()
+        self.max_entries = settings.VOICE_ANALYSIS_CACHE_MAX_ENTRIES
+
+    @classmethod
+    def hash_file(cls, audio_file_path):
+        """SHA-256 of a file, read in fixed-size chunks"""
+        digest = hashlib.sha256()
+        with open(audio_file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, audio_hash):
+        """Return the cached analysis result or None, refreshing its recency"""
+        entries = VoiceAnalysisCacheEntry.objects.filter(
+            audio_hash=audio_hash, analyzer_version=self.analyzer_version
+        )
+        result = entries.values_list('result', flat=True).first()
+        if result is not None:
+            entries.update(last_accessed_at=timezone.now(), hit_count=F('hit_count') + 1)
+        return result
+
+    def put(self, audio_hash, result):
+        """Store an analysis result and evict least recently used entries"""
+        try:
+            with transaction.atomic():
+                VoiceAnalysisCacheEntry.objects.create(
+                    audio_hash=audio_hash,
+                    analyzer_version=self.analyzer_version,
+                    result=result
+                )
+        except IntegrityError:
+            # Another worker cached the same audio first
+            return
+        global _puts_since_evict
+        with _puts_lock:
+            _puts_since_evict += 1
+            due = _puts_since_evict >= settings.VOICE_ANALYSIS_CACHE_EVICT_EVERY
+            if due:
+                _puts_since_evict = 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete every entry but the max_entries most recently used in one
+        DELETE ... WHERE id IN (SELECT id ... OFFSET max_entries); returns
+        the number deleted.
+        """
+        stale = (
+            VoiceAnalysisCacheEntry.objects.order_by('-last_accessed_at', '-id')
+            .values('id')[self.max_entries:]
+        )
+        deleted, _ = VoiceAnalysisCacheEntry.objects.filter(id__in=stale).delete()
+        return deleted
+
+    @staticmethod
+    def find_duplicate_claims(claim, audio_hash):
+        """Other claims that submitted byte-identical audio"""
+        return list(
+            Claim.objects.filter(audio_hash=audio_hash)
+            .exclude(pk=claim.pk)
+            .order_by('created_at')
+            .values_list('claim_number', flat=True)[:10]
+        )
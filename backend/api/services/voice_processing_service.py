@@ -1,18 +1,74 @@
 import os
-import json
-import tempfile
-from datetime import datetime
+import subprocess
 import speech_recognition as sr
 from pydub import AudioSegment
 import numpy as np
 from django.conf import settings
+from .transcription_service import TranscriptionService
+from .audio_feature_service import AudioFeatureService
+from .audio_fingerprint_service import AudioFingerprinter
+from .text_analysis_service import TextAnalysisService, get_lexicon
+
+
+# Bump whenever decoding, transcription or text analysis changes so cached
+# analysis results from older code are no longer served.
+ANALYZER_VERSION = '1.2'
+
+TARGET_SAMPLE_RATE = 16000  # Hz, what the recognizers expect
+TARGET_SAMPLE_WIDTH = 2  # bytes, 16-bit PCM
+
+
+def current_analyzer_version():
+    """ANALYZER_VERSION plus the lexicon fingerprint, so lexicon edits also invalidate cached results"""
+    return f'{ANALYZER_VERSION}+{get_lexicon().version}'
+
+
+class DecodedAudio:
+    """
+    Audio decoded once into an in-memory 16 kHz mono 16-bit PCM buffer.
+    Shared by quality analysis, feature extraction and transcription so
+    the upload is never re-read or written back to disk.
+    """
+    
+    def __init__(self, samples, sample_rate=TARGET_SAMPLE_RATE, audio_format=None,
+                 source_sample_rate=None, source_channels=None, source_bit_depth=None):
+        self.samples = samples  # np.int16 array
+        self.sample_rate = sample_rate
+        self.sample_width = TARGET_SAMPLE_WIDTH
+        self.audio_format = audio_format
+        
+        # Properties of the original recording, when known
+        self.source_sample_rate = source_sample_rate
+        self.source_channels = source_channels
+        self.source_bit_depth = source_bit_depth
+    
+    @property
+    def duration(self):
+        """Duration in seconds"""
+        return len(self.samples) / self.sample_rate if self.sample_rate else 0
+    
+    @property
+    def dBFS(self):
+        if not len(self.samples):
+            return float('-inf')
+        rms = np.sqrt(np.mean(self.samples.astype(np.float64) ** 2))
+        if rms == 0:
+            return float('-inf')
+        return 20 * np.log10(rms / 32768)
+    
+    def to_audio_data(self):
+        """Wrap the buffer for speech_recognition without a file round-trip"""
+        return sr.AudioData(self.samples.tobytes(), self.sample_rate, self.sample_width)
 
 
 class VoiceProcessingService:
     """Service for processing voice claims"""
     
     def __init__(self):
-        self.recognizer = sr.Recognizer()
+        self.transcription_service = TranscriptionService()
+        self.feature_service = AudioFeatureService()
+        self.fingerprinter = AudioFingerprinter()
+        self.text_service = TextAnalysisService()
         self.supported_formats = ['.wav', '.mp3', '.m4a', '.ogg']
     
     def process_voice_claim(self, audio_file_path):
@@ -28,199 +84,100 @@ class VoiceProcessingService:
             'recording_quality': 'unknown',
             'word_count': 0,
             'speaking_rate': 0.0,
-            'duration': 0
+            'duration': 0,
+            'segments': [],
+            'audio_features': {}
         }
         
         try:
-            # Convert audio to WAV if needed
-            wav_path = self._convert_to_wav(audio_file_path)
+            # Decode once; every later stage reads the same buffer
+            audio = self._decode_audio(audio_file_path)
+            result['duration'] = audio.duration
             
-            # Get audio duration
-            audio = AudioSegment.from_file(wav_path)
-            result['duration'] = len(audio) / 1000  # Convert to seconds
+            # Acoustic features and quality, one pass over the signal
+            features = self.feature_service.extract(audio)
+            result['audio_features'] = features
+            result['recording_quality'] = self.feature_service.recording_quality(features)
             
-            # Analyze audio quality
-            result['recording_quality'] = self._analyze_audio_quality(audio)
+            # (landmarks, frames) arrays for the recycled-audio index; not JSON, never cached
+            result['fingerprint'] = self.fingerprinter.fingerprint(audio.samples)
             
             # Transcribe audio
-            transcript_data = self._transcribe_audio(wav_path)
+            transcript_data = self._transcribe_audio(audio)
             result['transcript'] = transcript_data.get('text', '')
             result['confidence'] = transcript_data.get('confidence', 0.0)
+            result['segments'] = transcript_data.get('segments', [])
             
             if result['transcript']:
-                # Extract keywords
-                result['keywords'] = self._extract_keywords(result['transcript'])
+                # Keywords, sentiment and emotions in one pass over the tokens
+                text_analysis = self.text_service.analyze(result['transcript'])
+                result['keywords'] = text_analysis['keywords']
                 
                 # Calculate word count and speaking rate
-                words = result['transcript'].split()
-                result['word_count'] = len(words)
-                result['speaking_rate'] = (len(words) / result['duration']) * 60 if result['duration'] > 0 else 0
+                result['word_count'] = text_analysis['word_count']
+                result['speaking_rate'] = (result['word_count'] / result['duration']) * 60 if result['duration'] > 0 else 0
                 
-                # Analyze sentiment
-                sentiment_result = self._analyze_sentiment(result['transcript'])
+                sentiment_result = text_analysis['sentiment']
                 result['sentiment_score'] = sentiment_result['score']
                 result['sentiment_label'] = sentiment_result['label']
-                result['sentiment_scores'] = sentiment_result.get('scores', {})
-                
-                # Detect emotions
-                result['emotion_scores'] = self._detect_emotions(result['transcript'])
+                result['sentiment_scores'] = sentiment_result['scores']
+                result['emotion_scores'] = text_analysis['emotion_scores']
                 
                 result['success'] = True
-            
-            # Cleanup temporary file
-            if wav_path != audio_file_path:
-                os.remove(wav_path)
                 
         except Exception as e:
             result['error'] = str(e)
         
         return result
     
-    def _convert_to_wav(self, audio_file_path):
-        """Convert audio file to WAV format"""
-        if audio_file_path.lower().endswith('.wav'):
-            return audio_file_path
+    def fingerprint(self, audio_file_path):
+        """Spectral-peak fingerprint of an audio file, for recordings analysed earlier"""
+        return self.fingerprinter.fingerprint(self._decode_audio(audio_file_path).samples)
+    
+    def _decode_audio(self, audio_file_path):
+        """Decode an audio file into a 16 kHz mono 16-bit DecodedAudio"""
+        extension = os.path.splitext(audio_file_path)[1].lower()
+        source = {}
         
         try:
-            audio = AudioSegment.from_file(audio_file_path)
-            temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            audio.export(temp_wav.name, format='wav')
-            return temp_wav.name
+            if extension == '.wav':
+                # pydub parses WAV natively without spawning ffmpeg
+                segment = AudioSegment.from_file(audio_file_path, format='wav')
+                source = {
+                    'source_sample_rate': segment.frame_rate,
+                    'source_channels': segment.channels,
+                    'source_bit_depth': segment.sample_width * 8,
+                }
+                segment = (segment.set_channels(1)
+                           .set_frame_rate(TARGET_SAMPLE_RATE)
+                           .set_sample_width(TARGET_SAMPLE_WIDTH))
+                samples = np.frombuffer(segment.raw_data, dtype=np.int16)
+            else:
+                samples = self._decode_with_ffmpeg(audio_file_path)
         except Exception as e:
             raise Exception(f"Audio conversion failed: {str(e)}")
+        
+        return DecodedAudio(samples, audio_format=extension.lstrip('.') or None, **source)
     
-    def _analyze_audio_quality(self, audio_segment):
-        """Analyze audio quality"""
-        try:
-            # Calculate loudness
-            dBFS = audio_segment.dBFS
-            
-            # Calculate noise level (simplified)
-            samples = np.array(audio_segment.get_array_of_samples())
-            noise_level = np.std(samples[:1000]) if len(samples) > 1000 else np.std(samples)
-            
-            if dBFS > -20 and noise_level < 1000:
-                return 'good'
-            elif dBFS > -30 and noise_level < 5000:
-                return 'fair'
-            else:
-                return 'poor'
-        except:
-            return 'unknown'
+    def _decode_with_ffmpeg(self, audio_file_path):
+        """
+        Let ffmpeg decode, downmix and resample in one pass, streaming raw
+        PCM over stdout instead of writing an intermediate WAV.
+        """
+        command = [
+            AudioSegment.converter, '-nostdin', '-v', 'error',
+            '-i', audio_file_path,
+            '-vn', '-ac', '1', '-ar', str(TARGET_SAMPLE_RATE),
+            '-f', 's16le', '-acodec', 'pcm_s16le', '-'
+        ]
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if process.returncode != 0 or not process.stdout:
+            raise Exception(process.stderr.decode(errors='ignore').strip() or 'ffmpeg produced no audio')
+        return np.frombuffer(process.stdout, dtype=np.int16)
     
-    def _transcribe_audio(self, wav_file_path):
-        """Transcribe audio to text"""
+    def _transcribe_audio(self, audio):
+        """Transcribe audio to text, segment by segment"""
         try:
-            with sr.AudioFile(wav_file_path) as source:
-                audio_data = self.recognizer.record(source)
-                
-                # Try Google Speech Recognition first
-                try:
-                    text = self.recognizer.recognize_google(audio_data, language='en-NG')
-                    return {'text': text, 'confidence': 0.9, 'engine': 'google'}
-                except:
-                    pass
-                
-                # Fallback to Sphinx (offline)
-                try:
-                    text = self.recognizer.recognize_sphinx(audio_data)
-                    return {'text': text, 'confidence': 0.6, 'engine': 'sphinx'}
-                except:
-                    pass
-                
-                return {'text': '', 'confidence': 0.0, 'engine': 'none'}
-                
+            return self.transcription_service.transcribe(audio)
         except Exception as e:
             raise Exception(f"Transcription failed: {str(e)}")
-    
-    def _extract_keywords(self, text):
-        """Extract keywords from transcript"""
-        # Common insurance keywords
-        insurance_keywords = {
-            'accident', 'crash', 'collision', 'damage', 'broken', 'stolen',
-            'theft', 'robbery', 'burglary', 'fire', 'flood', 'water',
-            'hospital', 'doctor', 'sick', 'illness', 'injury', 'pain',
-            'emergency', 'urgent', 'immediate', 'serious', 'severe',
-            'witness', 'police', 'report', 'case', 'investigation',
-            'repair', 'replace', 'cost', 'expensive', 'value', 'money'
-        }
-        
-        # Nigerian specific keywords
-        nigerian_keywords = {
-            'naija', 'lagos', 'abuja', 'port harcourt', 'kano',
-            'okada', 'keke', 'danfo', 'molue', 'boda boda',
-            'area boys', 'lastma', 'frsc', 'efcc', 'ndlea'
-        }
-        
-        words = text.lower().split()
-        found_keywords = []
-        
-        for word in words:
-            if word in insurance_keywords and word not in found_keywords:
-                found_keywords.append(word)
-        
-        # Check for Nigerian location mentions
-        for location in nigerian_keywords:
-            if location in text.lower() and location not in found_keywords:
-                found_keywords.append(location)
-        
-        return found_keywords[:10]  # Return top 10 keywords
-    
-    def _analyze_sentiment(self, text):
-        """Analyze sentiment of text"""
-        # Simple sentiment analysis
-        positive_words = {'good', 'great', 'excellent', 'happy', 'satisfied', 
-                         'thank', 'thanks', 'helpful', 'quick', 'fast'}
-        negative_words = {'bad', 'terrible', 'awful', 'angry', 'frustrated',
-                         'slow', 'late', 'problem', 'issue', 'complaint',
-                         'pain', 'hurt', 'damage', 'lost', 'stolen'}
-        
-        words = text.lower().split()
-        pos_count = sum(1 for word in words if word in positive_words)
-        neg_count = sum(1 for word in words if word in negative_words)
-        
-        total = pos_count + neg_count
-        if total > 0:
-            score = (pos_count - neg_count) / total
-        else:
-            score = 0
-        
-        # Normalize to -1 to 1 range
-        score = max(-1, min(1, score))
-        
-        if score > 0.3:
-            label = 'positive'
-        elif score < -0.3:
-            label = 'negative'
-        else:
-            label = 'neutral'
-        
-        return {
-            'score': score,
-            'label': label,
-            'scores': {
-                'positive': pos_count,
-                'negative': neg_count,
-                'neutral': len(words) - pos_count - neg_count
-            }
-        }
-    
-    def _detect_emotions(self, text):
-        """Detect emotions in text (simplified)"""
-        # Emotion keywords
-        emotion_keywords = {
-            'anger': {'angry', 'mad', 'furious', 'rage', 'annoyed'},
-            'fear': {'scared', 'afraid', 'frightened', 'terrified', 'panic'},
-            'sadness': {'sad', 'unhappy', 'depressed', 'cry', 'tears'},
-            'joy': {'happy', 'joy', 'delighted', 'pleased', 'excited'},
-            'surprise': {'surprised', 'shocked', 'amazed', 'astonished'}
-        }
-        
-        words = text.lower().split()
-        emotion_scores = {}
-        
-        for emotion, keywords in emotion_keywords.items():
-            count = sum(1 for word in words if word in keywords)
-            emotion_scores[emotion] = count
-        
-        return emotion_scores
\ No newline at end of file
@@ -0,0 +1,160 @@
+import copy
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import Claim, Payment, Policy, ScoringModelVersion, InsuranceProduct
+from .services.user_feature_service import UserFeatureService
+from .services.score_event_service import ScoreEventService
+from .services.scoring_models import reload_scoring_models
+from .services.pricing_service import invalidate_rate_table, reload_product_catalog
+from .services.narrative_similarity_service import NarrativeSimilarityService
+from .services.photo_hash_service import PhotoHashService
+from .services.fraud_ring_service import FraudRingService, USER_IDENTIFIER_FIELDS
+
+User = get_user_model()
+
+# Fields whose transitions feed UserRiskFeatures, score events, the narrative
+# and photo indexes and the fraud rings, per model
+TRACKED_FIELDS = {
+    Claim: (
+        'status', 'claim_type', 'claimed_amount', 'approved_amount', 'description', 'transcript', 'photos',
+        'incident_location', 'incident_date', 'device_id',
+    ),
+    Policy: ('status',),
+    Payment: ('status',),
+    User: USER_IDENTIFIER_FIELDS,
+}
+CLAIM_IDENTIFIER_FIELDS = ('incident_location', 'incident_date', 'device_id')
+
+feature_service = UserFeatureService()
+score_event_service = ScoreEventService()
+narrative_service = NarrativeSimilarityService()
+photo_service = PhotoHashService()
+fraud_ring_service = FraudRingService()
+
+
+def _loaded_state(instance):
+    """Tracked field values as loaded; deferred fields are left out rather than fetched"""
+    # Copied so in-place edits of JSON lists still show up as changes
+    return {
+        field: copy.copy(instance.__dict__[field])
+        for field in TRACKED_FIELDS[type(instance)]
+        if field in instance.__dict__
+    }
+
+
+def _previous_state(instance, created, update_fields):
+    """The state before this save, or None when a save cannot have changed it"""
+    previous = getattr(instance, '_tracked_state', {})
+    instance._tracked_state = _loaded_state(instance)
+    if created:
+        return {}
+    fields = TRACKED_FIELDS[type(instance)]
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return None
+    if any(field not in previous for field in fields):
+        # Loaded with deferred fields: the old values are unknown
+        return None
+    return previous
+
+
+@receiver(post_init, sender=Claim)
+@receiver(post_init, sender=Policy)
+@receiver(post_init, sender=Payment)
+@receiver(post_init, sender=User)
+def track_loaded_state(sender, instance, **kwargs):
+    """Remember tracked values as loaded so post_save can see what changed"""
+    if instance.pk is not None:
+        instance._tracked_state = _loaded_state(instance)
+
+
+@receiver(post_save, sender=Claim)
+def update_features_on_claim_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    previous = _previous_state(instance, created, update_fields)
+    if raw or previous is None:
+        return
+    feature_service.claim_saved(instance, previous or None)
+    score_event_service.claim_saved(instance, previous.get('status'))
+    if created or any(previous[field] != getattr(instance, field) for field in ('description', 'transcript')):
+        narrative_service.index_claims([instance])
+    # Photos are queued for hashing once the claim is submitted, and again if they
+    # change; the rows commit with the claim and are hashed by a worker afterwards
+    if instance.status != Claim.ClaimStatus.DRAFT:
+        newly_submitted = previous.get('status') in (None, Claim.ClaimStatus.DRAFT)
+        if (newly_submitted and instance.photos) or previous.get('photos', instance.photos) != instance.photos:
+            photo_service.queue_claim(instance)
+    if created or any(previous[field] != getattr(instance, field) for field in CLAIM_IDENTIFIER_FIELDS):
+        fraud_ring_service.claim_changed(instance)
+
+
+@receiver(post_save, sender=Policy)
+def update_features_on_policy_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    previous = _previous_state(instance, created, update_fields)
+    if raw or previous is None:
+        return
+    feature_service.policy_saved(instance, previous.get('status'), created=created)
+    score_event_service.policy_saved(instance, previous.get('status'))
+
+
+@receiver(post_save, sender=Payment)
+def update_features_on_payment_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    previous = _previous_state(instance, created, update_fields)
+    if raw or previous is None:
+        return
+    feature_service.payment_saved(instance, previous.get('status'))
+    score_event_service.payment_saved(instance, previous.get('status'))
+
+
+@receiver(post_save, sender=User)
+def update_fraud_ring_on_user_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    previous = _previous_state(instance, created, update_fields)
+    if raw or previous is None:
+        return
+    if created or any(previous[field] != getattr(instance, field) for field in USER_IDENTIFIER_FIELDS):
+        fraud_ring_service.user_saved(instance, created=created)
+
+
+@receiver(post_delete, sender=Claim)
+def update_features_on_claim_delete(sender, instance, origin=None, **kwargs):
+    feature_service.claim_deleted(instance)
+    # Deleting the user rebuilds their ring once, in rebuild_fraud_ring_on_user_delete
+    if not (isinstance(origin, User) or getattr(origin, 'model', None) is User):
+        fraud_ring_service.claim_changed(instance)
+
+
+@receiver(post_delete, sender=Policy)
+def update_features_on_policy_delete(sender, instance, **kwargs):
+    feature_service.policy_deleted(instance)
+
+
+@receiver(post_delete, sender=Payment)
+def update_features_on_payment_delete(sender, instance, **kwargs):
+    feature_service.payment_deleted(instance)
+
+
+@receiver(pre_delete, sender=User)
+def remember_fraud_ring_on_user_delete(sender, instance, **kwargs):
+    instance._fraud_ring_members = fraud_ring_service.members(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def rebuild_fraud_ring_on_user_delete(sender, instance, **kwargs):
+    """The rest of the ring may fall apart without the deleted user"""
+    members = set(getattr(instance, '_fraud_ring_members', ())) - {instance.pk}
+    if members:
+        fraud_ring_service.rebuild_rings(members)
+
+
+@receiver(post_save, sender=ScoringModelVersion)
+@receiver(post_delete, sender=ScoringModelVersion)
+def reload_scoring_models_on_change(sender, **kwargs):
+    """This process sees the change at once; other workers on their next reload"""
+    reload_scoring_models()
+
+
+@receiver(post_save, sender=InsuranceProduct)
+@receiver(post_delete, sender=InsuranceProduct)
+def invalidate_pricing_on_change(sender, instance, **kwargs):
+    """Other workers rebuild the table when they load the product's new updated_at"""
+    invalidate_rate_table(instance.pk)
+    reload_product_catalog()
@@ -1,14 +1,27 @@
+import io
+import os
 import json
+import struct
 import tempfile
+import time
 from unittest.mock import patch, MagicMock, Mock
 from datetime import date, timedelta
 from decimal import Decimal
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import speech_recognition as sr # Added import
+from PIL import Image
 
+from django.conf import settings
 from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
@@ -16,16 +29,39 @@ from rest_framework import status
 from users.models import UserProfile
 from .models import (
     InsuranceProduct, Policy, Claim, VoiceAnalysis,
-    SoroScoreLog, Payment, Notification, AdminDashboard
+    SoroScoreLog, Payment, Notification, AdminDashboard,
+    VoiceProcessingJob, VoiceAnalysisCacheEntry, UserRiskFeatures, ScoreRecomputeRequest,
+    ScoringModelVersion, ClaimNarrativeSignature, ClaimPhotoHash, ClaimAudioFingerprint,
+    IdentifierLink, FraudRingNode, SoroScoreLogArchive, SoroScoreLogArchiveKey, ClaimScoreExplanation,
+    PolicyLifecycleEvent
 )
 from .serializers import (
     InsuranceProductSerializer, PolicySerializer, ClaimSerializer,
-    PaymentSerializer, NotificationSerializer, AdminDashboardSerializer
+    PaymentSerializer, NotificationSerializer, AdminDashboardSerializer,
+    SoroScoreLogSerializer
 )
 from .services import (
-    SoroScoreService, VoiceProcessingService,
-    PaymentService, NotificationService, USSDService
+    SoroScoreService, VoiceProcessingService, TextAnalysisService,
+    PaymentService, NotificationService, USSDService,
+    ClaimProcessingService, VoiceCacheService, ScoreEventService,
+    ScoringModelService, NarrativeSimilarityService, PhotoHashService, AudioFingerprintService,
+    FraudRingService, ScoreLogService, ScoreExplanationService, PricingService,
+    PolicyRenewalService, PolicyLifecycleService
 )
+from .services.voice_processing_service import DecodedAudio
+from .services.transcription_service import TranscriptionService
+from .services.transcription_engines import (
+    StubEngine, SphinxEngine, build_engines, engine_health, engine_stats, reset_engine_stats,
+    recognize as recognize_with_engines
+)
+from .services.audio_feature_service import AudioFeatureService
+from .services.audio_fingerprint_service import AudioFingerprinter
+from .services.text_analysis_service import load_lexicon
+from .services.audio_probe_service import AudioProbeService, AudioProbeError
+from .services.scoring_models import live_scoring_model, reload_scoring_models
+from .services.photo_hash_service import hash_blocks
+from .services import pricing_service, transcription_engines
+from . import transcription_worker
 
 User = get_user_model()
 
@@ -33,6 +69,16 @@ User = get_user_model()
 # ----------------------------------------------------------------------
 # Helper factories to create test objects
 # ----------------------------------------------------------------------
+def make_wav_bytes(seconds, sample_rate=16000, channels=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b'\x00\x00' * channels * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
 def create_user(phone_number='+2348000000000', **kwargs):
     user = User.objects.create_user(
         phone_number=phone_number,
@@ -205,6 +251,7 @@ class PolicySerializerTests(TestCase):
         self.assertEqual(serializer.data['user_name'], self.user.get_full_name())
         self.assertEqual(serializer.data['product_name'], self.product.name)
         self.assertIn('is_active', serializer.data)
+        self.assertEqual(serializer.data['days_remaining'], 365)
 
     def test_create_policy_serializer(self):
         data = {
@@ -265,6 +312,49 @@ class ClaimSerializerTests(TestCase):
         claim = serializer.save(user=self.user)
         self.assertIsNotNone(claim.audio_file)
 
+    def _audio_claim_data(self, audio_file):
+        return {
+            'policy': self.policy.id,
+            'claim_type': 'accident',
+            'incident_date': date.today().isoformat(),
+            'incident_location': 'Lagos',
+            'estimated_loss': 10000,
+            'claimed_amount': 9000,
+            'description': 'Test claim description',
+            'audio_file': audio_file
+        }
+
+    def test_create_with_audio_saves_probed_metadata(self):
+        audio_file = SimpleUploadedFile("claim.wav", make_wav_bytes(3, sample_rate=44100, channels=2))
+        serializer = ClaimSerializer(data=self._audio_claim_data(audio_file))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        claim = serializer.save(user=self.user)
+        self.assertEqual(claim.audio_duration, 3)
+        self.assertEqual(claim.voice_analysis.sample_rate, 44100)
+        self.assertEqual(claim.voice_analysis.channels, 2)
+        self.assertEqual(claim.voice_analysis.audio_codec, 'pcm')
+
+    @override_settings(AUDIO_MAX_DURATION=2)
+    def test_rejects_overlong_recording(self):
+        audio_file = SimpleUploadedFile("claim.wav", make_wav_bytes(3))
+        serializer = ClaimSerializer(data=self._audio_claim_data(audio_file))
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('maximum 2s', str(serializer.errors['audio_file']))
+
+    def test_rejects_disallowed_extension_and_mismatched_content(self):
+        for name in ("claim.exe", "claim.mp3"):
+            audio_file = SimpleUploadedFile(name, make_wav_bytes(1))
+            serializer = ClaimSerializer(data=self._audio_claim_data(audio_file))
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('audio_file', serializer.errors)
+
+    @override_settings(MAX_UPLOAD_SIZE=1000)
+    def test_rejects_oversized_upload(self):
+        audio_file = SimpleUploadedFile("claim.wav", make_wav_bytes(1))
+        serializer = ClaimSerializer(data=self._audio_claim_data(audio_file))
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('too large', str(serializer.errors['audio_file']))
+
 
 # ----------------------------------------------------------------------
 # View Tests (APITestCase)
@@ -364,6 +454,213 @@ class PolicyViewSetTests(APITestCase):
         self.assertEqual(self.policy.status, Policy.PolicyStatus.EXPIRED)
 
 
+class PricingServiceTests(TestCase):
+    def setUp(self):
+        self.product = create_product()
+        self.service = PricingService()
+
+    def test_rate_table_by_band_and_frequency(self):
+        self.assertEqual(self.service.premium(self.product, 30), Decimal('8000.00'))
+        self.assertEqual(self.service.premium(self.product, 30.5), Decimal('10000.00'))
+        self.assertEqual(self.service.premium(self.product, 71, 'quarterly'), Decimal('13000.00'))
+        quote = self.service.quote(self.product, 10, 'annually')
+        self.assertEqual(quote['risk_level'], 'low')
+        self.assertEqual(quote['premium'], Decimal('8000.00'))
+
+        self.product.max_premium = Decimal('12000.00')
+        self.product.save()
+        self.assertEqual(self.service.premium(self.product, 90), Decimal('12000.00'))
+        with self.assertRaises(ValueError):
+            self.service.quote(self.product, 50, 'weekly')
+
+    def test_frequency_does_not_change_premium(self):
+        # Pinned to the amounts quoted before pricing moved into PricingService
+        for score, expected in ((10, '8000.00'), (50, '10000.00'), (90, '13000.00')):
+            for frequency in ('monthly', 'quarterly', 'annually'):
+                self.assertEqual(self.service.premium(self.product, score, frequency), Decimal(expected))
+
+    def test_tables_cached_until_product_changes(self):
+        with patch('api.services.pricing_service.build_rate_table',
+                   wraps=pricing_service.build_rate_table) as mock_build:
+            self.service.premium(self.product, 50)
+            self.service.premium(self.product, 90, 'quarterly')
+            self.assertEqual(mock_build.call_count, 1)
+
+            stale = InsuranceProduct.objects.get(pk=self.product.pk)
+            self.product.base_premium = Decimal('20000.00')
+            self.product.save()
+            self.assertEqual(self.service.premium(self.product, 50), Decimal('20000.00'))
+            self.assertEqual(mock_build.call_count, 2)
+            # A copy loaded before the change is priced from its own values, not the cached table
+            self.assertEqual(self.service.premium(stale, 50), Decimal('10000.00'))
+
+    def test_policy_create_and_renew_use_frequency(self):
+        user = create_user()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(reverse('policy-list'), {
+            'product': self.product.id,
+            'start_date': date.today().isoformat(),
+            'end_date': (date.today() + timedelta(days=365)).isoformat(),
+            'premium_frequency': 'quarterly',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(response.data['premium_amount']), Decimal('10000.00'))
+
+        policy = Policy.objects.get(pk=response.data['id'])
+        policy.status = Policy.PolicyStatus.ACTIVE
+        policy.save()
+        response = client.post(reverse('policy-renew', args=[policy.id]))
+        self.assertEqual(response.data['payment_required'], Decimal('10000.00'))
+        self.assertEqual(response.data['new_policy']['premium_frequency'], 'quarterly')
+
+        response = client.post(reverse('product-calculate-premium', args=[self.product.id]),
+                               {'premium_frequency': 'fortnightly'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_quotes_catalog_in_one_request(self):
+        self.addCleanup(pricing_service.reload_product_catalog)
+        health = create_product(name='Health Cover', product_type='health', base_premium=Decimal('4000.00'),
+                                min_premium=Decimal('1000.00'))
+        create_product(name='Retired Cover', is_active=False)
+        url = reverse('product-quotes')
+        self.client = APIClient()
+
+        response = self.client.post(url, {'soro_score': 80, 'premium_frequencies': ['monthly', 'annually']},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['risk_level'], 'high')
+        self.assertEqual([quote['product_id'] for quote in response.data['quotes']], [self.product.id, health.id])
+        self.assertEqual(response.data['quotes'][1]['premiums'],
+                         {'monthly': Decimal('5200.00'), 'annually': Decimal('5200.00')})
+
+        with self.assertNumQueries(0):
+            result = self.service.quote_catalog(20, product_type='health')
+        self.assertEqual([quote['premiums'] for quote in result['quotes']], [{'monthly': Decimal('3200.00')}])
+
+        health.is_active = False
+        health.save()
+        response = self.client.post(url, {'soro_score': 50, 'product_ids': [health.id]}, format='json')
+        self.assertEqual(response.data['quotes'], [])
+        response = self.client.post(url, {'premium_frequencies': 'monthly'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PolicyRenewalServiceTests(TestCase):
+    def setUp(self):
+        self.addCleanup(pricing_service.reload_product_catalog)
+        pricing_service.reload_product_catalog()
+        self.product = create_product()
+        self.user = create_user()
+        User.objects.filter(pk=self.user.pk).update(soro_score=20)
+        self.end_date = date.today() + timedelta(days=5)
+        self.due = create_policy(self.user, self.product, end_date=self.end_date, premium_frequency='quarterly')
+
+    def test_command_renews_due_policies_in_bulk(self):
+        later = create_policy(self.user, self.product, end_date=date.today() + timedelta(days=60))
+        pending = create_policy(self.user, self.product, end_date=self.end_date, status=Policy.PolicyStatus.PENDING)
+        retired = create_product(name='Retired Cover')
+        on_retired = create_policy(create_user(phone_number='+2348033333333'), retired, end_date=self.end_date)
+        retired.is_active = False
+        retired.save()
+
+        out = io.StringIO()
+        call_command('renew_policies', '--chunk-size', '1', stdout=out)
+        self.assertIn('2/2 processed, 1 renewed, 1 skipped', out.getvalue())
+
+        renewal = Policy.objects.get(user=self.user, status=Policy.PolicyStatus.PENDING, premium_frequency='quarterly')
+        self.assertEqual(renewal.start_date, self.end_date + timedelta(days=1))
+        self.assertEqual(renewal.premium_amount, Decimal('8000.00'))
+        self.assertEqual(renewal.initial_soro_score, 20)
+        self.due.refresh_from_db()
+        self.assertEqual(self.due.status, Policy.PolicyStatus.EXPIRED)
+        for policy in (later, pending, on_retired):
+            status_before = policy.status
+            policy.refresh_from_db()
+            self.assertEqual(policy.status, status_before)
+        self.assertEqual(UserRiskFeatures.objects.get(user=self.user).policy_count, 4)
+
+        payment = Payment.objects.get(policy=renewal)
+        self.assertEqual((payment.payment_type, payment.status, payment.amount),
+                         (Payment.PaymentType.RENEWAL, Payment.PaymentStatus.PENDING, Decimal('8000.00')))
+        PaymentService().verify_payment(payment.payment_reference)
+        renewal.refresh_from_db()
+        self.assertEqual(renewal.status, Policy.PolicyStatus.ACTIVE)
+
+    def test_renewed_policies_are_not_renewed_twice(self):
+        service = PolicyRenewalService()
+        self.assertEqual(len(service.renew([self.due.id])), 1)
+        self.assertEqual(service.renew([self.due.id]), [])
+        self.assertEqual(list(service.due()), [])
+
+    def test_policies_expired_by_the_sweep_are_still_renewed(self):
+        swept_on = self.end_date + timedelta(days=1)
+        call_command('sweep_policies', '--date', swept_on.isoformat(), stdout=io.StringIO())
+        self.due.refresh_from_db()
+        self.assertEqual(self.due.status, Policy.PolicyStatus.EXPIRED)
+
+        service = PolicyRenewalService()
+        late = self.end_date + timedelta(days=settings.POLICY_RENEWAL_WINDOW_DAYS)
+        self.assertEqual(list(service.due(late + timedelta(days=1))), [])
+        self.assertEqual(list(service.due(late)), [self.due])
+        renewals = service.renew([self.due.id], late)
+        self.assertEqual([renewal.start_date for renewal in renewals], [late + timedelta(days=1)])
+        self.assertEqual(list(service.due(late)), [])
+        self.assertEqual(service.renew([self.due.id], late), [])
+
+
+class PolicyLifecycleServiceTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.product = create_product()
+        self.today = date.today()
+
+    def test_sweep_expires_and_lapses_due_policies(self):
+        ended = create_policy(self.user, self.product, end_date=self.today - timedelta(days=1),
+                              next_payment_date=self.today - timedelta(days=30))
+        missed = create_policy(self.user, self.product, next_payment_date=self.today - timedelta(days=8))
+        in_grace = create_policy(self.user, self.product, next_payment_date=self.today - timedelta(days=7))
+        pending = create_policy(self.user, self.product, end_date=self.today - timedelta(days=1),
+                                status=Policy.PolicyStatus.PENDING)
+        other = create_user(phone_number='+2348033333333')
+        other_missed = create_policy(other, self.product, next_payment_date=self.today - timedelta(days=10))
+        ScoreRecomputeRequest.objects.create(user=other, reasons=['claim_decided'], due_at=timezone.now())
+
+        out = io.StringIO()
+        call_command('sweep_policies', '--chunk-size', '1', stdout=out)
+        self.assertIn('Expired 1 and lapsed 2 policies', out.getvalue())
+
+        statuses = dict(Policy.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[ended.id], Policy.PolicyStatus.EXPIRED)
+        self.assertEqual(statuses[missed.id], Policy.PolicyStatus.LAPSED)
+        self.assertEqual(statuses[other_missed.id], Policy.PolicyStatus.LAPSED)
+        self.assertEqual(statuses[in_grace.id], Policy.PolicyStatus.ACTIVE)
+        self.assertEqual(statuses[pending.id], Policy.PolicyStatus.PENDING)
+        self.assertEqual(
+            sorted(PolicyLifecycleEvent.objects.values_list('policy_id', 'event', 'due_date')),
+            sorted([(ended.id, 'expired', ended.end_date), (missed.id, 'lapsed', missed.next_payment_date),
+                    (other_missed.id, 'lapsed', other_missed.next_payment_date)])
+        )
+        self.assertEqual(ScoreRecomputeRequest.objects.get(user=self.user).reasons, ['policy_lapsed'])
+        joined = ScoreRecomputeRequest.objects.get(user=other)
+        self.assertEqual((joined.reasons, joined.event_count), (['claim_decided', 'policy_lapsed'], 2))
+
+        self.assertEqual(list(PolicyLifecycleService().sweep()), [])
+
+    def test_paying_a_lapsed_policy_reactivates_it(self):
+        policy = create_policy(self.user, self.product, next_payment_date=self.today - timedelta(days=10))
+        list(PolicyLifecycleService().sweep())
+        policy.refresh_from_db()
+        self.assertEqual(policy.status, Policy.PolicyStatus.LAPSED)
+
+        payment = Payment.objects.create(user=self.user, payment_type='premium', amount=10000,
+                                         policy=policy, payment_gateway='mock')
+        PaymentService().verify_payment(payment.payment_reference)
+        policy.refresh_from_db()
+        self.assertEqual(policy.status, Policy.PolicyStatus.ACTIVE)
+        self.assertGreater(policy.next_payment_date, self.today)
+
+
 class ClaimViewSetTests(APITestCase):
     def setUp(self):
         self.client = APIClient()
@@ -391,8 +688,8 @@ class ClaimViewSetTests(APITestCase):
         self.assertEqual(response.data['user'], self.user.id)
         self.assertIsNotNone(response.data['claim_number'])
 
-    @patch('api.views.VoiceProcessingService')
-    @patch('api.views.SoroScoreService')
+    @patch('api.services.claim_processing_service.VoiceProcessingService')
+    @patch('api.services.claim_processing_service.SoroScoreService')
     def test_submit_voice_claim(self, mock_soro_service, mock_voice_service):
         # Mock services
         mock_voice_instance = mock_voice_service.return_value
@@ -440,6 +737,91 @@ class ClaimViewSetTests(APITestCase):
         claim.refresh_from_db()
         self.assertIsNotNone(claim.soro_score)
 
+    @patch('api.services.claim_processing_service.VoiceProcessingService')
+    @patch('api.services.claim_processing_service.SoroScoreService')
+    def test_submit_voice_claim_async(self, mock_soro_service, mock_voice_service):
+        mock_voice_service.return_value.process_voice_claim.return_value = {
+            'transcript': 'I had an accident',
+            'confidence': 0.95,
+            'keywords': ['accident'],
+            'sentiment_score': 0.2,
+        }
+        mock_soro_service.return_value.calculate_claim_score.return_value = {
+            'soro_score': 45.5,
+            'risk_level': 'medium',
+            'auto_approval_recommended': False,
+            'components': {
+                'inconsistency': 30, 'urgency': 40, 'sentiment': 50,
+                'media_integrity': 70, 'historical': 60,
+                'weighted_inconsistency': 3, 'weighted_urgency': 4,
+                'weighted_sentiment': 5, 'weighted_media': 7,
+                'weighted_historical': 6
+            }
+        }
+
+        audio_file = SimpleUploadedFile("test.wav", b"fake audio", content_type="audio/wav")
+        claim = create_claim(self.user, self.policy, audio_file=audio_file)
+        url = reverse('claim-submit-voice-claim', args=[claim.id])
+
+        response = self.client.post(url + '?async=true')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['job']['status'], 'queued')
+        mock_voice_service.return_value.process_voice_claim.assert_not_called()
+
+        # Retrying while queued reuses the same job
+        response = self.client.post(url + '?async=true')
+        self.assertEqual(VoiceProcessingJob.objects.filter(claim=claim).count(), 1)
+
+        # A worker picks the job up and runs it
+        service = ClaimProcessingService()
+        job = service.acquire_next_job()
+        self.assertEqual(job.status, VoiceProcessingJob.JobStatus.RUNNING)
+        self.assertIsNone(service.acquire_next_job())
+        job = service.run_job(job)
+        self.assertEqual(job.status, VoiceProcessingJob.JobStatus.DONE)
+        self.assertIn('voice_analysis', job.stage_timings)
+
+        status_url = reverse('voice-job-detail', args=[job.job_id])
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['result']['soro_score'], 45.5)
+
+        claim.refresh_from_db()
+        self.assertEqual(claim.soro_score, 45.5)
+
+    def test_stale_running_jobs_are_requeued_then_failed(self):
+        service = ClaimProcessingService()
+        stale_start = timezone.now() - timedelta(seconds=settings.VOICE_JOB_TIMEOUT_SECONDS + 1)
+        job = VoiceProcessingJob.objects.create(claim=self.claim, status=VoiceProcessingJob.JobStatus.RUNNING,
+                                                started_at=stale_start, attempts=1)
+
+        # The killed worker's job is retried by the next worker
+        acquired = service.acquire_next_job()
+        self.assertEqual((acquired.pk, acquired.attempts), (job.pk, 2))
+
+        VoiceProcessingJob.objects.filter(pk=job.pk).update(
+            started_at=stale_start, attempts=settings.VOICE_JOB_MAX_ATTEMPTS
+        )
+        self.assertIsNone(service.acquire_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, VoiceProcessingJob.JobStatus.FAILED)
+
+    def test_enqueue_replaces_stale_running_job(self):
+        service = ClaimProcessingService()
+        stale = VoiceProcessingJob.objects.create(
+            claim=self.claim, status=VoiceProcessingJob.JobStatus.RUNNING,
+            started_at=timezone.now() - timedelta(seconds=settings.VOICE_JOB_TIMEOUT_SECONDS + 1), attempts=1
+        )
+        job = service.enqueue(self.claim)
+        self.assertNotEqual(job.pk, stale.pk)
+        self.assertEqual(job.status, VoiceProcessingJob.JobStatus.QUEUED)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, VoiceProcessingJob.JobStatus.FAILED)
+
+        running = service.acquire_next_job()
+        self.assertEqual(service.enqueue(self.claim).pk, running.pk)
+
     def test_review_claim_as_admin(self):
         self.client.force_authenticate(user=self.admin)
         url = reverse('claim-review', args=[self.claim.id])
@@ -456,6 +838,42 @@ class ClaimViewSetTests(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    @override_settings(SCORE_BATCH_CHUNK_SIZE=2)
+    def test_score_batch_streams_ndjson(self):
+        self.client.force_authenticate(user=self.admin)
+        claims = [self.claim] + [create_claim(self.user, self.policy) for _ in range(2)]
+        data = {
+            'claim_ids': [claim.id for claim in claims] + [999999],
+            'claims': [{'reference': 'partner-1', 'features': {'claimed_ratio': 1.5, 'media_count': 2}}],
+        }
+        response = self.client.post(reverse('claim-score-batch'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual([line.get('claim_id') for line in lines[:4]], data['claim_ids'])
+        expected = SoroScoreService().calculate_claim_score(claims[1])['soro_score']
+        self.assertEqual(lines[1]['soro_score'], expected)
+        self.assertEqual(lines[3]['error'], 'Claim not found')
+        self.assertEqual(lines[4]['reference'], 'partner-1')
+        self.assertIn('claimed_exceeds_estimate', lines[4]['flags'])
+        self.assertEqual(lines[5], {'done': True, 'scored': 4, 'errors': 1})
+        self.assertEqual(SoroScoreLog.objects.filter(calculation_metadata__source='score_batch').count(), 4)
+        self.assertEqual(SoroScoreLog.objects.filter(claim=claims[2]).count(), 1)
+
+    def test_score_batch_validation(self):
+        url = reverse('claim-score-batch')
+        response = self.client.post(url, {'claim_ids': [self.claim.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        for data in ({}, {'claim_ids': ['1']}, {'claims': [{'features': {'not_a_feature': 1}}]}):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(SCORE_BATCH_MAX_ITEMS=2):
+            response = self.client.post(url, {'claim_ids': [1, 2, 3]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class PaymentViewSetTests(APITestCase):
     def setUp(self):
@@ -580,64 +998,1275 @@ class SoroScoreServiceTests(TestCase):
         self.policy = create_policy(self.user, self.product)
         self.claim = create_claim(self.user, self.policy)
 
-    @patch('random.uniform')
-    def test_calculate_claim_score(self, mock_uniform):
-        mock_uniform.side_effect = [40.0, 20, 30, 10, 50, 60, 0.8]
+    def test_calculate_claim_score(self):
         result = self.service.calculate_claim_score(self.claim)
         self.assertIn('soro_score', result)
         self.assertIn('risk_level', result)
         self.assertIn('auto_approval_recommended', result)
         self.assertIn('components', result)
+        self.assertEqual(result, self.service.calculate_claim_score(self.claim))
+
+    def test_batch_matches_single_claim_path(self):
+        claims = [self.claim] + [
+            create_claim(self.user, self.policy, claimed_amount=amount, keywords=keywords,
+                         transcript='recorded account', transcript_confidence=0.9, photos=photos)
+            for amount, keywords, photos in [
+                (40000, ['accident', 'okada'], ['a.jpg', 'b.jpg']),
+                (90000, ['urgent', 'emergency'], []),
+                (45000, ['stolen'], ['c.jpg']),
+            ]
+        ]
+        batch = self.service.score_claims(claims)
+        self.assertEqual(batch, [self.service.calculate_claim_score(claim) for claim in claims])
+
+        # Supported account with evidence scores lower risk than an urgent, inflated one
+        self.assertLess(batch[1]['soro_score'], batch[2]['soro_score'])
+        self.assertIn('claimed_exceeds_estimate', batch[2]['flags'])
+
+    @override_settings(SORO_SCORE_WEIGHTS={'inconsistency': 1.0})
+    def test_score_is_weighted_sum_of_components(self):
+        create_claim(self.user, self.policy, status=Claim.ClaimStatus.REJECTED)
+        result = self.service.calculate_claim_score(self.claim)
+        components = result['components']
+        self.assertAlmostEqual(result['soro_score'], components['inconsistency'], places=3)
+        self.assertEqual(components['weighted_historical'], 0)
+        self.assertEqual(result['features']['prior_rejected'], 1)
+        self.assertGreater(components['historical'], 0)
 
     def test_calculate_user_score(self):
         score = self.service.calculate_user_score(self.user)
-        self.assertTrue(30 <= score <= 80)
+        self.assertTrue(0 <= score <= 100)
+        self.assertEqual(score, self.service.calculate_user_score(self.user))
+
+        # Rejected claims and failed payments make the user riskier
+        create_claim(self.user, self.policy, status=Claim.ClaimStatus.REJECTED)
+        Payment.objects.create(user=self.user, payment_type='premium', amount=5000,
+                               payment_gateway='mock', status='failed')
+        self.assertGreater(self.service.calculate_user_score(self.user), score)
 
     def test_calculate_policy_score(self):
         score = self.service.calculate_policy_score(self.policy)
-        self.assertTrue(25 <= score <= 75)
+        self.assertTrue(0 <= score <= 100)
+        user_score = self.service.calculate_user_score(self.user)
+        result = self.service.score_policies([self.policy])[self.policy.id]
+        self.assertEqual(result['components']['user'], user_score)
+        # 45,000 claimed against 5,000,000 cover
+        self.assertAlmostEqual(result['components']['claims_exposure'], 0.9)
+
+
+class UserFeatureServiceTests(TestCase):
+    FIELDS = [
+        'claim_count', 'claims_by_status', 'claims_by_type', 'total_claimed_amount', 'total_paid_amount',
+        'last_claim_at', 'policy_count', 'first_policy_start', 'payments_completed', 'payments_failed'
+    ]
+
+    def setUp(self):
+        self.user = create_user()
+        self.policy = create_policy(self.user, start_date=date.today() - timedelta(days=100))
+
+    def features(self):
+        return UserRiskFeatures.objects.get(user=self.user)
+
+    def test_claim_transitions_update_features_and_user_counters(self):
+        rejected = create_claim(self.user, self.policy, claimed_amount=10000)
+        paid = create_claim(self.user, self.policy, claim_type='theft', claimed_amount=30000)
+        create_claim(self.user, self.policy)
+
+        rejected.status = Claim.ClaimStatus.REJECTED
+        rejected.save()
+        paid.status = Claim.ClaimStatus.PAID
+        paid.approved_amount = 25000
+        paid.save()
+
+        features = self.features()
+        self.assertEqual(features.claim_count, 3)
+        self.assertEqual(features.claims_by_status, {'draft': 1, 'rejected': 1, 'paid': 1})
+        self.assertEqual(features.claims_by_type, {'accident': 2, 'theft': 1})
+        self.assertEqual(features.total_claimed_amount, Decimal('85000'))
+        self.assertEqual(features.total_paid_amount, Decimal('25000'))
+        self.assertEqual(features.days_since_last_claim, 0)
+
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.user.total_claims, self.user.approved_claims, self.user.rejected_claims), (3, 1, 1)
+        )
+
+        paid.delete()
+        features = self.features()
+        self.assertEqual(features.claims_by_status, {'draft': 1, 'rejected': 1})
+        self.assertEqual(features.total_paid_amount, 0)
+
+    def test_payments_and_policy_tenure(self):
+        for status_value in ['completed', 'completed', 'failed', 'pending']:
+            Payment.objects.create(user=self.user, payment_type='premium', amount=5000,
+                                   payment_gateway='mock', status=status_value)
+
+        features = self.features()
+        self.assertEqual((features.payments_completed, features.payments_failed), (2, 1))
+        self.assertAlmostEqual(features.payment_failure_rate, 1 / 3)
+        self.assertEqual(features.policy_count, 1)
+        self.assertEqual(features.policy_tenure_days, 100)
+
+    def test_rebuild_matches_incremental_state(self):
+        claim = create_claim(self.user, self.policy)
+        claim.status = Claim.ClaimStatus.PAID
+        claim.save()
+        Payment.objects.create(user=self.user, payment_type='claim', amount=5000,
+                               payment_gateway='mock', status='failed')
+        incremental = self.features()
+
+        UserRiskFeatures.objects.all().delete()
+        call_command('rebuild_user_features', stdout=io.StringIO())
+        rebuilt = self.features()
+        for field in self.FIELDS:
+            self.assertEqual(getattr(rebuilt, field), getattr(incremental, field), field)
+
+    def test_scoring_history_reads_one_row_per_user(self):
+        create_claim(self.user, self.policy, status=Claim.ClaimStatus.REJECTED)
+        with self.assertNumQueries(1):
+            history = SoroScoreService.user_history([self.user.id])
+        self.assertEqual(history, {self.user.id: (1, 1, 0.0)})
+
+
+class ScoreEventServiceTests(TestCase):
+    def setUp(self):
+        self.service = ScoreEventService()
+        self.user = create_user()
+        self.policy = create_policy(self.user)
+
+    def test_events_for_one_user_coalesce(self):
+        claim = create_claim(self.user, self.policy)
+        self.assertFalse(ScoreRecomputeRequest.objects.exists())
+
+        claim.status = Claim.ClaimStatus.REJECTED
+        claim.save()
+        Payment.objects.create(user=self.user, payment_type='premium', amount=5000,
+                               payment_gateway='mock', status='failed')
+        self.policy.status = Policy.PolicyStatus.CANCELLED
+        self.policy.save()
+
+        request = ScoreRecomputeRequest.objects.get()
+        self.assertEqual(request.user, self.user)
+        self.assertEqual(request.event_count, 3)
+        self.assertEqual(request.reasons, ['claim_decided', 'payment_failed', 'policy_lapsed'])
+
+    @override_settings(SCORE_RECOMPUTE_COALESCE_SECONDS=60)
+    def test_process_due_rescores_users_and_policies_in_batches(self):
+        other = create_user(phone_number='+2348000000001')
+        other_policy = create_policy(other)
+        for user, policy in [(self.user, self.policy), (other, other_policy)]:
+            create_claim(user, policy, status=Claim.ClaimStatus.REJECTED)
+
+        self.assertEqual(self.service.process_due(), 0)  # still inside the window
+
+        later = timezone.now() + timedelta(seconds=61)
+        self.assertEqual(self.service.process_due(batch_size=1, now=later), 1)
+        self.assertEqual(self.service.process_due(batch_size=10, now=later), 1)
+        self.assertFalse(ScoreRecomputeRequest.objects.exists())
+
+        soro_service = SoroScoreService()
+        self.user.refresh_from_db()
+        self.policy.refresh_from_db()
+        self.assertEqual(self.user.soro_score, soro_service.calculate_user_score(self.user))
+        self.assertEqual(self.policy.current_soro_score, soro_service.calculate_policy_score(self.policy))
+
+        logs = SoroScoreLog.objects.filter(user=self.user)
+        self.assertEqual(logs.count(), 2)  # the user and their active policy
+        user_log = logs.get(policy__isnull=True)
+        self.assertEqual(user_log.final_soro_score, self.user.soro_score)
+        self.assertEqual(user_log.calculation_metadata['previous_score'], 50.0)
+        self.assertEqual(user_log.calculation_metadata['reasons'], ['claim_decided'])
+
+    @override_settings(SCORE_RECOMPUTE_COALESCE_SECONDS=0)
+    def test_process_score_events_command(self):
+        create_claim(self.user, self.policy, status=Claim.ClaimStatus.APPROVED)
+        out = io.StringIO()
+        call_command('process_score_events', '--once', stdout=out)
+        self.assertIn('Rescored 1 user(s)', out.getvalue())
+        self.assertFalse(ScoreRecomputeRequest.objects.exists())
+
+
+class ScoringModelServiceTests(TestCase):
+    def setUp(self):
+        self.service = ScoringModelService()
+        self.user = create_user()
+        self.policy = create_policy(self.user)
+        self.claims = [
+            create_claim(self.user, self.policy, claimed_amount=amount, photos=['a.jpg'] * photos,
+                         transcript='recorded account', transcript_confidence=0.9, keywords=['accident'])
+            for amount, photos in [(20000, 3), (45000, 1), (90000, 0)]
+        ]
+        reload_scoring_models()
+        self.addCleanup(reload_scoring_models)
+
+    def live_score(self, claim):
+        result = SoroScoreService().calculate_claim_score(claim)
+        ClaimProcessingService.score_log(claim, result).save()
+        return result
+
+    def test_live_version_replaces_settings_and_hot_reloads(self):
+        self.assertEqual(self.live_score(self.claims[0])['model_version'], 'settings')
+
+        self.service.create_version('v2', {'historical': 1.0}, auto_approve_max_score=10)
+        self.service.promote('v2')
+        result = self.live_score(self.claims[0])
+        self.assertEqual(result['model_version'], 'v2')
+        self.assertEqual(result['soro_score'], result['components']['historical'])
+
+        # Edits that bypass save() are picked up on the next reload
+        with override_settings(SCORING_MODEL_RELOAD_SECONDS=3600):
+            ScoringModelVersion.objects.filter(version='v2').update(weights={'urgency': 1.0})
+            self.assertEqual(live_scoring_model().weights, {'historical': 1.0})
+            reload_scoring_models()
+            self.assertEqual(live_scoring_model().weights, {'urgency': 1.0})
+
+        self.service.create_version('v3', {'inconsistency': 1.0})
+        self.service.promote('v3')
+        self.assertEqual(ScoringModelVersion.objects.get(version='v2').status, 'retired')
+
+    def test_shadow_version_scores_alongside_live_and_compares(self):
+        self.live_score(self.claims[0])  # before the shadow started; not re-scored
+        self.service.create_version('candidate', {'inconsistency': 0.5, 'media_integrity': 0.5},
+                                    auto_approve_max_score=60)
+        self.service.start_shadow('candidate')
+        live_results = [self.live_score(claim) for claim in self.claims]
+
+        self.assertEqual(self.service.run_shadow(), 3)
+        self.assertEqual(self.service.run_shadow(), 0)
+
+        shadow_logs = SoroScoreLog.objects.filter(is_shadow=True).select_related('shadow_of')
+        self.assertEqual(shadow_logs.count(), 3)
+        for log in shadow_logs:
+            self.assertEqual(log.model_version, 'candidate')
+            self.assertEqual(log.claim_id, log.shadow_of.claim_id)
+            self.assertEqual(log.shadow_of.model_version, 'settings')
+
+        report = self.service.compare('candidate')
+        self.assertEqual(report['claims'], 3)
+        self.assertEqual(report['live_versions'], ['settings'])
+        live_approvals = sum(result['auto_approval_recommended'] for result in live_results)
+        self.assertEqual(report['live_approval_rate'], round(live_approvals / 3, 4))
+        self.assertGreater(report['shadow_approval_rate'], 0)
+
+        out = io.StringIO()
+        call_command('scoring_models', 'compare', 'candidate', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['claims'], 3)
+
+    def test_invalid_versions_rejected(self):
+        with self.assertRaises(ValueError):
+            self.service.create_version('bad', {'luck': 1.0})
+        with self.assertRaises(ValueError):
+            self.service.create_version('zero', {'urgency': 0})
+        with self.assertRaisesMessage(CommandError, 'Unknown scoring model'):
+            call_command('scoring_models', 'promote', 'missing')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ScoreLogServiceTests(TestCase):
+    def setUp(self):
+        self.service = ScoreLogService()
+        self.user = create_user()
+        self.claim = create_claim(self.user)
+
+    def log_claim(self, calculated_at, **kwargs):
+        result = SoroScoreService().calculate_claim_score(self.claim)
+        log = ClaimProcessingService.score_log(self.claim, result)
+        for field, value in kwargs.items():
+            setattr(log, field, value)
+        log.save()
+        SoroScoreLog.objects.filter(id=log.id).update(calculated_at=calculated_at)
+        return log, result
+
+    def test_logs_are_compact_and_legacy_entries_compacted(self):
+        log, result = self.log_claim(timezone.now())
+        log.refresh_from_db()
+        self.assertNotIn('components', log.calculation_metadata)
+        self.assertEqual(log.calculation_metadata['flags'], result['flags'])
+        self.assertEqual(set(SoroScoreLogSerializer(log).data['features']), set(result['features']))
+
+        legacy, _ = self.log_claim(timezone.now(), features=None, calculation_metadata=result)
+        self.assertEqual(self.service.compact(), 1)
+        legacy.refresh_from_db()
+        self.assertEqual(bytes(legacy.features), bytes(log.features))
+        self.assertEqual(legacy.calculation_metadata, log.calculation_metadata)
+
+    def test_archive_moves_old_entries_to_monthly_files(self):
+        now = timezone.now()
+        old, _ = self.log_claim(now - timedelta(days=400))
+        self.log_claim(now - timedelta(days=370))
+        # A shadow entry scored after the cutoff leaves with the entry it shadows
+        self.log_claim(now - timedelta(days=10), is_shadow=True, shadow_of=old, model_version='candidate')
+        recent, _ = self.log_claim(now - timedelta(days=1))
+
+        out = io.StringIO()
+        call_command('archive_score_logs', chunk_size=1, stdout=out)
+        self.assertIn('Archived 3 entries', out.getvalue())
+        self.assertEqual(list(SoroScoreLog.objects.values_list('id', flat=True)), [recent.id])
+        self.assertEqual(SoroScoreLogArchive.objects.count(), 3)
+
+        self.assertEqual([row['id'] for row in self.service.history(claim_id=self.claim.id)], [recent.id])
+        history = self.service.history(claim_id=self.claim.id, include_archived=True)
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history[0]['id'], old.id)
+        self.assertEqual(history[0]['features']['claimed_ratio'], 0.9)
+        start = (now - timedelta(days=380)).date().isoformat()
+        end = (now - timedelta(days=5)).date().isoformat()
+
+        client = APIClient()
+        client.force_authenticate(user=create_user(phone_number='+2348022222222', user_type='admin'))
+        response = client.get(reverse('admin-score-logs'), {'user': self.user.id, 'start': start, 'end': end,
+                                                            'archived': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(client.get(reverse('admin-score-logs')).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_archived_lookups_open_only_files_holding_the_claim(self):
+        now = timezone.now()
+        self.log_claim(now - timedelta(days=400))
+        other_claim, self.claim = self.claim, create_claim(create_user(phone_number='+2348011111111'))
+        self.log_claim(now - timedelta(days=370))
+        self.claim = other_claim
+        list(self.service.archive(now - timedelta(days=30)))
+        self.assertEqual(SoroScoreLogArchiveKey.objects.filter(claim_id=self.claim.id).count(), 1)
+
+        with patch.object(ScoreLogService, 'read_archive', wraps=ScoreLogService.read_archive) as mock_read:
+            history = self.service.history(claim_id=self.claim.id, include_archived=True)
+        self.assertEqual([row['claim_id'] for row in history], [self.claim.id])
+        self.assertEqual(mock_read.call_count, 1)
+
+        # Archives from before keys were recorded are read until they are indexed
+        SoroScoreLogArchiveKey.objects.all().delete()
+        with patch.object(ScoreLogService, 'read_archive', wraps=ScoreLogService.read_archive) as mock_read:
+            self.assertEqual(len(self.service.history(claim_id=self.claim.id, include_archived=True)), 1)
+        self.assertEqual(mock_read.call_count, 2)
+        self.assertEqual(self.service.index_archives(), 2)
+        self.assertEqual(SoroScoreLogArchiveKey.objects.count(), 2)
+
+
+class ScoreExplanationServiceTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.claim = create_claim(self.user, claimed_amount=80000, estimated_loss=50000,
+                                  transcript='Okada hit my car', transcript_confidence=0.9)
+        self.client = APIClient()
+        self.client.force_authenticate(user=create_user(phone_number='+2348022222222', user_type='admin'))
+        reload_scoring_models()
+        self.addCleanup(reload_scoring_models)
+
+    @patch('api.services.voice_processing_service.VoiceProcessingService.process_voice_claim')
+    def test_processing_caches_explanation_for_endpoint(self, mock_process):
+        mock_process.return_value = {'success': True, 'transcript': 'Okada hit my car', 'confidence': 0.9}
+        self.claim.audio_file = SimpleUploadedFile('claim.wav', make_wav_bytes(1), content_type='audio/wav')
+        self.claim.save()
+        underwriting_result, _ = ClaimProcessingService().process_claim(self.claim)
+
+        cached = ClaimScoreExplanation.objects.get(claim=self.claim)
+        self.assertEqual(cached.explanation['soro_score'], underwriting_result['soro_score'])
+        with patch.object(ScoreExplanationService, 'store') as mock_store:
+            response = self.client.get(reverse('claim-explanation', args=[self.claim.id]))
+        mock_store.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['top_features'][0]['name'], 'claimed_ratio')
+        contributions = sum(component['contribution'] for component in response.data['components'])
+        self.assertAlmostEqual(contributions, response.data['soro_score'], places=2)
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('claim-explanation', args=[self.claim.id])).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+    def test_claim_or_model_changes_invalidate(self):
+        service = ScoreExplanationService()
+        first = service.get(self.claim.id)
+        self.assertIn('claimed_exceeds_estimate', first['flags'])
+
+        Claim.objects.filter(pk=self.claim.pk).update(claimed_amount=40000)  # not a change the cache sees
+        self.assertEqual(service.get(self.claim.id), first)
+        self.claim.refresh_from_db()
+        self.claim.save()
+        self.assertNotIn('claimed_exceeds_estimate', service.get(self.claim.id)['flags'])
+
+        ScoringModelService().create_version('v2', {'historical': 1.0})
+        ScoringModelService().promote('v2')
+        self.assertEqual(service.get(self.claim.id)['model_version'], 'v2')
+        self.assertIsNone(service.get(999999))
+
+
+class NarrativeSimilarityServiceTests(TestCase):
+    STORY = (
+        'I was riding my okada along the Third Mainland Bridge early in the morning when a '
+        'danfo bus swerved into my lane, hit the back wheel and threw me onto the road. '
+        'My leg was broken and the motorcycle was badly damaged.'
+    )
+
+    def setUp(self):
+        self.service = NarrativeSimilarityService()
+        self.user = create_user()
+        self.other_user = create_user(phone_number='+2348011111111')
+        self.original = create_claim(self.user, description=self.STORY)
+
+    def test_near_duplicate_narratives_found_across_users(self):
+        retold = self.STORY.replace('early in the morning', 'late at night')
+        copy = create_claim(self.other_user, description='Accident report', transcript=retold)
+        unrelated = create_claim(
+            self.other_user,
+            description='Thieves broke into my shop in Ikeja overnight and carried away the generator, '
+                        'two freezers and all the provisions stocked for the festive season.'
+        )
+        create_claim(self.other_user, description='Bike accident')  # too short to index
+
+        self.assertEqual(ClaimNarrativeSignature.objects.count(), 3)
+        matches = self.service.matches([self.original.id, unrelated.id])
+        self.assertEqual([claim_id for claim_id, _ in matches[self.original.id]], [copy.id])
+        self.assertGreaterEqual(matches[self.original.id][0][1], 0.6)
+        self.assertEqual(matches[unrelated.id], [])
+
+        similar = self.service.similar_claims(copy)
+        self.assertEqual(similar[0]['claim_number'], str(self.original.claim_number))
+        self.assertEqual(similar[0]['user_id'], self.user.id)
+
+    def test_transcript_change_reindexes(self):
+        copy = create_claim(self.other_user, description='Accident report')
+        self.assertEqual(self.service.max_similarities([self.original.id]), {self.original.id: 0.0})
+
+        copy.transcript = self.STORY
+        copy.save()
+        self.assertGreater(self.service.max_similarities([self.original.id])[self.original.id], 0.6)
+
+    def test_similarity_feeds_claim_score_and_endpoint(self):
+        copy = create_claim(self.other_user, description=self.STORY)
+        result = SoroScoreService().calculate_claim_score(copy)
+        self.assertEqual(result['features']['narrative_similarity'], 1.0)
+        self.assertIn('similar_narrative', result['flags'])
+
+        client = APIClient()
+        url = reverse('claim-similar', args=[copy.id])
+        client.force_authenticate(user=create_user(phone_number='+2348022222222', user_type='admin'))
+        response = client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['matches'][0]['claim_id'], self.original.id)
+
+        client.force_authenticate(user=self.other_user)
+        self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+def make_photo(seed, size=256, taken_at=None, quality=90):
+    """JPEG bytes of a random blocky image, optionally with an EXIF capture time"""
+    blocks = np.random.default_rng(seed).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    image = Image.fromarray(blocks).resize((size, size), Image.BILINEAR)
+    exif = Image.Exif()
+    if taken_at:
+        exif[306] = taken_at.strftime('%Y:%m:%d %H:%M:%S')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, exif=exif)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PhotoHashServiceTests(TestCase):
+    def setUp(self):
+        self.service = PhotoHashService()
+        self.user = create_user()
+        self.other_user = create_user(phone_number='+2348011111111')
+        self.recent = timezone.now() - timedelta(days=1)
+
+    def save_photo(self, name, content):
+        return settings.MEDIA_URL + default_storage.save(f'claim_photos/{name}', ContentFile(content))
+
+    def submit(self, user, photos, **kwargs):
+        claim = create_claim(user, photos=photos, status=Claim.ClaimStatus.SUBMITTED, **kwargs)
+        self.service.index_pending()
+        return claim
+
+    def test_reused_photo_found_on_another_claim(self):
+        original = self.submit(self.user, [self.save_photo('a.jpg', make_photo(1, taken_at=self.recent))])
+        # The same picture resized and recompressed, next to an unrelated one
+        reused = self.submit(self.other_user, [
+            self.save_photo('b.jpg', make_photo(1, size=180, quality=60, taken_at=self.recent)),
+            self.save_photo('c.jpg', make_photo(2, taken_at=self.recent)),
+        ])
+
+        matches = self.service.duplicate_photos(reused)
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0]['matched_claim_id'], original.id)
+        self.assertLessEqual(matches[0]['distance'], settings.PHOTO_HASH_MAX_DISTANCE)
+
+        result = SoroScoreService().calculate_claim_score(reused)
+        self.assertEqual(result['features']['reused_photo_ratio'], 0.5)
+        self.assertIn('reused_photos', result['flags'])
+        clean = SoroScoreService().calculate_claim_score(
+            self.submit(self.other_user, [self.save_photo('d.jpg', make_photo(3, taken_at=self.recent))])
+        )
+        self.assertNotIn('reused_photos', clean['flags'])
+        self.assertGreater(result['components']['media_integrity'], clean['components']['media_integrity'])
+
+    def test_capture_times_and_unreadable_photos(self):
+        claim = self.submit(self.user, [
+            self.save_photo('old.jpg', make_photo(4, taken_at=timezone.now() - timedelta(days=400))),
+            self.save_photo('plain.jpg', make_photo(5)),
+            '/media/claim_photos/missing.jpg',
+        ])
+        rows = list(ClaimPhotoHash.objects.filter(claim=claim).order_by('position'))
+        self.assertEqual([row.status for row in rows], ['hashed', 'hashed', 'unreadable'])
+        self.assertIsNotNone(rows[0].taken_at)
+        self.assertIsNone(rows[1].taken_at)
+
+        features = SoroScoreService().calculate_claim_score(claim)['features']
+        self.assertAlmostEqual(features['misdated_photo_ratio'], 1 / 3)
+        self.assertAlmostEqual(features['unverified_photo_ratio'], 2 / 3)
+
+    def test_photos_indexed_on_submission_and_endpoint(self):
+        photo = self.save_photo('a.jpg', make_photo(6))
+        draft = create_claim(self.user, photos=[photo])
+        self.assertFalse(ClaimPhotoHash.objects.exists())
+        draft.status = Claim.ClaimStatus.SUBMITTED
+        draft.save()
+        # Submitting only queues the photos; hashing happens off the request path
+        self.assertEqual(list(ClaimPhotoHash.objects.filter(claim=draft).values_list('status', flat=True)), ['pending'])
+        self.assertEqual(self.service.index_pending(), 1)
+        self.assertEqual(list(ClaimPhotoHash.objects.filter(claim=draft).values_list('status', flat=True)), ['hashed'])
+
+        copy = self.submit(self.other_user, [photo])
+        client = APIClient()
+        url = reverse('claim-duplicate-photos', args=[copy.id])
+        client.force_authenticate(user=create_user(phone_number='+2348022222222', user_type='admin'))
+        response = client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['matches'][0]['distance'], 0)
+
+        client.force_authenticate(user=self.other_user)
+        self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def hashed_row(self, user, phash):
+        blocks = dict(zip(['hash_block_0', 'hash_block_1', 'hash_block_2', 'hash_block_3'], hash_blocks(phash)))
+        claim = create_claim(user, status=Claim.ClaimStatus.SUBMITTED)
+        return ClaimPhotoHash.objects.create(claim=claim, position=0, photo='x.jpg', status='hashed',
+                                             phash=phash, **blocks)
+
+    def test_large_batches_probe_in_chunks(self):
+        rng = np.random.default_rng(0)
+        rows = [self.hashed_row(self.user, int(rng.integers(0, 1 << 63))) for _ in range(30)]
+        # The first photo again on another claim, one bit off
+        copy = self.hashed_row(self.other_user, rows[0].phash ^ 1)
+        # 30 photos probe up to 510 values per block: two queries per block
+        with self.assertNumQueries(8):
+            matches = self.service.find_matches(rows)
+        self.assertEqual([(other.id, distance) for other, distance in matches[rows[0].id]], [(copy.id, 1)])
+
+    @override_settings(PHOTO_FETCH_HOSTS=['photos.example-cdn.com'])
+    @patch('api.services.photo_hash_service.requests.get')
+    def test_remote_photos_only_fetched_from_allowed_hosts(self, mock_get):
+        mock_get.return_value.__enter__.return_value.is_redirect = False
+        mock_get.return_value.__enter__.return_value.raw.read.return_value = make_photo(10)
+        self.assertIn('phash', self.service.analyze_photo('https://photos.example-cdn.com/a.jpg'))
+
+        for photo in ['http://169.254.169.254/latest/meta-data/', 'http://localhost:8000/admin/',
+                      '/media/../../etc/passwd']:
+            self.assertIn('error', self.service.analyze_photo(photo))
+        mock_get.assert_called_once()
+        self.assertFalse(mock_get.call_args.kwargs['allow_redirects'])
+
+    def test_photos_queued_again_while_hashing_are_left_pending(self):
+        claim = create_claim(self.user, photos=[self.save_photo('a.jpg', make_photo(7))],
+                             status=Claim.ClaimStatus.SUBMITTED)
+        stale = set(ClaimPhotoHash.objects.filter(claim=claim).values_list('id', flat=True))
+        claim.photos = [self.save_photo('b.jpg', make_photo(8)), self.save_photo('c.jpg', make_photo(9))]
+        claim.save()
+
+        self.assertIsNone(self.service.index_claim(claim, queued_ids=stale))
+        self.assertEqual(ClaimPhotoHash.objects.filter(claim=claim, status='pending').count(), 2)
+        self.assertEqual(self.service.index_pending(), 1)
+        self.assertEqual(ClaimPhotoHash.objects.filter(claim=claim, status='hashed').count(), 2)
+
+
+def make_speech_like(seed, seconds=12, sample_rate=16000):
+    """int16 samples of voiced syllables: gliding harmonic tones under a Hann envelope, with light noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = np.zeros_like(t)
+    start = 0.0
+    while start < seconds:
+        length = rng.uniform(0.1, 0.4)
+        syllable = (t >= start) & (t < start + length)
+        local = t[syllable] - start
+        envelope = np.hanning(syllable.sum())
+        f0, glide = rng.uniform(100, 250), rng.uniform(-0.3, 0.3)
+        for harmonic in range(1, 12):
+            phase = 2 * np.pi * f0 * harmonic * local * (1 + glide * local) + rng.uniform(0, 2 * np.pi)
+            signal[syllable] += envelope * rng.uniform(0.1, 1) / harmonic * np.sin(phase)
+        start += length + rng.uniform(0.02, 0.3)
+    signal = signal / np.abs(signal).max() * 12000 + rng.normal(0, 100, len(t))
+    return signal.astype(np.int16)
+
+
+def wav_bytes(samples, sample_rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+class AudioFingerprintServiceTests(TestCase):
+    def setUp(self):
+        self.service = AudioFingerprintService()
+        self.fingerprinter = AudioFingerprinter()
+        self.user = create_user()
+        self.other_user = create_user(phone_number='+2348011111111')
+        self.recording = make_speech_like(1)
+        # Replayed quieter over background noise, starting 0.43 s in
+        noise = np.random.default_rng(2).normal(0, 150, len(self.recording) - 6880)
+        self.replay = (self.recording[6880:] * 0.5 + noise).astype(np.int16)
+
+    def test_replayed_recording_matches_original(self):
+        original = create_claim(self.user)
+        self.assertEqual(self.service.index_claim(original, self.fingerprinter.fingerprint(self.recording)), [])
+        unrelated = create_claim(self.other_user)
+        self.assertEqual(self.service.index_claim(unrelated, self.fingerprinter.fingerprint(make_speech_like(3))), [])
+
+        replayed = create_claim(self.other_user)
+        matches = self.service.index_claim(replayed, self.fingerprinter.fingerprint(self.replay))
+        self.assertEqual([match['claim_id'] for match in matches], [original.id])
+        self.assertGreater(matches[0]['score'], 0.3)
+        self.assertAlmostEqual(matches[0]['offset_seconds'], 0.43, delta=0.05)
+
+        result = SoroScoreService().calculate_claim_score(replayed)
+        self.assertEqual(result['features']['recycled_audio_score'], matches[0]['score'])
+        self.assertIn('recycled_audio', result['flags'])
+        self.assertNotIn('recycled_audio', SoroScoreService().calculate_claim_score(unrelated)['flags'])
+
+        client = APIClient()
+        client.force_authenticate(user=create_user(phone_number='+2348022222222', user_type='admin'))
+        response = client.get(reverse('claim-recycled-audio', args=[replayed.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['matches'][0]['claim_number'], str(original.claim_number))
+
+    def test_only_claims_sharing_most_landmarks_are_aligned(self):
+        landmarks, frames = self.fingerprinter.fingerprint(self.recording)
+        original = create_claim(self.user)
+        self.service.index_claim(original, (landmarks, frames))
+        # An excerpt of the same recording shares fewer landmarks
+        excerpt = create_claim(self.user)
+        self.service.index_claim(excerpt, (landmarks[frames < frames.max() // 2], frames[frames < frames.max() // 2]))
+
+        replay = self.fingerprinter.fingerprint(self.replay)
+        self.assertEqual({match['claim_id'] for match in self.service.find_matches(*replay)}, {original.id, excerpt.id})
+        with override_settings(AUDIO_FINGERPRINT_MAX_CANDIDATES=1):
+            self.assertEqual([match['claim_id'] for match in self.service.find_matches(*replay)], [original.id])
+
+    @patch('api.services.voice_processing_service.VoiceProcessingService.process_voice_claim')
+    def test_processing_flags_recycled_audio(self, mock_process):
+        mock_process.return_value = {'success': True, 'transcript': 'My car was stolen', 'confidence': 0.9}
+        first = create_claim(self.user, audio_file=SimpleUploadedFile(
+            'first.wav', wav_bytes(self.recording), content_type='audio/wav'))
+        second = create_claim(self.other_user, audio_file=SimpleUploadedFile(
+            'second.wav', wav_bytes(self.replay), content_type='audio/wav'))
+
+        service = ClaimProcessingService()
+        first_result, _ = service.process_claim(first)
+        second_result, _ = service.process_claim(second)
+
+        self.assertNotIn('recycled_audio', first_result['flags'])
+        self.assertIn('recycled_audio', second_result['flags'])
+        self.assertEqual(second_result['recycled_audio_claims'][0]['claim_id'], first.id)
+        self.assertEqual(VoiceAnalysis.objects.get(claim=second).flags, ['recycled_audio'])
+        self.assertGreater(ClaimAudioFingerprint.objects.get(claim=first).landmark_count, 0)
+
+    @patch('api.services.voice_processing_service.VoiceProcessingService.fingerprint')
+    @patch('api.services.voice_processing_service.VoiceProcessingService.process_voice_claim')
+    def test_cache_hits_reuse_indexed_fingerprints(self, mock_process, mock_fingerprint):
+        mock_process.return_value = {'success': True, 'transcript': 'My car was stolen', 'confidence': 0.9,
+                                     'fingerprint': self.fingerprinter.fingerprint(self.recording)}
+        first = create_claim(self.user, audio_file=SimpleUploadedFile(
+            'first.wav', wav_bytes(self.recording), content_type='audio/wav'))
+        resubmitted = create_claim(self.other_user, audio_file=SimpleUploadedFile(
+            'again.wav', wav_bytes(self.recording), content_type='audio/wav'))
+
+        service = ClaimProcessingService()
+        service.process_claim(first)
+        # Reprocessing the same claim and a byte-identical upload are both cache hits
+        self.assertEqual(service.process_claim(first)[0].get('recycled_audio_claims', []), [])
+        result, _ = service.process_claim(resubmitted)
+        mock_process.assert_called_once()
+        mock_fingerprint.assert_not_called()
+
+        self.assertEqual(result['recycled_audio_claims'][0]['claim_id'], first.id)
+        self.assertEqual(
+            ClaimAudioFingerprint.objects.get(claim=resubmitted).landmark_count,
+            ClaimAudioFingerprint.objects.get(claim=first).landmark_count
+        )
+
+
+class FraudRingServiceTests(TestCase):
+    def setUp(self):
+        self.service = FraudRingService()
+        self.users = [create_user(phone_number=f'+23480000000{i:02d}') for i in range(4)]
+
+    def set_identifiers(self, user, **fields):
+        for field, value in fields.items():
+            setattr(user, field, value)
+        user.save()
+
+    def test_shared_identifiers_link_users_into_rings(self):
+        a, b, c, d = self.users
+        self.set_identifiers(a, bank_account_number='0123456789')
+        self.set_identifiers(b, bank_account_number='0123456789', whatsapp_number='+234 803 555 0101')
+        self.set_identifiers(c, whatsapp_number='08035550101')
+
+        self.assertEqual(self.service.ring_sizes([a.id, b.id, c.id, d.id]), {a.id: 3, b.id: 3, c.id: 3, d.id: 1})
+        self.assertEqual(sorted(self.service.members(c.id)), [a.id, b.id, c.id])
+
+        # b's new WhatsApp number leaves c on their own
+        self.set_identifiers(b, whatsapp_number='08035550202')
+        self.assertEqual(self.service.ring_sizes([a.id, b.id, c.id]), {a.id: 2, b.id: 2, c.id: 1})
+
+        # A claim filed from c's device by d links them through the claim
+        create_claim(c, device_id='android-7f3a')
+        claim = create_claim(d, device_id='ANDROID-7F3A')
+        self.assertEqual(self.service.ring_sizes([c.id, d.id]), {c.id: 2, d.id: 2})
+        claim.delete()
+        self.assertEqual(self.service.ring_sizes([c.id]), {c.id: 1})
+
+    def test_scoring_and_admin_see_the_ring(self):
+        a, b, c, _ = self.users
+        location = '14 Allen Avenue, Ikeja'
+        create_claim(a, incident_location=location)
+        create_claim(b, incident_location=location.upper())
+        claim = create_claim(c, incident_location='Lagos, Nigeria')
+
+        result = SoroScoreService().calculate_claim_score(Claim.objects.filter(user=a).first())
+        self.assertEqual(result['features']['linked_users'], 1)
+        self.assertIn('fraud_ring', result['flags'])
+        # City-level locations link no one
+        self.assertNotIn('fraud_ring', SoroScoreService().calculate_claim_score(claim)['flags'])
+
+        client = APIClient()
+        client.force_authenticate(user=create_user(phone_number='+2348099999999', user_type='admin'))
+        response = client.get(reverse('admin-fraud-ring', args=[b.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['ring_size'], 2)
+        self.assertEqual([member['id'] for member in response.data['members']], [a.id, b.id])
+        self.assertEqual(response.data['shared_identifiers'][0]['kind'], IdentifierLink.Kind.INCIDENT_LOCATION)
+        client.force_authenticate(user=a)
+        self.assertEqual(client.get(reverse('admin-fraud-ring', args=[b.id])).status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(FRAUD_RING_MAX_SHARED_USERS=2)
+    def test_common_values_do_not_link_and_rebuild_matches(self):
+        a, b, c, d = self.users
+        self.set_identifiers(a, bvn='22212345678', bank_account_number='1111111111')
+        self.set_identifiers(b, bvn='22212345678')
+        self.set_identifiers(d, bank_account_number='1111111111')
+        self.assertEqual(self.service.ring_sizes([a.id]), {a.id: 3})
+
+        # A third holder makes the BVN too common to count
+        self.set_identifiers(c, bvn='22212345678')
+        self.assertEqual(self.service.ring_sizes([a.id, b.id, c.id, d.id]), {a.id: 2, b.id: 1, c.id: 1, d.id: 2})
+        sizes = self.service.ring_sizes([a.id, b.id, c.id, d.id])
+
+        FraudRingNode.objects.all().delete()
+        IdentifierLink.objects.all().delete()
+        call_command('rebuild_fraud_rings', stdout=io.StringIO())
+        self.assertEqual(self.service.ring_sizes([a.id, b.id, c.id, d.id]), sizes)
+
+        # Deleting a user breaks the links through them
+        a.delete()
+        self.assertEqual(self.service.ring_sizes([d.id]), {d.id: 1})
 
 
 class VoiceProcessingServiceTests(TestCase):
     def setUp(self):
         self.service = VoiceProcessingService()
 
-    @patch('api.services.voice_processing_service.AudioSegment.from_file')
-    def test_process_voice_claim(self, mock_from_file):
-        # Create a dummy audio file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
-            f.write(b'RIFF....fakewavdata')
-            temp_path = f.name
-
-        # Mock AudioSegment
-        mock_audio = MagicMock()
-        mock_audio.__len__.return_value = 10000  # 10 seconds in ms
-        mock_audio.dBFS = -15
-        mock_audio.get_array_of_samples.return_value = [0] * 100
-        mock_from_file.return_value = mock_audio
+    @patch('api.services.voice_processing_service.VoiceProcessingService._decode_audio')
+    def test_process_voice_claim(self, mock_decode_audio):
+        # 10 seconds of silence at 16 kHz
+        mock_decode_audio.return_value = DecodedAudio(np.zeros(160000, dtype=np.int16))
 
         # Mock _transcribe_audio directly to ensure a successful transcript
         with patch('api.services.voice_processing_service.VoiceProcessingService._transcribe_audio') as mock_transcribe_audio:
             mock_transcribe_audio.return_value = {'text': "I had an accident in Lagos", 'confidence': 0.9, 'engine': 'google'}
 
-            result = self.service.process_voice_claim(temp_path)
+            result = self.service.process_voice_claim('/tmp/claim.wav')
             self.assertTrue(result['success'])
             self.assertEqual(result['transcript'], "I had an accident in Lagos")
+            self.assertEqual(result['duration'], 10)
             self.assertIn('keywords', result)
             self.assertIn('sentiment_score', result)
+            self.assertEqual(result['audio_features']['speech_ratio'], 0)
+
+    def test_decode_wav_to_16k_mono(self):
+        # One second of 44.1 kHz stereo tone
+        t = np.arange(44100) / 44100
+        tone = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
+            temp_path = f.name
+        with wave.open(temp_path, 'wb') as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(44100)
+            wav.writeframes(np.repeat(tone, 2).tobytes())
+
+        audio = self.service._decode_audio(temp_path)
+        self.assertEqual(audio.sample_rate, 16000)
+        self.assertEqual(audio.samples.dtype, np.int16)
+        self.assertAlmostEqual(audio.duration, 1.0, places=2)
+        self.assertEqual(audio.to_audio_data().sample_rate, 16000)
+
+
+
+class TextAnalysisServiceTests(TestCase):
+    def setUp(self):
+        self.service = TextAnalysisService()
 
     def test_extract_keywords(self):
         text = "I had a terrible accident with my car in Lagos yesterday"
-        keywords = self.service._extract_keywords(text)
+        keywords = self.service.analyze(text)['keywords']
         self.assertIn('accident', keywords)
         self.assertIn('lagos', keywords)
 
+    def test_multi_word_terms_and_punctuation(self):
+        result = self.service.analyze("Okada crash near Port Harcourt. Area boys stole my phone!")
+        self.assertEqual(result['keywords'], ['okada', 'crash', 'port harcourt', 'area boys'])
+        self.assertEqual(result['word_count'], 10)
+
     def test_analyze_sentiment(self):
-        result = self.service._analyze_sentiment("I am very happy")
+        result = self.service.analyze("I am very happy")['sentiment']
         self.assertEqual(result['label'], 'positive')
-        result = self.service._analyze_sentiment("This is terrible")
+        result = self.service.analyze("This is terrible")['sentiment']
         self.assertEqual(result['label'], 'negative')
 
+    def test_term_in_several_lexicons(self):
+        result = self.service.analyze("The car was stolen and I am so angry and scared")
+        self.assertIn('stolen', result['keywords'])
+        self.assertEqual(result['sentiment']['scores']['negative'], 2)
+        self.assertEqual(result['emotion_scores']['anger'], 1)
+        self.assertEqual(result['emotion_scores']['fear'], 1)
+        self.assertEqual(result['emotion_scores']['joy'], 0)
+
+    def test_lexicon_loaded_from_data_file(self):
+        lexicons = {'keywords': {'custom': ['tanker explosion']}, 'emotions': {'fear': ['panic']}}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(lexicons, f)
+        service = TextAnalysisService(load_lexicon(f.name))
+        result = service.analyze("Tanker explosion, everyone in panic")
+        self.assertEqual(result['keywords'], ['tanker explosion'])
+        self.assertEqual(result['emotion_scores'], {'fear': 1})
+        self.assertNotEqual(service.lexicon.version, TextAnalysisService().lexicon.version)
+
+
+def make_tone_audio(pattern, sample_rate=16000):
+    """Build DecodedAudio from (seconds, is_tone) pairs"""
+    chunks = []
+    for seconds, is_tone in pattern:
+        t = np.arange(int(seconds * sample_rate)) / sample_rate
+        amplitude = 8000 if is_tone else 0
+        chunks.append((np.sin(2 * np.pi * 220 * t) * amplitude).astype(np.int16))
+    return DecodedAudio(np.concatenate(chunks), sample_rate)
+
+
+@override_settings(TRANSCRIPTION_SEGMENT_MAX_SECONDS=1.5)
+class TranscriptionServiceTests(TestCase):
+    def setUp(self):
+        self.service = TranscriptionService()
+
+    def test_detect_segments_splits_at_silence(self):
+        audio = make_tone_audio([(0.5, False), (1, True), (1, False), (1, True), (1, False), (1, True)])
+        segments = self.service.detect_segments(audio)
+        self.assertEqual(len(segments), 3)
+        starts = [start / 16000 for start, _ in segments]
+        self.assertAlmostEqual(starts[0], 0.4, delta=0.05)
+        self.assertAlmostEqual(starts[1], 2.4, delta=0.05)
+
+    def test_detect_segments_bounds_long_speech(self):
+        audio = make_tone_audio([(10, True)])
+        segments = self.service.detect_segments(audio)
+        self.assertGreater(len(segments), 1)
+        for start, end in segments:
+            self.assertLessEqual((end - start) / 16000, 1.5)
+        self.assertEqual(segments[0][0], 0)
+        self.assertEqual(segments[-1][1], len(audio.samples) // 480 * 480)
+
+    def test_silence_skips_recognizer(self):
+        engine = StubEngine(responses=['should not be used'])
+        result = TranscriptionService(engines=[engine]).transcribe(make_tone_audio([(3, False)]))
+        self.assertEqual(engine.calls, 0)
+        self.assertEqual(result['text'], '')
+
+    def test_transcribe_stitches_segments(self):
+        audio = make_tone_audio([(1, True), (1, False), (1, True), (1, False), (1, True)])
+        google = StubEngine(responses=['my car', sr.UnknownValueError(), 'was stolen'], name='google')
+        google.confidence = 0.9
+        sphinx = StubEngine(name='sphinx')
+
+        # Segments are submitted in order; a single worker keeps them in order
+        with patch('api.services.transcription_service._get_executor') as mock_executor:
+            mock_executor.return_value = ThreadPoolExecutor(max_workers=1)
+            result = TranscriptionService(engines=[google, sphinx]).transcribe(audio)
+
+        self.assertEqual(result['text'], 'my car was stolen')
+        self.assertEqual(len(result['segments']), 3)
+        self.assertEqual(result['segments'][1]['engine'], 'none')
+        self.assertEqual(sphinx.calls, 1)
+        self.assertEqual(result['engine'], 'google')
+        self.assertAlmostEqual(result['confidence'], 0.6, delta=0.05)
+
+
+@override_settings(TRANSCRIPTION_BREAKER_THRESHOLD=2, TRANSCRIPTION_BREAKER_COOLDOWN=60)
+class TranscriptionEngineTests(TestCase):
+    def setUp(self):
+        reset_engine_stats()
+        self.audio_data = sr.AudioData(b'\x00\x00' * 1600, 16000, 2)
+
+    def tearDown(self):
+        reset_engine_stats()
+
+    def test_deadline_bounds_slow_engine(self):
+        slow = StubEngine(deadline=0.05, responses=['too late'], delay=0.5, name='slow')
+        fallback = StubEngine(responses=['my phone was stolen'], name='fallback')
+
+        started = time.perf_counter()
+        text, engine = recognize_with_engines([slow, fallback], self.audio_data)
+        self.assertLess(time.perf_counter() - started, 0.4)
+        self.assertEqual((text, engine), ('my phone was stolen', fallback))
+        self.assertEqual(engine_stats()['slow']['timeouts'], 1)
+
+    def test_deadline_starts_when_the_engine_does(self):
+        engine = StubEngine(deadline=0.15, responses=['my phone was stolen'] * 6, delay=0.1, name='busy')
+        # Six segments at once on two engine threads: most wait longer than the deadline to start
+        with ThreadPoolExecutor(max_workers=2) as executor, \
+                patch.object(transcription_engines, '_engine_executor', executor), \
+                ThreadPoolExecutor(max_workers=6) as segments:
+            results = list(segments.map(lambda _: recognize_with_engines([engine], self.audio_data)[0], range(6)))
+        self.assertEqual(results, ['my phone was stolen'] * 6)
+        stats = engine_stats()['busy']
+        self.assertEqual((stats['state'], stats['timeouts'], stats['successes']), ('closed', 0, 6))
+
+    @override_settings(TRANSCRIPTION_QUEUE_TIMEOUT=0.05)
+    def test_call_that_never_starts_is_not_a_failure(self):
+        engine = StubEngine(responses=['first', 'second'], delay=0.3, name='online')
+        with ThreadPoolExecutor(max_workers=1) as executor, \
+                patch.object(transcription_engines, '_engine_executor', executor), \
+                ThreadPoolExecutor(max_workers=1) as segments:
+            # The only engine thread is taken by the first segment's call
+            first = segments.submit(recognize_with_engines, [engine], self.audio_data)
+            time.sleep(0.05)
+            self.assertEqual(recognize_with_engines([engine], self.audio_data), ('', None))
+            self.assertEqual(first.result()[0], 'first')
+        self.assertEqual(engine.calls, 1)
+        stats = engine_stats()['online']
+        self.assertEqual((stats['state'], stats['consecutive_failures'], stats['skipped']), ('closed', 0, 1))
+
+    def test_breaker_skips_failing_engine_then_recovers(self):
+        failing = StubEngine(responses=[sr.RequestError('unreachable')] * 2 + ['recovered'], name='online')
+        fallback = StubEngine(responses=['offline'] * 3, name='offline')
+
+        for _ in range(3):
+            self.assertEqual(recognize_with_engines([failing, fallback], self.audio_data)[0], 'offline')
+        self.assertEqual(failing.calls, 2)
+        stats = engine_stats()['online']
+        self.assertEqual((stats['state'], stats['errors'], stats['skipped']), ('open', 2, 1))
+
+        # After the cooldown a single trial call closes the circuit again
+        engine_health('online').open_until = time.monotonic()
+        self.assertEqual(recognize_with_engines([failing, fallback], self.audio_data)[0], 'recovered')
+        self.assertEqual(engine_stats()['online']['state'], 'closed')
+
+    def test_no_speech_is_not_a_failure(self):
+        quiet = StubEngine(name='quiet')
+        for _ in range(3):
+            self.assertEqual(recognize_with_engines([quiet], self.audio_data), ('', None))
+        stats = engine_stats()['quiet']
+        self.assertEqual((stats['state'], stats['no_speech']), ('closed', 3))
+
+    def test_build_engines_from_settings(self):
+        with override_settings(TRANSCRIPTION_ENGINES=['stub', 'sphinx']):
+            engines = build_engines()
+        self.assertEqual([engine.name for engine in engines], ['stub', 'sphinx'])
+        self.assertEqual(engines[1].deadline, 30)
+        with self.assertRaises(ValueError):
+            build_engines(['carrier-pigeon'])
+
+
+def mp4_box(box_type, body):
+    return struct.pack('>I4s', 8 + len(body), box_type) + body
+
+
+def ogg_page(serial, granule, payload):
+    header = b'OggS' + bytes([0, 0]) + struct.pack('<qIII', granule, serial, 0, 0)
+    return header + bytes([1, len(payload)]) + payload
+
+
+class AudioProbeServiceTests(TestCase):
+    def setUp(self):
+        self.service = AudioProbeService()
+
+    def test_probe_wav(self):
+        metadata = self.service.probe(io.BytesIO(make_wav_bytes(2.5, sample_rate=8000, channels=2)))
+        self.assertEqual(metadata, {
+            'format': 'wav', 'codec': 'pcm', 'duration': 2.5,
+            'channels': 2, 'sample_rate': 8000, 'bit_depth': 16
+        })
+
+    def test_probe_mp3_vbr_header(self):
+        # MPEG-1 layer III mono frame carrying a Xing header with 1000 frames
+        frame = b'\xff\xfb\x90\xc4' + b'\x00' * 17 + b'Xing' + struct.pack('>II', 1, 1000)
+        data = b'ID3\x03\x00\x00\x00\x00\x00\x0a' + b'\x00' * 10 + frame + b'\x00' * 4000
+        metadata = self.service.probe(io.BytesIO(data))
+        self.assertEqual((metadata['format'], metadata['channels'], metadata['sample_rate']), ('mp3', 1, 44100))
+        self.assertAlmostEqual(metadata['duration'], 1000 * 1152 / 44100, places=2)
+
+    def test_probe_ogg_opus(self):
+        head = b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, 48000, 0, 0)
+        data = ogg_page(9, 0, head) + ogg_page(9, 48000 * 4 + 312, b'\x00' * 20)
+        metadata = self.service.probe(io.BytesIO(data))
+        self.assertEqual((metadata['codec'], metadata['channels'], metadata['duration']), ('opus', 2, 4.0))
+
+    def test_probe_m4a_with_trailing_moov(self):
+        mdhd = mp4_box(b'mdhd', b'\x00' * 12 + struct.pack('>II', 44100, 44100 * 7) + b'\x00' * 4)
+        hdlr = mp4_box(b'hdlr', b'\x00' * 8 + b'soun' + b'\x00' * 12)
+        entry = mp4_box(b'mp4a', b'\x00' * 6 + b'\x00\x01' + b'\x00' * 8 + struct.pack('>HHHHI', 1, 16, 0, 0, 44100 << 16))
+        stsd = mp4_box(b'stsd', b'\x00' * 4 + struct.pack('>I', 1) + entry)
+        trak = mp4_box(b'trak', mp4_box(b'mdia', mdhd + hdlr + mp4_box(b'minf', mp4_box(b'stbl', stsd))))
+        data = mp4_box(b'ftyp', b'M4A \x00\x00\x00\x00') + mp4_box(b'mdat', b'\x00' * 50000) + mp4_box(b'moov', trak)
+        metadata = self.service.probe(io.BytesIO(data))
+        self.assertEqual((metadata['format'], metadata['codec'], metadata['duration']), ('m4a', 'mp4a', 7.0))
+        self.assertEqual((metadata['channels'], metadata['sample_rate']), (1, 44100))
+
+    def test_unknown_and_corrupt_content(self):
+        self.assertIsNone(self.service.probe(io.BytesIO(b'fake audio data')))
+        with self.assertRaises(AudioProbeError):
+            self.service.probe(io.BytesIO(make_wav_bytes(1)[:36]))
+
+    def test_read_position_restored(self):
+        f = io.BytesIO(make_wav_bytes(1))
+        f.seek(5)
+        self.service.probe(f)
+        self.assertEqual(f.tell(), 5)
+
+
+class TranscriptionWorkerTests(TestCase):
+    def tearDown(self):
+        transcription_worker._decoder = None
+
+    def test_decoder_loaded_once_per_worker(self):
+        decoder = MagicMock()
+        decoder.hyp.return_value.hypstr = 'my car was stolen'
+        with patch('api.transcription_worker.load_decoder', return_value=decoder) as mock_load:
+            transcription_worker.init_worker()
+            self.assertTrue(transcription_worker.ping()['ready'])
+            self.assertEqual(transcription_worker.transcribe(b'\x00\x00' * 16000), 'my car was stolen')
+            self.assertEqual(transcription_worker.transcribe(b'\x00\x00' * 16000), 'my car was stolen')
+        mock_load.assert_called_once()
+        self.assertEqual(decoder.start_utt.call_count, 2)
+
+    def test_unavailable_decoder_raises(self):
+        with patch('api.transcription_worker.load_decoder', side_effect=ImportError('no pocketsphinx')):
+            transcription_worker.init_worker()
+        self.assertFalse(transcription_worker.ping()['ready'])
+        with self.assertRaises(RuntimeError):
+            transcription_worker.transcribe(b'')
+
+    def test_sphinx_runs_in_process_without_the_pool(self):
+        decoder = MagicMock()
+        decoder.hyp.return_value.hypstr = 'my car was stolen'
+        audio = sr.AudioData(b'\x00\x00' * 16000, 16000, 2)
+        with patch('api.transcription_worker.load_decoder', return_value=decoder) as mock_load, \
+                patch.object(transcription_engines, '_local_sphinx_loaded', False), \
+                patch('api.services.transcription_engines.ProcessPoolExecutor') as mock_pool:
+            # Processes other than the voice worker never start the pool
+            self.assertIsNone(transcription_engines.get_sphinx_pool())
+            engine = SphinxEngine()
+            self.assertEqual(engine.run(audio), 'my car was stolen')
+            self.assertEqual(engine.run(audio), 'my car was stolen')
+        mock_load.assert_called_once()
+        mock_pool.assert_not_called()
+
+
+class AudioFeatureServiceTests(TestCase):
+    def setUp(self):
+        self.service = AudioFeatureService()
+
+    def test_pitch_of_harmonic_voice(self):
+        t = np.arange(32000) / 16000
+        for f0 in (100, 220):
+            voice = sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, 5)) * 5000
+            features = self.service.extract(DecodedAudio(voice.astype(np.int16), 16000))
+            self.assertAlmostEqual(features['pitch_mean'], f0, delta=f0 * 0.02)
+            self.assertLess(features['pitch_variance'], 0.1)
+
+    def test_unknown_source_format_keeps_probed_values(self):
+        samples = np.zeros(16000, dtype=np.int16)
+        self.assertEqual(self.service.extract(DecodedAudio(samples, source_sample_rate=44100))['sample_rate'], 44100)
+        # ffmpeg-decoded uploads only carry the 16 kHz decode rate
+        features = self.service.extract(DecodedAudio(samples, audio_format='mp3'))
+        self.assertIsNone(features['sample_rate'])
+        fields = ClaimProcessingService.voice_analysis_fields({'audio_features': features})
+        self.assertNotIn('sample_rate', fields)
+        self.assertEqual(fields['audio_format'], 'mp3')
+
+    def test_pauses_and_noise(self):
+        rng = np.random.default_rng(0)
+        audio = make_tone_audio([(1, True), (0.5, False), (1, True), (0.5, False), (1, True)])
+        audio.samples = (audio.samples + rng.normal(0, 30, len(audio.samples))).astype(np.int16)
+        features = self.service.extract(audio)
+
+        # Two pauses in four seconds
+        self.assertAlmostEqual(features['pause_frequency'], 30, delta=0.1)
+        self.assertAlmostEqual(features['speech_ratio'], 0.75, delta=0.03)
+        self.assertGreater(features['snr_db'], 30)
+        self.assertEqual(features['speech_clarity'], 1.0)
+        self.assertEqual(self.service.recording_quality(features), 'good')
+
+    def test_silence_has_no_speech_features(self):
+        features = self.service.extract(DecodedAudio(np.zeros(16000, dtype=np.int16), 16000))
+        self.assertEqual(features['speech_ratio'], 0)
+        self.assertIsNone(features['pitch_mean'])
+        self.assertEqual(self.service.recording_quality(features), 'poor')
+
+
+MOCK_UNDERWRITING_RESULT = {
+    'soro_score': 45.5,
+    'risk_level': 'medium',
+    'auto_approval_recommended': False,
+    'components': {
+        'inconsistency': 30, 'urgency': 40, 'sentiment': 50,
+        'media_integrity': 70, 'historical': 60,
+        'weighted_inconsistency': 3, 'weighted_urgency': 4,
+        'weighted_sentiment': 5, 'weighted_media': 7,
+        'weighted_historical': 6
+    },
+    'flags': []
+}
+
+
+class VoiceCacheServiceTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.policy = create_policy(self.user)
+
+    @patch('api.services.claim_processing_service.SoroScoreService')
+    @patch('api.services.claim_processing_service.VoiceProcessingService')
+    def test_duplicate_audio_served_from_cache_and_flagged(self, mock_voice_service, mock_soro_service):
+        mock_voice_service.return_value.process_voice_claim.return_value = {
+            'success': True,
+            'transcript': 'My car was stolen',
+            'confidence': 0.9,
+            'keywords': ['stolen'],
+            'sentiment_score': -1.0,
+        }
+        mock_soro_service.return_value.calculate_claim_score.side_effect = lambda claim: dict(MOCK_UNDERWRITING_RESULT)
+
+        first = create_claim(self.user, self.policy,
+                             audio_file=SimpleUploadedFile("a.wav", b"same audio", content_type="audio/wav"))
+        second = create_claim(self.user, self.policy,
+                              audio_file=SimpleUploadedFile("b.wav", b"same audio", content_type="audio/wav"))
+
+        service = ClaimProcessingService()
+        first_result, _ = service.process_claim(first)
+        second_result, _ = service.process_claim(second)
+
+        mock_voice_service.return_value.process_voice_claim.assert_called_once()
+        self.assertNotIn('duplicate_audio', first_result['flags'])
+        self.assertIn('duplicate_audio', second_result['flags'])
+
+        second.refresh_from_db()
+        self.assertEqual(second.transcript, 'My car was stolen')
+        self.assertEqual(second.audio_hash, first.audio_hash)
+        self.assertEqual(second.voice_analysis.flags, ['duplicate_audio'])
+        self.assertEqual(VoiceAnalysisCacheEntry.objects.get().hit_count, 1)
+
+    @override_settings(VOICE_ANALYSIS_CACHE_MAX_ENTRIES=3, VOICE_ANALYSIS_CACHE_EVICT_EVERY=1)
+    def test_least_recently_used_entries_evicted(self):
+        service = VoiceCacheService()
+        for name in ['h0', 'h1', 'h2']:
+            service.put(name, {'transcript': name})
+        self.assertEqual(service.get('h0'), {'transcript': 'h0'})
+
+        service.put('h3', {'transcript': 'h3'})
+        remaining = set(VoiceAnalysisCacheEntry.objects.values_list('audio_hash', flat=True))
+        self.assertEqual(remaining, {'h0', 'h2', 'h3'})
+
+    @override_settings(VOICE_ANALYSIS_CACHE_MAX_ENTRIES=1)
+    def test_eviction_is_one_delete(self):
+        service = VoiceCacheService()
+        for name in ['h0', 'h1', 'h2']:
+            VoiceAnalysisCacheEntry.objects.create(audio_hash=name, analyzer_version=service.analyzer_version, result={})
+        with self.assertNumQueries(1):
+            self.assertEqual(service.evict(), 2)
+        self.assertEqual(list(VoiceAnalysisCacheEntry.objects.values_list('audio_hash', flat=True)), ['h2'])
+
+    def test_analyzer_version_is_part_of_key(self):
+        VoiceCacheService(analyzer_version='old').put('h0', {'transcript': 'old'})
+        self.assertIsNone(VoiceCacheService(analyzer_version='new').get('h0'))
+
+
+class ReanalyzeVoiceClaimsCommandTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.policy = create_policy(self.user)
+        self.claims = [
+            create_claim(self.user, self.policy, audio_file=f'claim_audio/{i}.wav', audio_duration=30,
+                         transcript='Okada crash near Port Harcourt, I am so scared', keywords=[])
+            for i in range(5)
+        ]
+        create_claim(self.user, self.policy, transcript='No recording')
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+
+    def reanalyze(self, **options):
+        call_command('reanalyze_voice_claims', workers=0, chunk_size=2,
+                     checkpoint=self.checkpoint, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+        with open(self.checkpoint) as f:
+            return json.load(f)
+
+    def test_text_reanalysis_updates_claims_and_voice_analysis(self):
+        VoiceAnalysis.objects.create(claim=self.claims[0], word_count=1, recording_quality='good')
+        state = self.reanalyze()
+
+        self.assertEqual((state['processed'], state['failed'], state['last_id']), (5, 0, self.claims[-1].id))
+        for claim in Claim.objects.filter(id__in=[c.id for c in self.claims]):
+            self.assertEqual(claim.keywords, ['okada', 'crash', 'port harcourt'])
+            self.assertEqual(claim.voice_analysis.emotion_scores['fear'], 1)
+            self.assertEqual(claim.voice_analysis.speaking_rate, 18)
+        # Fields outside text analysis are left alone
+        self.assertEqual(VoiceAnalysis.objects.get(claim=self.claims[0]).recording_quality, 'good')
+
+    def test_text_reanalysis_keeps_speaking_rate_without_duration(self):
+        # Shares a chunk with a claim whose duration is known
+        Claim.objects.filter(id=self.claims[0].id).update(audio_duration=None)
+        VoiceAnalysis.objects.create(claim=self.claims[0], word_count=1, speaking_rate=95)
+        VoiceAnalysis.objects.create(claim=self.claims[1], word_count=1, speaking_rate=95)
+        self.reanalyze()
+
+        self.assertEqual(VoiceAnalysis.objects.get(claim=self.claims[0]).speaking_rate, 95)
+        self.assertEqual(VoiceAnalysis.objects.get(claim=self.claims[0]).word_count, 9)
+        self.assertEqual(VoiceAnalysis.objects.get(claim=self.claims[1]).speaking_rate, 18)
+
+    def test_resumes_from_checkpoint(self):
+        state = self.reanalyze(limit=3)
+        self.assertEqual(state['last_id'], self.claims[2].id)
+
+        Claim.objects.filter(id=self.claims[0].id).update(keywords=['untouched'])
+        state = self.reanalyze()
+        self.assertEqual((state['processed'], state['last_id']), (5, self.claims[-1].id))
+        self.assertEqual(Claim.objects.get(id=self.claims[0].id).keywords, ['untouched'])
+
+    @patch('api.services.voice_processing_service.VoiceProcessingService.process_voice_claim')
+    def test_full_reanalysis_with_rescore(self, mock_process):
+        mock_process.side_effect = [{'success': False, 'error': 'decode failed'}] + [{
+            'success': True, 'transcript': 'My car was stolen', 'confidence': 0.8, 'duration': 12.4,
+            'keywords': ['stolen'], 'sentiment_score': -1.0, 'audio_features': {'pitch_variance': 1.5},
+        }] * 4
+        state = self.reanalyze(mode='full', rescore=True)
+
+        self.assertEqual((state['processed'], state['failed']), (5, 1))
+        self.assertEqual(SoroScoreLog.objects.count(), 4)
+        claim = Claim.objects.get(id=self.claims[1].id)
+        self.assertEqual(claim.transcript, 'My car was stolen')
+        self.assertIsNotNone(claim.soro_score)
+        self.assertEqual(claim.voice_analysis.pitch_variance, 1.5)
+        self.assertEqual(Claim.objects.get(id=self.claims[0].id).keywords, [])
+
 
 class PaymentServiceTests(TestCase):
     def setUp(self):
@@ -0,0 +1,71 @@
+"""
+Offline (Sphinx) transcription worker process.
+
+This module runs inside the transcription process pool and deliberately has
+no Django imports, so spawned workers start without configuring Django. The
+pool initializer loads the acoustic model, language model and dictionary
+once per process; every job afterwards reuses the warm decoder.
+"""
+import os
+import speech_recognition as sr
+
+
+_decoder = None
+_load_error = None
+
+
+def default_model_paths(language='en-US'):
+    """Model paths for the language data bundled with speech_recognition"""
+    language_directory = os.path.join(os.path.dirname(os.path.realpath(sr.__file__)), 'pocketsphinx-data', language)
+    return (
+        os.path.join(language_directory, 'acoustic-model'),
+        os.path.join(language_directory, 'language-model.lm.bin'),
+        os.path.join(language_directory, 'pronounciation-dictionary.dict'),
+    )
+
+
+def load_decoder(model_paths=None):
+    """Build a pocketsphinx decoder; this is the expensive model load"""
+    from pocketsphinx import pocketsphinx
+
+    acoustic_model, language_model, dictionary = model_paths or default_model_paths()
+
+    # pocketsphinx < 5 exposes Decoder.default_config(), newer releases Config()
+    if hasattr(pocketsphinx.Decoder, 'default_config'):
+        config = pocketsphinx.Decoder.default_config()
+    else:
+        config = pocketsphinx.Config()
+    config.set_string('-hmm', acoustic_model)
+    config.set_string('-lm', language_model)
+    config.set_string('-dict', dictionary)
+    config.set_string('-logfn', os.devnull)
+    return pocketsphinx.Decoder(config)
+
+
+def init_worker(model_paths=None):
+    """Process pool initializer: load the decoder once for this process"""
+    global _decoder, _load_error
+    try:
+        _decoder = load_decoder(model_paths)
+        _load_error = None
+    except Exception as e:
+        _decoder = None
+        _load_error = str(e)
+
+
+def ping():
+    """Report whether this worker has a warm decoder"""
+    return {'pid': os.getpid(), 'ready': _decoder is not None, 'error': _load_error}
+
+
+def transcribe(raw_data):
+    """Decode 16 kHz mono 16-bit PCM with the warm decoder"""
+    if _decoder is None:
+        raise RuntimeError(f'Sphinx decoder unavailable: {_load_error}')
+
+    _decoder.start_utt()
+    _decoder.process_raw(raw_data, False, True)
+    _decoder.end_utt()
+
+    hypothesis = _decoder.hyp()
+    return hypothesis.hypstr if hypothesis is not None else ''
@@ -7,12 +7,15 @@ router.register(r'products', views.InsuranceProductViewSet, basename='product')
 router.register(r'policies', views.PolicyViewSet, basename='policy')
 router.register(r'claims', views.ClaimViewSet, basename='claim')
 router.register(r'payments', views.PaymentViewSet, basename='payment')
+router.register(r'voice-jobs', views.VoiceProcessingJobViewSet, basename='voice-job')
 
 urlpatterns = [
     path('', include(router.urls)),
     
     # Admin dashboard
     path('admin/dashboard/', views.AdminDashboardView.as_view(), name='admin-dashboard'),
+    path('admin/fraud-rings/<int:user_id>/', views.FraudRingView.as_view(), name='admin-fraud-ring'),
+    path('admin/score-logs/', views.ScoreLogView.as_view(), name='admin-score-logs'),
     
     # USSD endpoint
     path('ussd/', views.USSDView.as_view(), name='ussd'),
@@ -2,27 +2,35 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.reverse import reverse
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.db.models import Case, When, Avg, Count, Sum, Q, F
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
 import uuid
 import json
 
 from .models import (
-    InsuranceProduct, Policy, Claim, VoiceAnalysis,
-    SoroScoreLog, Payment, Notification, AdminDashboard
+    InsuranceProduct, Policy, Claim, Payment,
+    AdminDashboard, VoiceProcessingJob, FraudRingNode
 )
 from .serializers import (
     InsuranceProductSerializer, PolicySerializer, ClaimSerializer,
     VoiceAnalysisSerializer, SoroScoreLogSerializer, PaymentSerializer,
     NotificationSerializer, AdminDashboardSerializer,
     VoiceClaimSerializer, UnderwritingResultSerializer,
-    PaymentInitiationSerializer, USSDRequestSerializer
+    PaymentInitiationSerializer, USSDRequestSerializer,
+    VoiceProcessingJobSerializer
 )
 from .services import (
-    SoroScoreService, VoiceProcessingService,
-    PaymentService, NotificationService, USSDService
+    PaymentService, NotificationService, USSDService,
+    ClaimProcessingService, NarrativeSimilarityService, PhotoHashService,
+    AudioFingerprintService, FraudRingService, ScoreBatchService, ScoreBatchError,
+    ScoreLogService, ScoreExplanationService, PricingService
 )
+from .services.transcription_engines import engine_stats
 from users.permissions import IsOwnerOrAdmin, IsAdminOrReviewer, IsCustomer
 from django.db import models
 from django.contrib.auth import get_user_model
@@ -50,34 +58,42 @@ class InsuranceProductViewSet(viewsets.ReadOnlyModelViewSet):
         elif not soro_score:
             soro_score = 50.0  # Default score
         
-        # Calculate dynamic premium based on Soro-Score
-        base_premium = float(product.base_premium)
-        risk_factor = soro_score / 100
-        
-        # Premium adjustment based on risk
-        if soro_score <= 30:
-            premium_adjustment = -0.2  # 20% discount for low risk
-        elif soro_score <= 70:
-            premium_adjustment = 0  # No adjustment for medium risk
-        else:
-            premium_adjustment = 0.3  # 30% increase for high risk
-        
-        calculated_premium = base_premium * (1 + premium_adjustment)
-        
-        # Ensure premium is within min/max bounds
-        calculated_premium = max(float(product.min_premium), 
-                               min(float(product.max_premium), calculated_premium))
+        frequency = request.data.get('premium_frequency', 'monthly')
+        try:
+            quote = PricingService().quote(product, soro_score, frequency)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'product': product.name,
-            'base_premium': base_premium,
-            'soro_score': soro_score,
-            'risk_level': 'low' if soro_score <= 30 else 'medium' if soro_score <= 70 else 'high',
-            'premium_adjustment': premium_adjustment,
-            'calculated_premium': calculated_premium,
+            'base_premium': product.base_premium,
+            'soro_score': float(soro_score),
+            'risk_level': quote['risk_level'],
+            'premium_adjustment': quote['premium_adjustment'],
+            'premium_frequency': frequency,
+            'calculated_premium': quote['premium'],
             'coverage_amount': product.coverage_details.get('max_coverage', 0)
         })
 
+    @action(detail=False, methods=['post'])
+    def quotes(self, request):
+        """Quote every active product, or the listed ones, for one Soro-Score and several frequencies"""
+        user = request.user if request.user.is_authenticated else None
+        soro_score = user.soro_score if user else request.data.get('soro_score') or 50.0
+        frequencies = request.data.get('premium_frequencies') or ['monthly']
+        product_ids = request.data.get('product_ids')
+        if not isinstance(frequencies, list) or not (product_ids is None or isinstance(product_ids, list)):
+            return Response({'error': 'premium_frequencies and product_ids must be lists'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = PricingService().quote_catalog(
+                soro_score, list(dict.fromkeys(frequencies)), product_ids=product_ids,
+                product_type=request.data.get('product_type')
+            )
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'soro_score': float(soro_score), **result})
+
 
 class PolicyViewSet(viewsets.ModelViewSet):
     """ViewSet for insurance policies"""
@@ -94,21 +110,11 @@ class PolicyViewSet(viewsets.ModelViewSet):
         user = self.request.user
         product = serializer.validated_data['product']
         
-        # Calculate initial premium
+        # Calculate initial premium from the Soro-Score
         soro_score = user.soro_score
-        base_premium = float(product.base_premium)
-        
-        # Premium adjustment based on Soro-Score
-        if soro_score <= 30:
-            premium_adjustment = -0.2
-        elif soro_score <= 70:
-            premium_adjustment = 0
-        else:
-            premium_adjustment = 0.3
-        
-        premium_amount = base_premium * (1 + premium_adjustment)
-        premium_amount = max(float(product.min_premium), 
-                           min(float(product.max_premium), premium_amount))
+        premium_amount = PricingService().premium(
+            product, soro_score, serializer.validated_data.get('premium_frequency', 'monthly')
+        )
         
         # Generate policy number
         policy_number = f"SORO-{uuid.uuid4().hex[:8].upper()}"
@@ -148,18 +154,7 @@ class PolicyViewSet(viewsets.ModelViewSet):
         
         # Recalculate premium with current Soro-Score
         soro_score = user.soro_score
-        base_premium = float(product.base_premium)
-        
-        if soro_score <= 30:
-            premium_adjustment = -0.2
-        elif soro_score <= 70:
-            premium_adjustment = 0
-        else:
-            premium_adjustment = 0.3
-        
-        new_premium = base_premium * (1 + premium_adjustment)
-        new_premium = max(float(product.min_premium), 
-                         min(float(product.max_premium), new_premium))
+        new_premium = PricingService().premium(product, soro_score, policy.premium_frequency)
         
         # Create renewal record
         renewal_data = {
@@ -170,6 +165,7 @@ class PolicyViewSet(viewsets.ModelViewSet):
             'initial_soro_score': soro_score,
             'current_soro_score': soro_score,
             'premium_amount': new_premium,
+            'premium_frequency': policy.premium_frequency,
             'coverage_amount': policy.coverage_amount,
             'deductible_amount': policy.deductible_amount,
             'status': Policy.PolicyStatus.PENDING,
@@ -223,83 +219,37 @@ class ClaimViewSet(viewsets.ModelViewSet):
         """Submit a voice claim"""
         claim = self.get_object()
         
-        if claim.audio_file:
-            # Process voice claim
-            voice_service = VoiceProcessingService()
-            analysis_result = voice_service.process_voice_claim(claim.audio_file.path)
-            
-            # Update claim with voice analysis
-            claim.transcript = analysis_result.get('transcript')
-            claim.transcript_confidence = analysis_result.get('confidence')
-            claim.keywords = analysis_result.get('keywords', [])
-            claim.sentiment_score = analysis_result.get('sentiment_score')
-            
-            # Calculate Soro-Score
-            soro_service = SoroScoreService()
-            underwriting_result = soro_service.calculate_claim_score(claim)
-            
-            claim.soro_score = underwriting_result['soro_score']
-            claim.risk_level = underwriting_result['risk_level']
-            claim.auto_approval_recommended = underwriting_result['auto_approval_recommended']
-            claim.inconsistency_score = underwriting_result['components']['inconsistency']
-            claim.urgency_score = underwriting_result['components']['urgency']
-            
-            claim.save()
-            
-            # Create voice analysis record
-            VoiceAnalysis.objects.create(
-                claim=claim,
-                word_count=analysis_result.get('word_count'),
-                speaking_rate=analysis_result.get('speaking_rate'),
-                sentiment_label=analysis_result.get('sentiment_label'),
-                sentiment_scores=analysis_result.get('sentiment_scores', {}),
-                emotion_scores=analysis_result.get('emotion_scores', {}),
-                recording_quality=analysis_result.get('recording_quality'),
-                confidence_score=analysis_result.get('confidence')
-            )
-            
-            # Log Soro-Score calculation
-            SoroScoreLog.objects.create(
-                claim=claim,
-                user=claim.user,
-                inconsistency_score=underwriting_result['components']['inconsistency'],
-                urgency_score=underwriting_result['components']['urgency'],
-                sentiment_score=underwriting_result['components']['sentiment'],
-                media_integrity_score=underwriting_result['components']['media_integrity'],
-                historical_score=underwriting_result['components']['historical'],
-                weighted_inconsistency=underwriting_result['components']['weighted_inconsistency'],
-                weighted_urgency=underwriting_result['components']['weighted_urgency'],
-                weighted_sentiment=underwriting_result['components']['weighted_sentiment'],
-                weighted_media=underwriting_result['components']['weighted_media'],
-                weighted_historical=underwriting_result['components']['weighted_historical'],
-                final_soro_score=underwriting_result['soro_score'],
-                risk_level=underwriting_result['risk_level'],
-                calculation_metadata=underwriting_result
+        if not claim.audio_file:
+            return Response(
+                {'error': 'No audio file found for voice claim'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Send notification
-            if claim.auto_approval_recommended:
-                claim.status = Claim.ClaimStatus.APPROVED
-                claim.save()
-                
-                NotificationService.send_claim_notification(
-                    claim.user,
-                    'voice',
-                    'Claim Auto-Approved',
-                    f'Your claim {claim.claim_number} has been automatically approved.',
-                    claim=claim
-                )
-            
+        
+        processing_service = ClaimProcessingService()
+        
+        # Queue for the voice worker pool instead of processing in the request
+        run_async = request.query_params.get('async', request.data.get('async'))
+        if run_async is None:
+            run_async = settings.VOICE_CLAIM_ASYNC
+        elif isinstance(run_async, str):
+            run_async = run_async.lower() in ('1', 'true', 'yes')
+        
+        if run_async:
+            job = processing_service.enqueue(claim)
             return Response({
-                'message': 'Voice claim processed successfully',
-                'claim': ClaimSerializer(claim).data,
-                'underwriting_result': underwriting_result
-            })
-        
-        return Response(
-            {'error': 'No audio file found for voice claim'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+                'message': 'Voice claim queued for processing',
+                'job': VoiceProcessingJobSerializer(job).data,
+                'status_url': reverse('voice-job-detail', args=[job.job_id], request=request)
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        underwriting_result, timings = processing_service.process_claim(claim)
+        
+        return Response({
+            'message': 'Voice claim processed successfully',
+            'claim': ClaimSerializer(claim).data,
+            'underwriting_result': underwriting_result,
+            'stage_timings': timings
+        })
     
     @action(detail=True, methods=['post'])
     def review(self, request, pk=None):
@@ -338,11 +288,6 @@ class ClaimViewSet(viewsets.ModelViewSet):
             claim.review_notes = notes
             claim.save()
             
-            # Update user stats
-            claim.user.rejected_claims += 1
-            claim.user.total_claims += 1
-            claim.user.save()
-            
             # Send notification
             NotificationService.send_claim_notification(
                 claim.user,
@@ -357,6 +302,105 @@ class ClaimViewSet(viewsets.ModelViewSet):
             'claim': ClaimSerializer(claim).data
         })
 
+    
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Claims with near-duplicate narratives (admin/reviewer only)"""
+        if not request.user.user_type in ['admin', 'reviewer']:
+            return Response(
+                {'error': 'Only admins and reviewers can view similar claims'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        claim = self.get_object()
+        return Response({
+            'claim_number': claim.claim_number,
+            'matches': NarrativeSimilarityService().similar_claims(claim)
+        })
+    
+    @action(detail=True, methods=['get'])
+    def duplicate_photos(self, request, pk=None):
+        """Photos on other claims matching this claim's photos (admin/reviewer only)"""
+        if not request.user.user_type in ['admin', 'reviewer']:
+            return Response(
+                {'error': 'Only admins and reviewers can view duplicate photos'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        claim = self.get_object()
+        return Response({
+            'claim_number': claim.claim_number,
+            'matches': PhotoHashService().duplicate_photos(claim)
+        })
+    
+    @action(detail=True, methods=['get'])
+    def recycled_audio(self, request, pk=None):
+        """Earlier claims whose recordings match this claim's recording (admin/reviewer only)"""
+        if not request.user.user_type in ['admin', 'reviewer']:
+            return Response(
+                {'error': 'Only admins and reviewers can view recycled audio matches'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        claim = self.get_object()
+        return Response({
+            'claim_number': claim.claim_number,
+            'matches': AudioFingerprintService.recycled_audio(claim)
+        })
+    
+    @action(detail=True, methods=['get'])
+    def explanation(self, request, pk=None):
+        """
+        Score breakdown of a claim (admin/reviewer only), served from the
+        explanation cache without loading or serializing the claim
+        """
+        if not request.user.user_type in ['admin', 'reviewer']:
+            return Response(
+                {'error': 'Only admins and reviewers can view score explanations'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        explanation = ScoreExplanationService().get(pk) if str(pk).isdigit() else None
+        if explanation is None:
+            return Response({'error': 'Claim not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(explanation)
+    
+    @action(detail=False, methods=['post'], url_path='score-batch')
+    def score_batch(self, request):
+        """
+        Score claim ids and/or inline feature payloads in one batch
+        (admins, reviewers and agents); results stream back as NDJSON, one
+        line per claim, then a summary line.
+        """
+        if not request.user.user_type in ['admin', 'reviewer', 'agent']:
+            return Response(
+                {'error': 'Only admins, reviewers and agents can score claims in batches'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        service = ScoreBatchService()
+        try:
+            claim_ids, vectors = service.parse(request.data)
+        except ScoreBatchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        lines = (json.dumps(result) + '\n' for result in service.score(self.get_queryset(), claim_ids, vectors))
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+
+class VoiceProcessingJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of queued voice claim processing jobs"""
+    serializer_class = VoiceProcessingJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'job_id'
+    
+    def get_queryset(self):
+        user = self.request.user
+        queryset = VoiceProcessingJob.objects.select_related('claim')
+        if user.user_type in ['admin', 'reviewer']:
+            return queryset
+        return queryset.filter(claim__user=user)
+
 
 class PaymentViewSet(viewsets.ModelViewSet):
     """ViewSet for payments"""
@@ -473,7 +517,14 @@ class AdminDashboardView(APIView):
                 'total_voice_claims': Claim.objects.exclude(audio_file='').count(),
                 'auto_approval_rate': (Claim.objects.filter(auto_approval_recommended=True).count() / total_claims * 100) if total_claims > 0 else 0,
                 'avg_processing_time': '2.5 hours'  # This would be calculated from actual data
-            }
+            },
+            'fraud_rings': {
+                'rings': FraudRingNode.objects.filter(parent=F('user'), size__gt=1).count(),
+                'users_in_rings': FraudRingNode.objects.count(),
+                'largest': FraudRingNode.objects.aggregate(largest=models.Max('size'))['largest'] or 0
+            },
+            # Counters of the web process; workers report theirs on exit
+            'transcription_engines': engine_stats()
         }
         
         # Update dashboard cache
@@ -486,6 +537,58 @@ class AdminDashboardView(APIView):
         return Response(dashboard_data)
 
 
+class FraudRingView(APIView):
+    """A user's fraud ring: the users linked to them by shared identifiers"""
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrReviewer]
+    
+    def get(self, request, user_id):
+        if not User.objects.filter(pk=user_id).exists():
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(FraudRingService().ring(user_id))
+
+
+class ScoreLogView(APIView):
+    """Soro-Score log entries by claim, user and date range, optionally including archived entries"""
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrReviewer]
+    
+    def get(self, request):
+        params = request.query_params
+        try:
+            claim_id = int(params['claim']) if params.get('claim') else None
+            user_id = int(params['user']) if params.get('user') else None
+            start = self._parse_when(params.get('start'))
+            end = self._parse_when(params.get('end'))
+        except ValueError:
+            return Response(
+                {'error': 'claim and user must be ids; start and end ISO dates or datetimes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if claim_id is None and user_id is None and start is None:
+            return Response(
+                {'error': 'Pass a claim, a user or a start date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = ScoreLogService().history(
+            claim_id=claim_id, user_id=user_id, start=start, end=end,
+            include_archived=params.get('archived') in ('1', 'true')
+        )
+        return Response({'count': len(results), 'results': results})
+    
+    @staticmethod
+    def _parse_when(value):
+        """Aware datetime from an ISO datetime or date (midnight), or None"""
+        if not value:
+            return None
+        when = parse_datetime(value)
+        if when is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            when = datetime.combine(day, time.min)
+        return timezone.make_aware(when) if timezone.is_naive(when) else when
+
+
 class USSDView(APIView):
     """Handle USSD requests"""
     permission_classes = [permissions.AllowAny]
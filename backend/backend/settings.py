@@ -194,6 +194,48 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_UPLOAD_SIZE
 AUDIO_ALLOWED_EXTENSIONS = ['.wav', '.mp3', '.m4a', '.ogg']
 AUDIO_MAX_DURATION = 300  # 5 minutes in seconds
 
+# Voice claim processing
+# When enabled, submit_voice_claim queues a VoiceProcessingJob and returns 202;
+# jobs are processed by `python manage.py process_voice_jobs`.
+VOICE_CLAIM_ASYNC = os.environ.get('VOICE_CLAIM_ASYNC', 'False') == 'True'
+VOICE_WORKER_POOL_SIZE = int(os.environ.get('VOICE_WORKER_POOL_SIZE', 4))
+VOICE_WORKER_POLL_INTERVAL = 1.0  # seconds between polls when the queue is empty
+# A job RUNNING for longer than VOICE_JOB_TIMEOUT_SECONDS lost its worker and is
+# requeued, or failed once it has been tried VOICE_JOB_MAX_ATTEMPTS times.
+VOICE_JOB_TIMEOUT_SECONDS = int(os.environ.get('VOICE_JOB_TIMEOUT_SECONDS', 900))
+VOICE_JOB_MAX_ATTEMPTS = 3
+
+# Voice analysis results cached by audio SHA-256 (least recently used entries evicted)
+VOICE_ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get('VOICE_ANALYSIS_CACHE_MAX_ENTRIES', 10000))
+VOICE_ANALYSIS_CACHE_EVICT_EVERY = 100  # stores per process between evictions
+
+# Transcription: recordings are split at silences and segments transcribed in parallel
+TRANSCRIPTION_WORKERS = int(os.environ.get('TRANSCRIPTION_WORKERS', 4))
+TRANSCRIPTION_SEGMENT_MAX_SECONDS = 30
+TRANSCRIPTION_MIN_SILENCE_SECONDS = 0.3  # shorter pauses do not split a segment
+TRANSCRIPTION_VAD_FLOOR_DB = -50  # frames quieter than this (dBFS) are never speech
+TRANSCRIPTION_VAD_MARGIN_DB = 10  # speech threshold above the estimated noise floor
+
+# Transcription engines, tried in order for each segment. Every call is bounded by
+# its deadline (seconds) from when the engine starts on it; a call that waits longer
+# than TRANSCRIPTION_QUEUE_TIMEOUT to start is skipped without counting against the
+# engine. After TRANSCRIPTION_BREAKER_THRESHOLD consecutive errors or timeouts an
+# engine is skipped for TRANSCRIPTION_BREAKER_COOLDOWN seconds.
+TRANSCRIPTION_ENGINES = [name.strip() for name in os.environ.get('TRANSCRIPTION_ENGINES', 'google,sphinx').split(',') if name.strip()]
+TRANSCRIPTION_ENGINE_DEADLINES = {'google': 10, 'sphinx': 30, 'stub': 5}
+TRANSCRIPTION_QUEUE_TIMEOUT = 30
+TRANSCRIPTION_BREAKER_THRESHOLD = 3
+TRANSCRIPTION_BREAKER_COOLDOWN = 60
+TRANSCRIPTION_STUB_TEXT = os.environ.get('TRANSCRIPTION_STUB_TEXT', '')  # what the 'stub' engine returns
+
+# Offline (Sphinx) transcription runs in a pool of warm worker processes inside the
+# voice worker; other processes (web workers) share one in-process decoder
+TRANSCRIPTION_POOL_SIZE = int(os.environ.get('TRANSCRIPTION_POOL_SIZE', os.cpu_count() or 2))
+SPHINX_MODEL_PATHS = None  # (acoustic model dir, language model file, dictionary file); None uses bundled en-US
+
+# Keyword, sentiment and emotion lexicons for transcripts (JSON; see api/data/lexicons.json)
+VOICE_LEXICON_PATH = os.environ.get('VOICE_LEXICON_PATH', BASE_DIR / 'api' / 'data' / 'lexicons.json')
+
 # Soro-Score settings
 SORO_SCORE_WEIGHTS = {
     'inconsistency': 0.40,
@@ -202,6 +244,120 @@ SORO_SCORE_WEIGHTS = {
     'media_integrity': 0.15,
     'historical': 0.05
 }
+SORO_AUTO_APPROVE_MAX_SCORE = 30  # claims scoring at or below this (low risk) may be auto-approved
+
+# Near-duplicate claim narratives (MinHash/LSH over description + transcript).
+# Narratives shorter than NARRATIVE_MIN_TOKENS words are not indexed.
+NARRATIVE_MIN_TOKENS = 8
+NARRATIVE_SIMILARITY_THRESHOLD = 0.6  # estimated Jaccard similarity reported as a match
+NARRATIVE_MAX_MATCHES = 20
+
+# Claim photo perceptual hashes (64-bit DCT hash) and EXIF capture times. Photos
+# are queued when a claim is submitted and hashed in PHOTO_HASH_WORKERS threads by
+# the voice worker (PHOTO_HASH_BATCH_SIZE claims whenever it has no voice job) or by
+# `python manage.py index_claim_photos`. A photo within PHOTO_HASH_MAX_DISTANCE bits
+# of a photo on another claim counts as reused; the lookup probes each 16-bit hash
+# block within PHOTO_HASH_MAX_DISTANCE // 4 bits.
+PHOTO_HASH_WORKERS = int(os.environ.get('PHOTO_HASH_WORKERS', 4))
+PHOTO_HASH_BATCH_SIZE = 20
+PHOTO_HASH_MAX_DISTANCE = 6
+# Hosts (storage buckets, CDNs) remote photo URLs may be fetched from; any other URL is left unread
+PHOTO_FETCH_HOSTS = [host.strip().lower() for host in os.environ.get('PHOTO_FETCH_HOSTS', '').split(',') if host.strip()]
+PHOTO_FETCH_TIMEOUT = 10  # seconds per remote photo
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+PHOTO_DATE_TOLERANCE_DAYS = 2  # photos taken this long before the incident are out of place
+
+# Recycled recordings (spectral-peak audio fingerprints). An earlier recording
+# matches when at least AUDIO_FINGERPRINT_MIN_MATCHES landmarks line up at one
+# time offset, covering AUDIO_FINGERPRINT_MIN_SCORE of this recording's landmarks.
+# Only the AUDIO_FINGERPRINT_MAX_CANDIDATES recordings sharing the most landmarks
+# are aligned.
+AUDIO_FINGERPRINT_MIN_MATCHES = 20
+AUDIO_FINGERPRINT_MIN_SCORE = 0.1
+AUDIO_FINGERPRINT_MAX_MATCHES = 10
+AUDIO_FINGERPRINT_MAX_CANDIDATES = 100
+
+# Scoring model versions (ScoringModelVersion) override the two settings above once one
+# is live. Workers reload live and shadow versions every SCORING_MODEL_RELOAD_SECONDS;
+# shadow versions are scored by `python manage.py process_shadow_scores`.
+SCORING_MODEL_RELOAD_SECONDS = int(os.environ.get('SCORING_MODEL_RELOAD_SECONDS', 30))
+SHADOW_SCORING_BATCH_SIZE = 500
+SHADOW_SCORING_POLL_INTERVAL = 10.0  # seconds between polls when nothing is pending
+
+# User scores: history components (0-100, higher is riskier) and their weights.
+# Policy scores blend the holder's user score with the policy's claims exposure.
+SORO_USER_SCORE_WEIGHTS = {
+    'claim_frequency': 0.25,
+    'rejection_rate': 0.30,
+    'payment_failure': 0.20,
+    'short_tenure': 0.15,
+    'recent_claim': 0.10
+}
+SORO_POLICY_SCORE_WEIGHTS = {
+    'user': 0.70,
+    'claims_exposure': 0.30
+}
+
+# User and policy scores are recomputed after claim decisions, failed payments and
+# lapsed policies. Events for one user within the window coalesce into one
+# recomputation, run in batches by `python manage.py process_score_events`.
+SCORE_RECOMPUTE_COALESCE_SECONDS = int(os.environ.get('SCORE_RECOMPUTE_COALESCE_SECONDS', 30))
+SCORE_RECOMPUTE_BATCH_SIZE = 200
+SCORE_RECOMPUTE_POLL_INTERVAL = 5.0  # seconds between polls when nothing is due
+
+# Premium pricing: a product's base premium is its monthly premium for the
+# medium risk band. PREMIUM_RISK_BANDS are (max Soro-Score, risk level,
+# adjustment), the last band open-ended; adjusted premiums are clamped to the
+# product's min/max. The premium frequency only sets how often that premium is
+# collected; it does not change the amount.
+PREMIUM_RISK_BANDS = (
+    (30, 'low', '-0.20'),
+    (70, 'medium', '0'),
+    (None, 'high', '0.30'),
+)
+PREMIUM_FREQUENCIES = ('monthly', 'quarterly', 'annually')
+# Active products quoted by POST /api/products/quotes/ are cached per worker
+PRODUCT_CATALOG_RELOAD_SECONDS = int(os.environ.get('PRODUCT_CATALOG_RELOAD_SECONDS', 60))
+
+# Batch renewal (`python manage.py renew_policies`): active policies ending within
+# POLICY_RENEWAL_WINDOW_DAYS are renewed for POLICY_RENEWAL_TERM_DAYS, with a pending
+# renewal payment, POLICY_RENEWAL_CHUNK_SIZE policies per transaction. Policies the
+# lifecycle sweep expired stay renewable for POLICY_RENEWAL_WINDOW_DAYS after their end date.
+POLICY_RENEWAL_WINDOW_DAYS = int(os.environ.get('POLICY_RENEWAL_WINDOW_DAYS', 14))
+POLICY_RENEWAL_TERM_DAYS = 365
+POLICY_RENEWAL_CHUNK_SIZE = 1000
+
+# Policy lifecycle sweep (`python manage.py sweep_policies`, run periodically): active
+# policies past their end date expire, and those more than POLICY_PAYMENT_GRACE_DAYS
+# past their next payment date lapse, POLICY_SWEEP_CHUNK_SIZE per transaction.
+POLICY_PAYMENT_GRACE_DAYS = int(os.environ.get('POLICY_PAYMENT_GRACE_DAYS', 7))
+POLICY_SWEEP_CHUNK_SIZE = 5000
+
+# Claim score explanations (GET /api/claims/<id>/explanation/), cached until the
+# claim is saved or another scoring model version goes live
+SCORE_EXPLANATION_TOP_FEATURES = 5
+SCORE_EXPLANATION_MAX_MATCHES = 5
+
+# Score log storage: `python manage.py archive_score_logs` moves entries older
+# than SCORE_LOG_RETENTION_DAYS to gzipped monthly NDJSON files under
+# SCORE_LOG_ARCHIVE_DIR in default storage, SCORE_LOG_ARCHIVE_CHUNK_SIZE at a time.
+SCORE_LOG_RETENTION_DAYS = int(os.environ.get('SCORE_LOG_RETENTION_DAYS', 180))
+SCORE_LOG_ARCHIVE_DIR = 'score_log_archive'
+SCORE_LOG_ARCHIVE_CHUNK_SIZE = 5000
+SCORE_LOG_LOOKUP_LIMIT = 1000  # entries per lookup
+
+# Batch scoring (POST /api/claims/score-batch/): claims are scored, logged and
+# streamed back in chunks of SCORE_BATCH_CHUNK_SIZE.
+SCORE_BATCH_MAX_ITEMS = int(os.environ.get('SCORE_BATCH_MAX_ITEMS', 5000))
+SCORE_BATCH_CHUNK_SIZE = 500
+
+# Fraud rings: users sharing a bank account, BVN, WhatsApp number, device or
+# incident place and date are linked into one ring. Values held by more than
+# FRAUD_RING_MAX_SHARED_USERS users (a busy junction, a shared office device)
+# are too common to link anyone, and so are incident locations of fewer than
+# FRAUD_RING_MIN_LOCATION_WORDS words.
+FRAUD_RING_MAX_SHARED_USERS = 25
+FRAUD_RING_MIN_LOCATION_WORDS = 3
 
 # Logging
 LOGGING = {